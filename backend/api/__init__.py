@@ -6,6 +6,7 @@ from .wallet import wallet_bp
 from .activity import activity_bp
 from .auth import auth_bp
 from .contract import contract_bp
+from .profiler import profiler_bp
 
 __all__ = [
     'user_bp',
@@ -16,4 +17,5 @@ __all__ = [
     'activity_bp',
     'auth_bp',
     'contract_bp',
+    'profiler_bp',
 ]
@@ -1,6 +1,10 @@
-from flask import Blueprint, request, jsonify, session
+from concurrent.futures import TimeoutError as PasswordVerifyTimeout
+from flask import Blueprint, request, jsonify
 from models import User
 from database import db
+from services.session_store import session_store, start_session, end_session, current_user_id
+from services.user_cache import load_current_user, user_cache
+from services.passwords import PasswordVerifierBusy, dummy_hash, password_verifier
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -15,55 +19,90 @@ def login():
         if not username or not password:
             return jsonify({'success': False, 'error': 'Username and password required'}), 400
         
-        # Find user
+        # Single lookup by unique username index
         user = User.query.filter_by(username=username).first()
         
         if not user:
-            return jsonify({'success': False, 'error': 'User not found'}), 404
+            # Та же стоимость, что у неверного пароля - иначе имя выдаёт время ответа
+            password_verifier.verify(dummy_hash(), password)
+            return jsonify({'success': False, 'error': 'Invalid username or password'}), 401
         
-        # Check password using werkzeug
         if not user.check_password(password):
-            return jsonify({'success': False, 'error': 'Invalid password'}), 401
+            return jsonify({'success': False, 'error': 'Invalid username or password'}), 401
+        
+        user_data = user.to_dict()
+        
+        # Transparent upgrade to current PASSWORD_HASH_METHOD
+        if user.password_needs_rehash():
+            user.password_hash = password_verifier.hash(password)
+            db.session.commit()
         
         # Set session
-        session['user_id'] = user.id
-        session['username'] = user.username
+        start_session(user)
+        user_cache.set(user_data['id'], user_data)
         
         return jsonify({
             'success': True,
             'data': {
-                'userId': user.id,
-                'username': user.username,
-                'user': user.to_dict()
+                'userId': user_data['id'],
+                'username': user_data['username'],
+                'user': user_data
             }
         })
         
+    except PasswordVerifierBusy:
+        return jsonify({'success': False, 'error': 'Too many login attempts, try again'}), 503, {'Retry-After': '1'}
+    except PasswordVerifyTimeout:
+        # Проверка не уложилась в PASSWORD_VERIFY_TIMEOUT: пул перегружен
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Login timed out, try again'}), 503, {'Retry-After': '1'}
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
     """Logout current user"""
-    session.clear()
+    end_session()
     return jsonify({'success': True})
 
+@auth_bp.route('/sessions/revoke', methods=['POST'])
+def revoke_sessions():
+    """Revoke all server-side sessions of current user (logout everywhere)"""
+    try:
+        user_id = current_user_id()
+        
+        if not user_id:
+            return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+        
+        if session_store is None:
+            return jsonify({'success': False, 'error': 'Server-side sessions are disabled'}), 400
+        
+        revoked = session_store.revoke_user(user_id)
+        end_session()
+        
+        return jsonify({'success': True, 'data': {'revoked': revoked}})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @auth_bp.route('/me', methods=['GET'])
 def get_current_user():
     """Get current logged in user"""
     try:
-        user_id = session.get('user_id')
+        user_id = current_user_id()
         
         if not user_id:
             return jsonify({'success': False, 'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = load_current_user()
         
         if not user:
             return jsonify({'success': False, 'error': 'User not found'}), 404
         
         return jsonify({
             'success': True,
-            'data': user.to_dict()
+            'data': user
         })
         
     except Exception as e:
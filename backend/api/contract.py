@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify
 from models import SmartContract, User
 from database import db
+from services.session_store import current_user_id, end_session
+from services.user_cache import load_current_user
+from services.replicas import replica_read
 import json
+from datetime import datetime
 
 contract_bp = Blueprint('contract', __name__)
 
@@ -9,9 +13,7 @@ contract_bp = Blueprint('contract', __name__)
 def get_user_contracts():
     """Get all contracts owned by current user"""
     try:
-        from models.user import User
-        
-        user_id = session.get('user_id')
+        user_id = current_user_id()
         
         print(f"[DEBUG] /contracts/user - user_id from session: {user_id}")
         
@@ -20,10 +22,10 @@ def get_user_contracts():
             return jsonify({'success': True, 'data': []})
         
         # Check if user exists
-        user = User.query.get(user_id)
+        user = load_current_user()
         if not user:
             print(f"[DEBUG] User {user_id} not found in DB - clearing session")
-            session.clear()
+            end_session()
             return jsonify({'success': False, 'error': 'User not found. Please login again.'}), 401
         
         contracts = SmartContract.query.filter_by(owner=user_id).all()
@@ -39,6 +41,7 @@ def get_user_contracts():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @contract_bp.route('/<contract_id>', methods=['GET'])
+@replica_read
 def get_contract(contract_id):
     """Get contract by ID"""
     try:
@@ -60,7 +63,7 @@ def start_mining(contract_id):
     """Start mining on a contract"""
     try:
         from datetime import datetime, timedelta
-        user_id = session.get('user_id')
+        user_id = current_user_id()
         
         if not user_id:
             return jsonify({'success': False, 'error': 'Not authenticated'}), 401
@@ -73,6 +76,9 @@ def start_mining(contract_id):
         if contract.status == 'mining':
             return jsonify({'success': False, 'error': 'Already mining'}), 400
         
+        if contract.status == 'expired':
+            return jsonify({'success': False, 'error': 'Contract expired'}), 400
+        
         # Lock contract for 7 days minimum
         contract.status = 'mining'
         contract.mining_started_at = datetime.utcnow()
@@ -93,7 +99,7 @@ def start_mining(contract_id):
 def stop_mining(contract_id):
     """Stop mining on a contract"""
     try:
-        user_id = session.get('user_id')
+        user_id = current_user_id()
         
         if not user_id:
             return jsonify({'success': False, 'error': 'Not authenticated'}), 401
@@ -123,7 +129,7 @@ def stop_mining(contract_id):
 def list_contract(contract_id):
     """List contract on marketplace"""
     try:
-        user_id = session.get('user_id')
+        user_id = current_user_id()
         
         if not user_id:
             return jsonify({'success': False, 'error': 'Not authenticated'}), 401
@@ -142,6 +148,10 @@ def list_contract(contract_id):
         if contract.listed_on_marketplace:
             return jsonify({'success': False, 'error': 'Already listed'}), 400
         
+        # expiration_date тоже: sweep_expired мог ещё не перевести контракт в expired
+        if contract.status == 'expired' or contract.expiration_date <= datetime.utcnow():
+            return jsonify({'success': False, 'error': 'Contract expired'}), 400
+        
         contract.listed_on_marketplace = True
         contract.current_price = price
         contract.status = 'on_sale'
@@ -161,7 +171,7 @@ def list_contract(contract_id):
 def withdraw_contract(contract_id):
     """Withdraw contract to TON wallet (simulate)"""
     try:
-        user_id = session.get('user_id')
+        user_id = current_user_id()
         
         if not user_id:
             return jsonify({'success': False, 'error': 'Not authenticated'}), 401
@@ -195,7 +205,7 @@ def withdraw_contract(contract_id):
 def import_from_wallet():
     """Import contract from TON wallet (simulate)"""
     try:
-        user_id = session.get('user_id')
+        user_id = current_user_id()
         
         if not user_id:
             return jsonify({'success': False, 'error': 'Not authenticated'}), 401
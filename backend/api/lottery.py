@@ -1,9 +1,15 @@
 from flask import Blueprint, request, jsonify
 from database import db
+from sqlalchemy import func
 from models.lottery import LotteryDraw, LotteryTicket
 from models.contract import SmartContract
 from lottery.lottery_core import get_lottery_result, verify_lottery_result, pick_winner
 from lottery.bitcoin_api import get_block_hashes_for_draw
+from services.activity_feed import activity_feed, lottery_win_event
+from services.session_store import current_user_id
+from services.metrics import observe_draw
+from services.replicas import replica_read
+import time
 import uuid
 import json
 
@@ -33,6 +39,7 @@ def get_current_draw():
         }), 500
 
 @lottery_bp.route('/history', methods=['GET'])
+@replica_read
 def get_history():
     """Получить историю розыгрышей"""
     try:
@@ -83,7 +90,9 @@ def conduct_draw():
         tickets = [666, 77, 123, 1, 6, 1234, 34567, 789, 42, 999]
         
         # Проводим розыгрыш
+        started = time.perf_counter()
         result = get_lottery_result(block_hashes, tickets)
+        observe_draw(len(result['allScores']), time.perf_counter() - started)
         
         # Получаем номер следующего розыгрыша
         last_draw = LotteryDraw.query.order_by(LotteryDraw.draw_number.desc()).first()
@@ -165,12 +174,47 @@ def verify_draw():
             'error': str(e)
         }), 500
 
+def _user_tickets_query(user_id):
+    """
+    Билеты пользователя вместе с prize_contract_id розыгрыша одним запросом
+    (LEFT JOIN вместо отдельного запроса к lottery_draws на каждый билет)
+    """
+    return db.session.query(
+        LotteryTicket, LotteryDraw.prize_contract_id
+    ).outerjoin(
+        LotteryDraw, LotteryTicket.draw_id == LotteryDraw.id
+    ).filter(
+        LotteryTicket.user_id == user_id
+    ).order_by(
+        LotteryTicket.created_at.desc(), LotteryTicket.id
+    )
+
+def _user_tickets_summary(user_id):
+    """Количество билетов пользователя по статусам одним GROUP BY"""
+    rows = db.session.query(
+        LotteryTicket.status,
+        LotteryTicket.claimed,
+        func.count(LotteryTicket.id)
+    ).filter(
+        LotteryTicket.user_id == user_id
+    ).group_by(
+        LotteryTicket.status, LotteryTicket.claimed
+    ).all()
+    
+    summary = {'total': 0, 'pending': 0, 'active': 0, 'won': 0, 'lost': 0, 'claimed': 0}
+    for status, claimed, count in rows:
+        summary['total'] += count
+        if status in summary:
+            summary[status] += count
+        if claimed:
+            summary['claimed'] += count
+    return summary
+
 @lottery_bp.route('/tickets/user', methods=['GET'])
 def get_user_tickets():
     """Получить билеты пользователя"""
     try:
-        from flask import session
-        user_id = session.get('user_id')
+        user_id = current_user_id()
         
         if not user_id:
             # Return empty array if not authenticated
@@ -179,11 +223,55 @@ def get_user_tickets():
                 'data': []
             })
         
-        tickets = LotteryTicket.query.filter_by(user_id=user_id).all()
+        rows = _user_tickets_query(user_id).all()
+        
+        return jsonify({
+            'success': True,
+            'data': [ticket.to_dict(prize_id) for ticket, prize_id in rows]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@lottery_bp.route('/tickets/user/paged', methods=['GET'])
+def get_user_tickets_paged():
+    """Получить билеты пользователя постранично (+ сводка по статусам)"""
+    try:
+        user_id = current_user_id()
+        
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Unauthorized'
+            }), 401
+        
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('perPage', 50, type=int), 200)
+        status = request.args.get('status')
+        with_summary = request.args.get('summary', 'false').lower() in ('1', 'true')
+        
+        query = _user_tickets_query(user_id)
+        if status:
+            query = query.filter(LotteryTicket.status == status)
+        
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        
+        data = {
+            'items': [ticket.to_dict(prize_id) for ticket, prize_id in pagination.items],
+            'total': pagination.total,
+            'page': page,
+            'perPage': per_page,
+            'totalPages': pagination.pages
+        }
+        if with_summary:
+            data['summary'] = _user_tickets_summary(user_id)
         
         return jsonify({
             'success': True,
-            'data': [ticket.to_dict() for ticket in tickets]
+            'data': data
         })
         
     except Exception as e:
@@ -256,10 +344,9 @@ def create_test_draw():
 def claim_prize(ticket_id):
     """Claim prize for a winning lottery ticket"""
     try:
-        from flask import session
         from models.contract import SmartContract
         
-        user_id = session.get('user_id')
+        user_id = current_user_id()
         if not user_id:
             return jsonify({
                 'success': False,
@@ -312,7 +399,9 @@ def claim_prize(ticket_id):
         ticket.claimed = True
         ticket.prize_contract_id = contract.id
         
+        event = lottery_win_event(ticket, contract)
         db.session.commit()
+        activity_feed.publish(event)
         
         return jsonify({
             'success': True,
@@ -1,14 +1,30 @@
 from flask import Blueprint, request, jsonify
 from database import db
-from models.marketplace import MarketplaceListing
+from models.marketplace import MarketplaceListing, MarketplaceOffer
 from models.contract import SmartContract
 from models.transaction import Transaction
 from models.user import User
+from services.activity_feed import activity_feed, transaction_event, listing_event
+from services.order_book import order_book, record_changes, remaining_days
+from services.session_store import current_user_id
+from services import candles
+from services import ledger
+from services.purchases import record_purchase
+from services.metrics import marketplace_buy_total
+from services.replicas import replica_read
+from sqlalchemy.orm import selectinload
+from datetime import datetime, timedelta
+import math
 import uuid
 
 marketplace_bp = Blueprint('marketplace', __name__)
 
+def _is_number(value) -> bool:
+    """Конечное число из JSON (bool - подкласс int, не принимаем)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
 @marketplace_bp.route('/listings', methods=['GET'])
+@replica_read
 def get_listings():
     """Получить список объявлений на маркетплейсе"""
     try:
@@ -54,7 +70,8 @@ def get_listings():
             # Default: by discount/popularity
             query = query.order_by(MarketplaceListing.views.desc())
         
-        # Paginate
+        # Paginate (контракты страницы - одним запросом через selectinload)
+        query = query.options(selectinload(MarketplaceListing.contract_item))
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
@@ -118,6 +135,12 @@ def list_item():
                 'error': 'Missing required fields'
             }), 400
         
+        if not _is_number(price) or price <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid price'
+            }), 400
+        
         # Verify contract exists and belongs to seller
         contract = SmartContract.query.get(item_id)
         if not contract:
@@ -138,6 +161,20 @@ def list_item():
                 'error': 'Contract already listed'
             }), 400
         
+        # expiration_date тоже: sweep_expired мог ещё не перевести контракт в expired
+        if contract.status == 'expired' or contract.expiration_date <= datetime.utcnow():
+            return jsonify({
+                'success': False,
+                'error': 'Contract expired'
+            }), 400
+        
+        # Цена за TH/s считается делением на хешрейт
+        if not contract.hashrate or contract.hashrate <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'Contract has no hashrate'
+            }), 400
+        
         # Determine badges
         badges = []
         discount = contract.calculate_discount()
@@ -162,11 +199,27 @@ def list_item():
         contract.current_price = price
         
         db.session.add(listing)
+        db.session.flush()
+        
+        # Исполнить сразу, если есть бид не ниже цены листинга
+        fill = order_book.match(listing, contract, min_price_per_th=price / contract.hashrate)
+        event = transaction_event(fill.transaction) if fill else listing_event(listing)
+        record_changes(bids=[fill.offer_id] if fill else [], asks=[listing.id])
         db.session.commit()
         
+        if fill:
+            order_book.settle(fill)
+        else:
+            order_book.add_ask(
+                listing.id, seller_id, price / contract.hashrate,
+                contract.hashrate, contract.expiration_date
+            )
+        activity_feed.publish(event)
+        
         return jsonify({
             'success': True,
-            'data': listing.to_dict()
+            'data': listing.to_dict(),
+            'fill': fill.to_dict() if fill else None
         })
         
     except Exception as e:
@@ -183,20 +236,30 @@ def buy_item(listing_id):
         buyer_id = request.json.get('buyerId')  # TODO: Get from auth
         
         if not buyer_id:
+            marketplace_buy_total.inc(result='invalid')
             return jsonify({
                 'success': False,
                 'error': 'Buyer ID required'
             }), 400
         
+        if not db.session.query(User.id).filter_by(id=buyer_id).first():
+            marketplace_buy_total.inc(result='not_found')
+            return jsonify({
+                'success': False,
+                'error': 'Buyer not found'
+            }), 404
+        
         listing = MarketplaceListing.query.get(listing_id)
         
         if not listing:
+            marketplace_buy_total.inc(result='not_found')
             return jsonify({
                 'success': False,
                 'error': 'Listing not found'
             }), 404
         
         if listing.status != 'active':
+            marketplace_buy_total.inc(result='conflict')
             return jsonify({
                 'success': False,
                 'error': 'Listing is not active'
@@ -228,15 +291,29 @@ def buy_item(listing_id):
         contract.listed_on_marketplace = False
         
         db.session.add(transaction)
+        record_purchase(transaction, contract, listing.seller)
+        event = transaction_event(transaction)
+        record_changes(asks=[listing_id])
         db.session.commit()
+        order_book.remove_ask(listing_id)
+        activity_feed.publish(event)
+        marketplace_buy_total.inc(result='success')
         
         return jsonify({
             'success': True,
             'data': transaction.to_dict()
         })
         
+    except ledger.InsufficientFunds:
+        db.session.rollback()
+        marketplace_buy_total.inc(result='insufficient_funds')
+        return jsonify({
+            'success': False,
+            'error': 'Insufficient funds'
+        }), 400
     except Exception as e:
         db.session.rollback()
+        marketplace_buy_total.inc(result='error')
         return jsonify({
             'success': False,
             'error': str(e)
@@ -270,7 +347,9 @@ def remove_listing(listing_id):
         # Remove listing
         listing.status = 'cancelled'
         
+        record_changes(asks=[listing_id])
         db.session.commit()
+        order_book.remove_ask(listing_id)
         
         return jsonify({
             'success': True,
@@ -283,3 +362,303 @@ def remove_listing(listing_id):
             'success': False,
             'error': str(e)
         }), 500
+
+@marketplace_bp.route('/offers', methods=['GET'])
+def get_offers():
+    """Активные офферы (биды) от лучшей цены за TH/s к худшей"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        
+        return jsonify({
+            'success': True,
+            'data': [bid.to_dict() for bid in order_book.bids(limit)]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@marketplace_bp.route('/stats', methods=['GET'])
+def get_market_stats():
+    """Floor price, количество и медиана цены за TH/s по корзинам хешрейта и срока"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': order_book.market_snapshot()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@marketplace_bp.route('/candles', methods=['GET'])
+@replica_read
+def get_candles():
+    """OHLCV свечи цены за TH/s (interval: 1m, 1h, 1d)"""
+    try:
+        interval = request.args.get('interval', '1h')
+        if interval not in candles.INTERVALS:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid interval'
+            }), 400
+        
+        start = request.args.get('from')
+        end = request.args.get('to')
+        limit = request.args.get('limit', 300, type=int)
+        
+        items = candles.get_candles(
+            interval,
+            datetime.fromisoformat(start) if start else None,
+            datetime.fromisoformat(end) if end else None,
+            limit
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': [candle.to_dict() for candle in items]
+        })
+        
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid date format'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@marketplace_bp.route('/offers/best', methods=['GET'])
+def get_best_offer():
+    """Лучший оффер и floor price за TH/s (из книги заявок, без запросов к БД)"""
+    try:
+        min_days = request.args.get('minDays', type=int)
+        best = order_book.best_bid(min_days)
+        stats = order_book.stats()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'bestOffer': best.to_dict() if best else None,
+                'floorPrice': stats['floorPrice'],
+                'bidCount': stats['bidCount'],
+                'askCount': stats['askCount'],
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@marketplace_bp.route('/offers', methods=['POST'])
+def create_offer():
+    """Разместить оффер (бид) на покупку по цене за TH/s"""
+    try:
+        user_id = current_user_id()
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Unauthorized'
+            }), 401
+        
+        data = request.get_json()
+        price_per_th = data.get('pricePerTh')
+        budget = data.get('budget')
+        min_expiration_days = data.get('minExpirationDays', 0)
+        expires_in_days = data.get('expiresInDays', 7)
+        
+        if not all(_is_number(v) for v in (price_per_th, budget, min_expiration_days)) \
+                or not (expires_in_days is None or _is_number(expires_in_days)):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid price or budget'
+            }), 400
+        
+        if price_per_th <= 0 or budget < price_per_th or min_expiration_days < 0 \
+                or (expires_in_days is not None and expires_in_days < 0):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid price or budget'
+            }), 400
+        
+        offer = MarketplaceOffer(
+            id=str(uuid.uuid4()),
+            bidder=user_id,
+            price_per_th=price_per_th,
+            budget=budget,
+            remaining_budget=budget,
+            min_expiration_days=int(min_expiration_days),
+            status='active',
+            created_at=datetime.utcnow(),
+            expires_at=datetime.utcnow() + timedelta(days=expires_in_days) if expires_in_days else None
+        )
+        
+        db.session.add(offer)
+        # Бюджет резервируется сразу: исполнение платит из резерва
+        ledger.transfer(offer.id, 'offer_reserve', user_id, ledger.ESCROW_ACCOUNT, 'USDT', budget)
+        data = offer.to_dict()
+        record_changes(bids=[offer.id])
+        db.session.commit()
+        order_book.add_bid(offer)
+        
+        return jsonify({
+            'success': True,
+            'data': data
+        })
+        
+    except ledger.InsufficientFunds:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': 'Insufficient funds'
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@marketplace_bp.route('/offers/<offer_id>', methods=['DELETE'])
+def cancel_offer(offer_id):
+    """Отменить свой оффер"""
+    try:
+        user_id = current_user_id()
+        
+        offer = MarketplaceOffer.query.get(offer_id)
+        
+        if not offer:
+            return jsonify({
+                'success': False,
+                'error': 'Offer not found'
+            }), 404
+        
+        if offer.bidder != user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Unauthorized'
+            }), 403
+        
+        if offer.status != 'active':
+            return jsonify({
+                'success': False,
+                'error': 'Offer is not active'
+            }), 400
+        
+        # Условный UPDATE: оффер мог исполниться в другом процессе
+        result = db.session.execute(
+            db.update(MarketplaceOffer).where(
+                MarketplaceOffer.id == offer_id,
+                MarketplaceOffer.status == 'active'
+            ).values(status='cancelled').returning(MarketplaceOffer.remaining_budget)
+        ).first()
+        if result is None:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': 'Offer is not active'
+            }), 400
+        
+        if result.remaining_budget > 0:
+            ledger.transfer(str(uuid.uuid4()), 'offer_refund', ledger.ESCROW_ACCOUNT,
+                            user_id, 'USDT', result.remaining_budget)
+        record_changes(bids=[offer_id])
+        db.session.commit()
+        order_book.cancel_bid(offer_id)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Offer cancelled'
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@marketplace_bp.route('/sell-now', methods=['POST'])
+def sell_now():
+    """Продать контракт сразу по лучшему подходящему офферу"""
+    try:
+        user_id = current_user_id()
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Unauthorized'
+            }), 401
+        
+        item_id = request.get_json().get('itemId')
+        contract = SmartContract.query.get(item_id)
+        
+        if not contract or contract.owner != user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Contract not found'
+            }), 404
+        
+        if contract.listed_on_marketplace or contract.status == 'mining':
+            return jsonify({
+                'success': False,
+                'error': 'Contract is listed or mining'
+            }), 400
+        
+        # Иначе бид с minExpirationDays=0 купит истёкший контракт
+        if contract.status == 'expired' or contract.expiration_date <= datetime.utcnow():
+            return jsonify({
+                'success': False,
+                'error': 'Contract expired'
+            }), 400
+        
+        best = order_book.best_bid(remaining_days(contract.expiration_date))
+        if not best:
+            return jsonify({
+                'success': False,
+                'error': 'No matching offers'
+            }), 404
+        
+        listing = MarketplaceListing(
+            id=str(uuid.uuid4()),
+            item_type='contract',
+            item_id=contract.id,
+            price=round(best.price_per_th * contract.hashrate, 2),
+            seller=user_id
+        )
+        db.session.add(listing)
+        db.session.flush()
+        
+        fill = order_book.match(listing, contract)
+        if not fill:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': 'No matching offers'
+            }), 404
+        
+        listing.price = fill.amount
+        event = transaction_event(fill.transaction)
+        record_changes(bids=[fill.offer_id], asks=[listing.id])
+        db.session.commit()
+        order_book.settle(fill)
+        activity_feed.publish(event)
+        
+        return jsonify({
+            'success': True,
+            'data': fill.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -4,12 +4,17 @@ from models.mining import MiningSession
 from models.contract import SmartContract
 from models.transaction import Transaction
 from models.user import User
+from services.activity_feed import activity_feed, transaction_event
+from services import ledger
+from services.mining import accrue_earnings
+from services.replicas import replica_read
 import uuid
 from datetime import datetime, timedelta
 
 mining_bp = Blueprint('mining', __name__)
 
 @mining_bp.route('/stats', methods=['GET'])
+@replica_read
 def get_mining_stats():
     """Получить статистику майнинга пользователя"""
     try:
@@ -84,6 +89,12 @@ def start_mining(contract_id):
                 'error': 'Contract already mining'
             }), 400
         
+        if contract.status == 'expired':
+            return jsonify({
+                'success': False,
+                'error': 'Contract expired'
+            }), 400
+        
         # Check if session already exists
         existing_session = MiningSession.query.filter_by(
             contract_id=contract_id
@@ -93,6 +104,8 @@ def start_mining(contract_id):
             if existing_session.status == 'paused':
                 # Resume mining
                 existing_session.status = 'active'
+                # Время на паузе не начисляется
+                existing_session.updated_at = datetime.utcnow()
                 db.session.commit()
                 
                 return jsonify({
@@ -218,7 +231,10 @@ def claim_rewards(contract_id):
         contract.total_earned += claimed_amount
         
         db.session.add(transaction)
+        ledger.transfer(transaction.id, 'mining_payout', 'system:mining_pool', user_id, 'BTC', claimed_amount)
+        event = transaction_event(transaction)
         db.session.commit()
+        activity_feed.publish(event)
         
         return jsonify({
             'success': True,
@@ -237,15 +253,8 @@ def claim_rewards(contract_id):
 def calculate_earnings():
     """Начислить BTC за майнинг (вызывать периодически)"""
     try:
-        sessions = MiningSession.query.filter_by(status='active').all()
-        for session in sessions:
-            last_update = session.updated_at or session.started_at
-            hours_passed = (datetime.utcnow() - last_update).total_seconds() / 3600
-            earnings = (session.daily_income / 24) * hours_passed
-            session.total_earned += earnings
-            session.updated_at = datetime.utcnow()
-        db.session.commit()
-        return jsonify({'success': True, 'updated': len(sessions)})
+        updated = accrue_earnings()
+        return jsonify({'success': True, 'updated': updated})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,147 @@
+from flask import Blueprint, request, jsonify, Response, send_file
+from functools import wraps
+from services.profiler import request_profiler, PROFILE_HEADER, SORT_KEYS as PROFILE_SORT_KEYS
+from services.slow_queries import slow_query_log
+from services.replicas import replica_router
+
+profiler_bp = Blueprint('profiler', __name__)
+
+def admin_required(view):
+    """Доступ по X-Profiler-Token = PROFILER_SECRET; без секрета эндпоинтов как бы нет"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not request_profiler.secret:
+            return jsonify({'success': False, 'error': 'Not found'}), 404
+        if not request_profiler.is_admin(request.headers.get('X-Profiler-Token')):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+@profiler_bp.route('/captures', methods=['GET'])
+@admin_required
+def list_captures():
+    """Список сохранённых профилей (новые первыми)"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': request_profiler.captures(),
+            'toggle': request_profiler.toggle_state()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@profiler_bp.route('/captures/<capture_id>', methods=['GET'])
+@admin_required
+def download_capture(capture_id):
+    """Скачать профиль: pstats (.prof) или текстовый отчёт (?format=text)"""
+    try:
+        if request.args.get('format') == 'text':
+            sort = request.args.get('sort', 'cumulative')
+            if sort not in PROFILE_SORT_KEYS:
+                return jsonify({
+                    'success': False,
+                    'error': f"sort must be one of: {', '.join(PROFILE_SORT_KEYS)}"
+                }), 400
+            text = request_profiler.render_text(
+                capture_id,
+                sort=sort,
+                limit=request.args.get('limit', 50, type=int)
+            )
+            if text is None:
+                return jsonify({'success': False, 'error': 'Capture not found'}), 404
+            return Response(text, mimetype='text/plain')
+
+        path = request_profiler.capture_path(capture_id)
+        if path is None:
+            return jsonify({'success': False, 'error': 'Capture not found'}), 404
+        return send_file(path, mimetype='application/octet-stream',
+                         as_attachment=True, download_name=f'{capture_id}.prof')
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@profiler_bp.route('/toggle', methods=['POST'])
+@admin_required
+def toggle_profiling():
+    """Профилировать следующие count запросов этого воркера (0 - выключить)"""
+    try:
+        data = request.get_json() or {}
+        state = request_profiler.toggle(int(data.get('count', 1)), data.get('endpoint'))
+        return jsonify({
+            'success': True,
+            'data': state
+        })
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'count must be an integer'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@profiler_bp.route('/token', methods=['POST'])
+@admin_required
+def issue_token():
+    """Подписанное значение заголовка X-Profile для профилирования своих запросов"""
+    try:
+        data = request.get_json() or {}
+        ttl = int(data.get('ttl', 600))
+        return jsonify({
+            'success': True,
+            'data': {
+                'header': PROFILE_HEADER,
+                'value': request_profiler.sign(ttl)
+            }
+        })
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'ttl must be an integer'
+        }), 400
+
+@profiler_bp.route('/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_queries():
+    """Top-N медленных запросов этого воркера (sort: totalMs, maxMs, count)"""
+    try:
+        sort = request.args.get('sort', 'totalMs')
+        if sort not in ('totalMs', 'maxMs', 'count'):
+            return jsonify({
+                'success': False,
+                'error': 'sort must be totalMs, maxMs or count'
+            }), 400
+        return jsonify({
+            'success': True,
+            'data': slow_query_log.top(request.args.get('limit', 20, type=int), sort=sort),
+            'thresholdMs': slow_query_log.threshold_ms
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@profiler_bp.route('/slow-queries', methods=['DELETE'])
+@admin_required
+def clear_slow_queries():
+    """Сбросить агрегаты медленных запросов"""
+    slow_query_log.clear()
+    return jsonify({'success': True})
+
+@profiler_bp.route('/replicas', methods=['GET'])
+@admin_required
+def get_replicas():
+    """Состояние реплик для чтений в этом воркере"""
+    return jsonify({
+        'success': True,
+        'data': replica_router.status()
+    })
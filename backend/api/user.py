@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from database import db
 from models.user import User
+from services import referrals
+from services.session_store import current_user_id
 import uuid
 
 user_bp = Blueprint('user', __name__)
@@ -63,6 +65,13 @@ def update_profile():
                 wallet_address=data.get('wallet_address')
             )
             db.session.add(user)
+            
+            # Реферальный код пригласившего (?start=ref_<code>)
+            referral_code = data.get('referralCode')
+            if referral_code:
+                referrer = referrals.find_referrer(referral_code.removeprefix('ref_'))
+                if referrer:
+                    referrals.link_referral(user, referrer.id)
         else:
             # Update existing user
             if 'username' in data:
@@ -87,3 +96,26 @@ def update_profile():
             'success': False,
             'error': str(e)
         }), 500
+
+@user_bp.route('/referrals/stats', methods=['GET'])
+def get_referral_stats():
+    """Статистика рефералов текущего пользователя (приглашено, активные, заработано)"""
+    try:
+        user_id = current_user_id()
+        
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Unauthorized'
+            }), 401
+        
+        return jsonify({
+            'success': True,
+            'data': referrals.referral_stats(user_id)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -1,10 +1,89 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from database import db
 from models.user import User
 from models.contract import SmartContract
+from models.transaction import Transaction
+from services import ledger
+from services.session_store import current_user_id
+from datetime import datetime
+import base64
+import csv
+import io
+import json
 
 wallet_bp = Blueprint('wallet', __name__)
 
+HISTORY_MAX_LIMIT = 200
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_COLUMNS = ['id', 'type', 'amount', 'from', 'to', 'itemId', 'status', 'txHash', 'createdAt', 'confirmedAt']
+
+def _encode_cursor(created_at, tx_id):
+    raw = json.dumps([created_at.isoformat(), tx_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    created_at, tx_id = json.loads(raw)
+    return datetime.fromisoformat(created_at), tx_id
+
+def _history_filters(user_id, args):
+    """Условия выборки истории по параметрам type, from, to (ISO 8601)"""
+    filters = [Transaction.user_id == user_id]
+    types = [t for t in args.get('type', '').split(',') if t]
+    if types:
+        filters.append(Transaction.type.in_(types))
+    if args.get('from'):
+        filters.append(Transaction.created_at >= datetime.fromisoformat(args['from']))
+    if args.get('to'):
+        filters.append(Transaction.created_at < datetime.fromisoformat(args['to']))
+    return filters
+
+def _history_page(filters, after=None, limit=HISTORY_MAX_LIMIT):
+    """
+    Страница истории по убыванию (created_at, id) - keyset пагинация по
+    индексу ix_transactions_user_created, без OFFSET.
+    """
+    query = db.session.query(
+        Transaction.id,
+        Transaction.type,
+        Transaction.amount,
+        Transaction.from_address,
+        Transaction.to_address,
+        Transaction.item_id,
+        Transaction.status,
+        Transaction.tx_hash,
+        Transaction.created_at,
+        Transaction.confirmed_at,
+    ).filter(*filters)
+    if after is not None:
+        query = query.filter(db.tuple_(Transaction.created_at, Transaction.id) < after)
+    return query.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(limit).all()
+
+def _history_row(row):
+    return {
+        'id': row.id,
+        'type': row.type,
+        'amount': row.amount,
+        'from': row.from_address,
+        'to': row.to_address,
+        'itemId': row.item_id,
+        'status': row.status,
+        'txHash': row.tx_hash,
+        'createdAt': row.created_at.isoformat() if row.created_at else None,
+        'confirmedAt': row.confirmed_at.isoformat() if row.confirmed_at else None,
+    }
+
+def _iter_history(filters):
+    """Вся история чанками: в памяти одновременно не больше EXPORT_CHUNK_SIZE строк"""
+    after = None
+    while True:
+        rows = _history_page(filters, after, EXPORT_CHUNK_SIZE)
+        for row in rows:
+            yield _history_row(row)
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            break
+        after = (rows[-1].created_at, rows[-1].id)
+
 @wallet_bp.route('/connect', methods=['POST'])
 def connect_wallet():
     """Подключить TON кошелек"""
@@ -77,6 +156,134 @@ def disconnect_wallet():
             'error': str(e)
         }), 500
 
+@wallet_bp.route('/balance', methods=['GET'])
+def get_balance():
+    """Баланс текущего пользователя по журналу (снимок + хвост проводок)"""
+    try:
+        user_id = current_user_id()
+        
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Unauthorized'
+            }), 401
+        
+        balances = ledger.balances(user_id)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'usdtBalance': balances['USDT'],
+                'btcBalance': balances['BTC'],
+            }
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@wallet_bp.route('/history', methods=['GET'])
+def get_history():
+    """История транзакций текущего пользователя (cursor, limit, type, from, to)"""
+    try:
+        user_id = current_user_id()
+        
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Unauthorized'
+            }), 401
+        
+        limit = min(max(request.args.get('limit', 50, type=int), 1), HISTORY_MAX_LIMIT)
+        cursor = request.args.get('cursor')
+        try:
+            filters = _history_filters(user_id, request.args)
+            after = _decode_cursor(cursor) if cursor else None
+        except (ValueError, TypeError):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid cursor or date range'
+            }), 400
+        
+        # Лишняя строка показывает, есть ли следующая страница
+        rows = _history_page(filters, after, limit + 1)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'items': [_history_row(row) for row in rows],
+                'nextCursor': _encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+                'limit': limit
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@wallet_bp.route('/history/export', methods=['GET'])
+def export_history():
+    """Потоковая выгрузка истории для бухгалтерии (format=csv|ndjson)"""
+    user_id = current_user_id()
+    
+    if not user_id:
+        return jsonify({
+            'success': False,
+            'error': 'Unauthorized'
+        }), 401
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({
+            'success': False,
+            'error': 'Unsupported format'
+        }), 400
+    
+    try:
+        filters = _history_filters(user_id, request.args)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid date range'
+        }), 400
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for i, row in enumerate(_iter_history(filters), 1):
+            writer.writerow(row)
+            if i % EXPORT_CHUNK_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    def generate_ndjson():
+        for row in _iter_history(filters):
+            yield json.dumps(row) + '\n'
+    
+    if export_format == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename=transactions.{export_format}',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
 @wallet_bp.route('/nfts/<address>', methods=['GET'])
 def get_wallet_nfts(address):
     """Получить NFT из кошелька"""
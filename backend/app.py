@@ -1,88 +1,155 @@
 import os
-from flask import Flask
+import sys
+from flask import Flask, request
 from flask_cors import CORS
-from flask_migrate import Migrate
 from dotenv import load_dotenv
-from database import db
+from database import db, init_db
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-
-# Configuration
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///marketplace.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Session configuration for cross-origin cookies
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-
-# Initialize extensions
-db.init_app(app)
-migrate = Migrate(app, db)
-
-# CORS configuration with credentials support
-CORS(app, 
-     origins=os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(','),
-     supports_credentials=True)
-
-# Import models
-from models import user, contract, marketplace, mining, lottery, transaction
-
-# Import and register blueprints
-from api import user_bp, marketplace_bp, mining_bp, lottery_bp, wallet_bp, activity_bp, auth_bp, contract_bp
-
-app.register_blueprint(user_bp, url_prefix='/api/user')
-app.register_blueprint(marketplace_bp, url_prefix='/api/marketplace')
-app.register_blueprint(mining_bp, url_prefix='/api/mining')
-app.register_blueprint(lottery_bp, url_prefix='/api/lottery')
-app.register_blueprint(wallet_bp, url_prefix='/api/wallet')
-app.register_blueprint(activity_bp, url_prefix='/api/activity')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(contract_bp, url_prefix='/api/contracts')
-
-# Health check endpoint
-@app.route('/health')
-def health():
-    return {'status': 'ok', 'message': 'TON Mining Marketplace API is running'}
-
-@app.route('/')
-def index():
-    return {
-        'name': 'TON Mining Marketplace API',
-        'version': '1.0.0',
-        'endpoints': {
-            'health': '/health',
-            'user': '/api/user',
-            'marketplace': '/api/marketplace',
-            'mining': '/api/mining',
-            'lottery': '/api/lottery',
-            'wallet': '/api/wallet',
-            'activity': '/api/activity',
+from config import get_config
+
+def _running_flask_cli():
+    """Запущены командой flask (flask db upgrade и т.п.), а не воркером/скриптом"""
+    return os.path.basename(sys.argv[0]) in ('flask', '__main__.py') and 'flask' in sys.argv[0]
+
+def create_app(config=None):
+    """
+    Создать приложение.
+
+    config: имя окружения ('development', 'production', 'testing'),
+    класс конфигурации или dict с переопределениями поверх APP_ENV.
+    """
+    app = Flask(__name__)
+
+    # Configuration
+    if config is None or isinstance(config, str):
+        app.config.from_object(get_config(config))
+    elif isinstance(config, dict):
+        app.config.from_object(get_config())
+        app.config.update(config)
+    else:
+        app.config.from_object(config)
+
+    # Initialize extensions (пул соединений и PRAGMA SQLite - config.py DB_*/SQLITE_*)
+    init_db(app)
+    migrate_enabled = app.config.get('MIGRATE')
+    if migrate_enabled or (migrate_enabled is None and _running_flask_cli()):
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    # CORS configuration with credentials support
+    CORS(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True)
+
+    # Import models
+    from models import user, contract, marketplace, mining, lottery, transaction, candle, ledger, referral, job_lease
+
+    # Hash the unknown-user login decoy now, not inside the first login request
+    from services.passwords import dummy_hash
+    dummy_hash()
+
+    # Import and register blueprints
+    from api import user_bp, marketplace_bp, mining_bp, lottery_bp, wallet_bp, activity_bp, auth_bp, contract_bp, profiler_bp
+
+    app.register_blueprint(user_bp, url_prefix='/api/user')
+    app.register_blueprint(marketplace_bp, url_prefix='/api/marketplace')
+    app.register_blueprint(mining_bp, url_prefix='/api/mining')
+    app.register_blueprint(lottery_bp, url_prefix='/api/lottery')
+    app.register_blueprint(wallet_bp, url_prefix='/api/wallet')
+    app.register_blueprint(activity_bp, url_prefix='/api/activity')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(contract_bp, url_prefix='/api/contracts')
+    app.register_blueprint(profiler_bp, url_prefix='/api/profiler')
+
+    # Online presence tracking (logged-in users only: IPs behind NAT collide)
+    from services.presence import presence_tracker
+    from services.session_store import current_user_id
+
+    @app.before_request
+    def track_presence():
+        if request.method != 'OPTIONS':
+            presence_tracker.touch(current_user_id())
+
+    # SQL query count/time per request (X-DB-Queries, Server-Timing in dev)
+    from services.query_stats import init_query_stats
+    init_query_stats(app)
+
+    # Prometheus metrics (/metrics); METRICS_DIR aggregates gunicorn workers
+    from services.metrics import init_metrics
+    init_metrics(app)
+
+    # On-demand request profiling (PROFILER_SECRET / PROFILE_SAMPLE_RATE)
+    from services.profiler import request_profiler
+    request_profiler.init_app(app)
+
+    # Slow query log with EXPLAIN capture (SLOW_QUERY_MS, SLOW_QUERY_FILE)
+    from services.slow_queries import slow_query_log
+    slow_query_log.init_app(app)
+
+    # Read replicas for @replica_read endpoints (DATABASE_REPLICA_URLS)
+    from services.replicas import replica_router
+    replica_router.init_app(app)
+
+    # Periodic jobs run in a separate process (python scheduler.py);
+    # in-process mode is for development and tests
+    if app.config.get('SCHEDULER_MODE') == 'inprocess':
+        from scheduler import create_scheduler
+        app.extensions['scheduler'] = create_scheduler(app)
+        app.extensions['scheduler'].start_background()
+
+    # Health check endpoint
+    @app.route('/health')
+    def health():
+        return {'status': 'ok', 'message': 'TON Mining Marketplace API is running'}
+
+    @app.route('/')
+    def index():
+        return {
+            'name': 'TON Mining Marketplace API',
+            'version': '1.0.0',
+            'endpoints': {
+                'health': '/health',
+                'metrics': '/metrics',
+                'user': '/api/user',
+                'marketplace': '/api/marketplace',
+                'mining': '/api/mining',
+                'lottery': '/api/lottery',
+                'wallet': '/api/wallet',
+                'activity': '/api/activity',
+            }
         }
-    }
 
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    return {'success': False, 'error': 'Not found'}, 404
+    # Error handlers
+    @app.errorhandler(404)
+    def not_found(error):
+        return {'success': False, 'error': 'Not found'}, 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        return {'success': False, 'error': 'Internal server error'}, 500
 
-@app.errorhandler(500)
-def internal_error(error):
-    return {'success': False, 'error': 'Internal server error'}, 500
+    return app
+
+def __getattr__(name):
+    # `from app import app` (gunicorn app:app, jobs, скрипты) создаёт приложение
+    # при первом обращении; `from app import create_app` его не строит
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module 'app' has no attribute '{name}'")
 
 if __name__ == '__main__':
+    app = create_app()
+
     # Create tables
     with app.app_context():
         db.create_all()
-    
+
     # Run app
     app.run(
         host='0.0.0.0',
         port=int(os.getenv('PORT', 5001)),
-        debug=os.getenv('FLASK_DEBUG', 'True') == 'True'
+        debug=app.config.get('DEBUG', False)
     )
@@ -0,0 +1,333 @@
+"""
+Сквозной бенчмарк API: задержки p50/p95/p99, пропускная способность и
+число SQL-запросов по эндпоинтам
+
+Запуск (из backend/):
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --concurrency 8 --requests 500 --output bench.json
+    python -m benchmarks.bench_api --db sqlite postgres --postgres-url postgresql+psycopg2://localhost/bench
+    python -m benchmarks.bench_api --compare bench-main.json   # сравнить с прошлым прогоном
+
+Для каждой БД запускается отдельный процесс: создаётся пустая схема,
+загружается синтетический набор (seed_large.generate), затем эндпоинты
+нагружаются через test client в --concurrency потоках. Postgres
+пропускается, если недоступен (--postgres-url или BENCH_POSTGRES_URL).
+
+Результат - JSON (stdout или --output) для сравнения между коммитами.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+PASSWORD = 'password123'
+SORT_OPTIONS = ['discount', 'price_low', 'price_high', 'hashrate_low', 'hashrate_high', 'newest']
+DATASET_DEFAULTS = {
+    'users': 2000,
+    'contracts': 10000,
+    'listings': 3000,
+    'sessions': 1000,
+    'tickets': 5000,
+    'transactions': 20000,
+}
+
+def percentile(sorted_values, p):
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return None
+    index = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+class QueryCounter:
+    """Считает SQL-запросы текущего потока (событие before_cursor_execute)"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+def _summarize(name, samples, errors, wall_seconds):
+    latencies = sorted(ms for ms, _ in samples)
+    queries = [q for _, q in samples]
+    done = len(samples) + errors
+    return {
+        'endpoint': name,
+        'requests': done,
+        'errors': errors,
+        'throughputPerSec': round(done / wall_seconds, 2) if wall_seconds else None,
+        'p50Ms': round(percentile(latencies, 50), 3) if latencies else None,
+        'p95Ms': round(percentile(latencies, 95), 3) if latencies else None,
+        'p99Ms': round(percentile(latencies, 99), 3) if latencies else None,
+        'maxMs': round(latencies[-1], 3) if latencies else None,
+        'meanMs': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        'queriesMean': round(sum(queries) / len(queries), 2) if queries else None,
+        'queriesMax': max(queries) if queries else None,
+    }
+
+def run_backend(database_url, args):
+    """Прогон на одной БД в текущем процессе (DATABASE_URL до импорта app)"""
+    os.environ['DATABASE_URL'] = database_url
+
+    from app import app
+    from database import db
+    from models.user import User
+    from models.marketplace import MarketplaceListing
+    from models.mining import MiningSession
+    from services import ledger
+    import seed_large
+
+    dataset = {k: getattr(args, k) for k in DATASET_DEFAULTS}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        load_started = time.perf_counter()
+        seed_large.generate(seed=args.seed, **dataset)
+        load_seconds = time.perf_counter() - load_started
+        dialect = db.engine.dialect.name
+        counter = QueryCounter(db.engine)
+
+        users = [username for (username,) in db.session.query(User.username).order_by(User.username).limit(200)]
+        mining_users = [user_id for (user_id,) in db.session.query(MiningSession.user_id).distinct().limit(200)]
+        # Прогрев тоже покупает: листингов на --requests замеров и --warmup на каждый поток
+        buy_pool = deque(listing_id for (listing_id,) in db.session.query(MarketplaceListing.id).filter_by(
+            status='active'
+        ).order_by(db.func.random()).limit(args.requests + args.warmup * args.concurrency))
+        buyers = [user_id for (user_id,) in db.session.query(User.id).limit(200)]
+        # Покупка списывает баланс - покупателям хватит на любой листинг из пула
+        deposit = (db.session.query(db.func.max(MarketplaceListing.price)).scalar() or 0) * args.requests
+        for user_id in buyers:
+            ledger.transfer(str(uuid.uuid4()), 'deposit', ledger.SYSTEM_PREFIX + 'deposit', user_id, 'USDT', deposit)
+        db.session.commit()
+
+    rng = random.Random(args.seed)
+    pool_lock = threading.Lock()
+
+    def next_listing():
+        with pool_lock:
+            return buy_pool.popleft() if buy_pool else None
+
+    # Запросы эндпоинтов: (client) -> response или None, если запрос невозможен
+    endpoints = {}
+    for sort in SORT_OPTIONS:
+        endpoints[f'listings:{sort}'] = (
+            lambda client, sort=sort: client.get(
+                '/api/marketplace/listings', query_string={'sortBy': sort, 'page': rng.randint(1, 5)}
+            )
+        )
+    endpoints['mining:stats'] = lambda client: client.get(
+        '/api/mining/stats', query_string={'user_id': rng.choice(mining_users or buyers)}
+    )
+    endpoints['lottery:history'] = lambda client: client.get(
+        '/api/lottery/history', query_string={'page': rng.randint(1, 3)}
+    )
+    endpoints['contracts:user'] = lambda client: client.get('/api/contracts/user')
+
+    def buy(client):
+        listing_id = next_listing()
+        if listing_id is None:
+            return None
+        return client.post(f'/api/marketplace/buy/{listing_id}', json={'buyerId': rng.choice(buyers)})
+    endpoints['marketplace:buy'] = buy
+
+    selected = args.endpoints or list(endpoints)
+
+    # Клиент на поток, каждый залогинен своим пользователем
+    clients = []
+    for i in range(args.concurrency):
+        client = app.test_client()
+        response = client.post('/api/auth/login', json={'username': users[i % len(users)], 'password': PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f'Login failed: {response.get_json()}')
+        clients.append(client)
+
+    def run_endpoint(name):
+        request_fn = endpoints[name]
+        samples = []
+        errors = 0
+        lock = threading.Lock()
+        remaining = [args.requests]
+
+        def worker(client):
+            nonlocal errors
+            for _ in range(args.warmup):
+                request_fn(client)
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                counter.reset()
+                started = time.perf_counter()
+                response = request_fn(client)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if response is None:
+                    return
+                with lock:
+                    if response.status_code >= 400:
+                        errors += 1
+                    else:
+                        samples.append((elapsed_ms, counter.count))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(worker, clients))
+        return _summarize(name, samples, errors, time.perf_counter() - started)
+
+    # Приложение печатает отладку в stdout - уводим её в stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        results = [run_endpoint(name) for name in selected]
+
+    return {
+        'database': dialect,
+        'datasetLoadSeconds': round(load_seconds, 2),
+        'endpoints': results,
+    }
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+def _postgres_available(url):
+    try:
+        from sqlalchemy import create_engine
+        engine = create_engine(url)
+        with engine.connect():
+            pass
+        engine.dispose()
+        return None
+    except Exception as e:
+        return str(e).splitlines()[0]
+
+def _spawn(database_url, argv):
+    """Запустить прогон одной БД в отдельном процессе, вернуть его JSON"""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as out:
+        out_path = out.name
+    try:
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_api', *argv,
+             '--single', database_url, '--output', out_path],
+            cwd=BACKEND_DIR, check=True, stdout=sys.stderr
+        )
+        with open(out_path) as f:
+            return json.load(f)
+    finally:
+        os.unlink(out_path)
+
+def compare(report, baseline):
+    """Изменение p95 и среднего числа запросов относительно baseline"""
+    rows = []
+    for run in report['runs']:
+        base_run = next((b for b in baseline.get('runs', []) if b.get('database') == run.get('database')), None)
+        if not base_run or 'endpoints' not in run:
+            continue
+        base = {e['endpoint']: e for e in base_run.get('endpoints', [])}
+        for e in run['endpoints']:
+            b = base.get(e['endpoint'])
+            if not b or not b.get('p95Ms') or e.get('p95Ms') is None:
+                continue
+            rows.append({
+                'database': run['database'],
+                'endpoint': e['endpoint'],
+                'p95Ms': e['p95Ms'],
+                'baselineP95Ms': b['p95Ms'],
+                'p95ChangePct': round((e['p95Ms'] / b['p95Ms'] - 1) * 100, 1),
+                'queriesMean': e['queriesMean'],
+                'baselineQueriesMean': b.get('queriesMean'),
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end API latency benchmark')
+    parser.add_argument('--db', nargs='+', choices=['sqlite', 'postgres'], default=['sqlite', 'postgres'])
+    parser.add_argument('--postgres-url', default=os.getenv('BENCH_POSTGRES_URL', 'postgresql+psycopg2://localhost/mrkt_bench'))
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=2, help='warmup requests per worker')
+    parser.add_argument('--endpoints', nargs='+', help='subset of endpoints (default: all)')
+    parser.add_argument('--seed', type=int, default=42)
+    for name, default in DATASET_DEFAULTS.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--output', help='write JSON report to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='baseline JSON report to compare against')
+    parser.add_argument('--single', metavar='DATABASE_URL', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_backend(args.single, args)
+        with open(args.output, 'w') as f:
+            json.dump(result, f)
+        return
+
+    passthrough = [
+        '--concurrency', str(args.concurrency), '--requests', str(args.requests),
+        '--warmup', str(args.warmup), '--seed', str(args.seed),
+    ]
+    for name in DATASET_DEFAULTS:
+        passthrough += [f'--{name}', str(getattr(args, name))]
+    if args.endpoints:
+        passthrough += ['--endpoints', *args.endpoints]
+
+    runs = []
+    for backend in args.db:
+        if backend == 'sqlite':
+            db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+            try:
+                runs.append(_spawn(f'sqlite:///{db_file}', passthrough))
+            finally:
+                os.unlink(db_file)
+        else:
+            reason = _postgres_available(args.postgres_url)
+            if reason:
+                runs.append({'database': 'postgresql', 'skipped': reason})
+            else:
+                runs.append(_spawn(args.postgres_url, passthrough))
+
+    report = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'cpuCount': os.cpu_count(),
+        'concurrency': args.concurrency,
+        'requestsPerEndpoint': args.requests,
+        'dataset': {name: getattr(args, name) for name in DATASET_DEFAULTS},
+        'runs': runs,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report['comparison'] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Бенчмарк настроек БД: чтения под конкурирующей записью
+
+Запуск (из backend/):
+    python -m benchmarks.bench_db
+    python -m benchmarks.bench_db --readers 8 --writers 2 --seconds 10
+    python -m benchmarks.bench_db --database-url postgresql+psycopg2://localhost/mrkt_bench
+
+Профили default (DB_TUNING=False - умолчания SQLAlchemy, journal_mode=DELETE)
+и tuned (пул, кеш выражений, WAL и PRAGMA из config.py) прогоняются в
+отдельных процессах на одинаковом наборе данных. Читатели запрашивают
+GET /api/marketplace/listings, писатели - GET /api/marketplace/listings/<id>
+(каждый запрос коммитит views += 1). Печатает JSON с p50/p95/p99 чтений,
+пропускной способностью и ошибками (database is locked) по профилям.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.bench_api import percentile
+
+PROFILES = ('default', 'tuned')
+SORT_OPTIONS = ['discount', 'price_low', 'newest']
+
+def _latency_summary(latencies, errors, seconds):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughputPerSec': round((len(latencies) + errors) / seconds, 2),
+        'p50Ms': round(percentile(latencies, 50), 3) if latencies else None,
+        'p95Ms': round(percentile(latencies, 95), 3) if latencies else None,
+        'p99Ms': round(percentile(latencies, 99), 3) if latencies else None,
+        'maxMs': round(latencies[-1], 3) if latencies else None,
+    }
+
+def run_profile(profile, database_url, args):
+    """Прогон одного профиля в текущем процессе"""
+    from app import create_app
+    from database import db
+    from models.marketplace import MarketplaceListing
+    import seed_large
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'DB_TUNING': profile == 'tuned',
+        'SCHEDULER_MODE': None,
+        'QUERY_STATS': False,
+    })
+    app.logger.disabled = True
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_large.generate(seed=args.seed, users=args.users, contracts=args.contracts,
+                            listings=args.listings, sessions=10, tickets=10, transactions=10)
+        listing_ids = [listing_id for (listing_id,) in db.session.query(MarketplaceListing.id).filter_by(
+            status='active'
+        ).limit(500)]
+        settings = {
+            'dialect': db.engine.dialect.name,
+            'pool': type(db.engine.pool).__name__,
+        }
+        if settings['dialect'] == 'sqlite':
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                settings[pragma] = db.session.execute(db.text(f'PRAGMA {pragma}')).scalar()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'reads': [], 'readErrors': 0, 'writes': [], 'writeErrors': 0}
+
+    def worker(kind, seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            if kind == 'reads':
+                response = client.get('/api/marketplace/listings', query_string={
+                    'sortBy': rng.choice(SORT_OPTIONS), 'page': rng.randint(1, 5)
+                })
+            else:
+                response = client.get(f'/api/marketplace/listings/{rng.choice(listing_ids)}')
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                if response.status_code >= 400:
+                    results[kind[:-1] + 'Errors'] += 1
+                else:
+                    results[kind].append(elapsed_ms)
+
+    threads = [threading.Thread(target=worker, args=('reads', args.seed + i)) for i in range(args.readers)]
+    threads += [threading.Thread(target=worker, args=('writes', -args.seed - i)) for i in range(args.writers)]
+
+    # Приложение печатает отладку в stdout - уводим её в stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+
+    return {
+        'profile': profile,
+        'settings': settings,
+        'reads': _latency_summary(results['reads'], results['readErrors'], seconds),
+        'writes': _latency_summary(results['writes'], results['writeErrors'], seconds),
+    }
+
+def _spawn(profile, database_url, argv):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as out:
+        out_path = out.name
+    try:
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_db', *argv,
+             '--single', profile, '--database-url', database_url, '--output', out_path],
+            cwd=BACKEND_DIR, check=True, stdout=sys.stderr
+        )
+        with open(out_path) as f:
+            return json.load(f)
+    finally:
+        os.unlink(out_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Database tuning benchmark (reads under concurrent writes)')
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+    parser.add_argument('--database-url', help='default: temporary SQLite file per profile')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--contracts', type=int, default=3000)
+    parser.add_argument('--listings', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write JSON report to this file')
+    parser.add_argument('--single', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_profile(args.single, args.database_url, args)
+        with open(args.output, 'w') as f:
+            json.dump(result, f)
+        return
+
+    passthrough = [
+        '--readers', str(args.readers), '--writers', str(args.writers), '--seconds', str(args.seconds),
+        '--users', str(args.users), '--contracts', str(args.contracts), '--listings', str(args.listings),
+        '--seed', str(args.seed),
+    ]
+    runs = []
+    for profile in args.profiles:
+        if args.database_url:
+            runs.append(_spawn(profile, args.database_url, passthrough))
+            continue
+        db_dir = tempfile.mkdtemp()
+        try:
+            runs.append(_spawn(profile, f'sqlite:///{os.path.join(db_dir, "bench.db")}', passthrough))
+        finally:
+            for name in os.listdir(db_dir):
+                os.unlink(os.path.join(db_dir, name))
+            os.rmdir(db_dir)
+
+    report = {
+        'readers': args.readers,
+        'writers': args.writers,
+        'seconds': args.seconds,
+        'cpuCount': os.cpu_count(),
+        'runs': runs,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+if __name__ == '__main__':
+    main()
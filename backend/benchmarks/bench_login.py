@@ -0,0 +1,108 @@
+"""
+Бенчмарк логина: проверок пароля в секунду на ядро
+
+Запуск (из backend/):
+    python -m benchmarks.bench_login
+    python -m benchmarks.bench_login --methods pbkdf2:sha256:600000 scrypt:32768:8:1 --threads 4
+    python -m benchmarks.bench_login --endpoint   # + полный /api/auth/login на временной SQLite
+
+Результат печатается как JSON.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import check_password_hash
+
+from services.passwords import PASSWORD_HASH_METHOD, hash_password
+
+PASSWORD = 'password123'
+
+def _run_for(seconds, threads, fn):
+    """Вызывать fn в threads потоках seconds секунд, вернуть число вызовов"""
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        done = 0
+        while time.perf_counter() < deadline:
+            fn()
+            done += 1
+        return done
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(lambda _: worker(), range(threads)))
+    return total, time.perf_counter() - start
+
+def bench_method(method, seconds, threads):
+    pwhash = hash_password(PASSWORD, method=method)
+    single, single_elapsed = _run_for(seconds, 1, lambda: check_password_hash(pwhash, PASSWORD))
+    multi, multi_elapsed = _run_for(seconds, threads, lambda: check_password_hash(pwhash, PASSWORD))
+    cores = min(threads, os.cpu_count() or 1)
+    return {
+        'method': method,
+        'singleThreadPerSec': round(single / single_elapsed, 2),
+        'threads': threads,
+        'threadedPerSec': round(multi / multi_elapsed, 2),
+        'perCorePerSec': round(multi / multi_elapsed / cores, 2),
+        'msPerVerify': round(single_elapsed / single * 1000, 3),
+    }
+
+def bench_endpoint(seconds, threads):
+    """Полный путь /api/auth/login через test client на временной SQLite"""
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+
+    from app import app
+    from database import db
+    from models.user import User
+
+    with app.app_context():
+        db.create_all()
+        user = User(id='bench-user', username='bench', password_hash=hash_password(PASSWORD))
+        db.session.add(user)
+        db.session.commit()
+
+    def login():
+        client = app.test_client()
+        response = client.post('/api/auth/login', json={'username': 'bench', 'password': PASSWORD})
+        assert response.status_code == 200, response.get_json()
+
+    try:
+        total, elapsed = _run_for(seconds, threads, login)
+    finally:
+        os.unlink(db_file)
+    cores = min(threads, os.cpu_count() or 1)
+    return {
+        'endpoint': '/api/auth/login',
+        'threads': threads,
+        'loginsPerSec': round(total / elapsed, 2),
+        'perCorePerSec': round(total / elapsed / cores, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Password hashing / login throughput benchmark')
+    parser.add_argument('--methods', nargs='+', default=[PASSWORD_HASH_METHOD])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--endpoint', action='store_true', help='also benchmark /api/auth/login')
+    args = parser.parse_args()
+
+    report = {
+        'cpuCount': os.cpu_count(),
+        'methods': [bench_method(m, args.seconds, args.threads) for m in args.methods],
+    }
+    if args.endpoint:
+        report['endpoint'] = bench_endpoint(args.seconds, args.threads)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
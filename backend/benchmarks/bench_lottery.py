@@ -0,0 +1,113 @@
+"""
+Бенчмарк ядра лотереи: билетов в секунду и пиковая память pick_winner
+
+Запуск (из backend/):
+    python -m benchmarks.bench_lottery
+    python -m benchmarks.bench_lottery --sizes 1000 100000 --repeat 5
+    python -m benchmarks.bench_lottery --impl my.fast_core   # альтернативная реализация
+
+Для каждого размера (по умолчанию 10^3 ... 10^7 билетов) измеряется:
+- calculate_score в цикле (билетов/с),
+- pick_winner целиком (билетов/с, лучший из --repeat прогонов),
+- пиковая память pick_winner (tracemalloc, отдельным прогоном - трассировка
+  замедляет выделение памяти и не должна влиять на время).
+
+Перед замером реализация сверяется с эталонными векторами
+(benchmarks.lottery_golden), чтобы быстрая, но неверная версия не
+попала в сравнение. 10^7 билетов требует около 1-2 ГБ памяти.
+Результат печатается как JSON.
+"""
+
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.lottery_golden import DEFAULT_IMPL, GOLDEN_PATH, check_corpus
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+BLOCK_HASHES = [f'{i:064x}' for i in range(6)]
+
+def _best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_seed(impl, repeat):
+    iterations = 10000
+    elapsed = _best_of(repeat, lambda: [impl.get_seed_from_blocks(BLOCK_HASHES) for _ in range(iterations)])
+    return round(iterations / elapsed, 1)
+
+def bench_size(impl, seed_hex, size, repeat):
+    tickets = list(range(1, size + 1))
+
+    def score_all():
+        calculate_score = impl.calculate_score
+        for ticket in tickets:
+            calculate_score(seed_hex, ticket)
+
+    # Большие размеры долгие - хватает одного прогона
+    runs = repeat if size <= 10 ** 5 else 1
+    score_seconds = _best_of(runs, score_all)
+    pick_seconds = _best_of(runs, lambda: impl.pick_winner(seed_hex, tickets))
+
+    gc.collect()
+    tracemalloc.start()
+    result = impl.pick_winner(seed_hex, tickets)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        'tickets': size,
+        'scoreTicketsPerSec': round(size / score_seconds, 1),
+        'pickTicketsPerSec': round(size / pick_seconds, 1),
+        'pickSeconds': round(pick_seconds, 4),
+        'peakMemoryMb': round(peak / 2 ** 20, 2),
+        'peakBytesPerTicket': round(peak / size, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Lottery core throughput/memory benchmark')
+    parser.add_argument('--impl', default=DEFAULT_IMPL)
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-golden', action='store_true', help='do not verify against golden vectors first')
+    args = parser.parse_args()
+
+    impl = importlib.import_module(args.impl)
+
+    if not args.skip_golden:
+        with open(GOLDEN_PATH) as f:
+            failures = check_corpus(impl, json.load(f))
+        if failures:
+            print(json.dumps({'impl': args.impl, 'error': 'golden vectors mismatch', 'failures': failures[:5]}, indent=2))
+            sys.exit(1)
+
+    seed_hex = impl.get_seed_from_blocks(BLOCK_HASHES).hex()
+    results = []
+    for size in args.sizes:
+        results.append(bench_size(impl, seed_hex, size, args.repeat))
+        print(f"{size} tickets: {results[-1]['pickTicketsPerSec']}/s", file=sys.stderr)
+
+    print(json.dumps({
+        'impl': args.impl,
+        'python': platform.python_version(),
+        'seedPerSec': bench_seed(impl, args.repeat),
+        'sizes': results,
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Бенчмарк старта: импорт, create_app() и первый запрос в свежем процессе
+
+Запуск (из backend/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 20 --config production
+    python -m benchmarks.bench_startup --imports 15   # + самые дорогие импорты (-X importtime)
+
+Каждый прогон - новый интерпретатор (как загрузка воркера gunicorn или
+запуск CLI job), поэтому кеши импорта процесса не искажают замер. Медианы
+и максимумы печатаются как JSON.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, time
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+app = app_module.create_app({config!r})
+t2 = time.perf_counter()
+client = app.test_client()
+client.get('/health')
+t3 = time.perf_counter()
+print(json.dumps({{
+    'importMs': (t1 - t0) * 1000,
+    'createAppMs': (t2 - t1) * 1000,
+    'firstRequestMs': (t3 - t2) * 1000,
+}}))
+'''
+
+def run_probe(config, env):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(config=config)],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    wall_ms = (time.perf_counter() - started) * 1000
+    result = json.loads(output.strip().splitlines()[-1])
+    result['processMs'] = wall_ms
+    return result
+
+def top_imports(config, env, limit):
+    """Модули с наибольшим кумулятивным временем импорта (верхние уровни дерева)"""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import app; app.create_app({config!r})'],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            rows.append({'module': name.strip(), 'cumulativeMs': round(int(cumulative) / 1000, 2)})
+    rows.sort(key=lambda row: row['cumulativeMs'], reverse=True)
+    return rows[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description='Application startup benchmark')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--config', default='development', choices=['development', 'production', 'testing'])
+    parser.add_argument('--imports', type=int, default=0, metavar='N', help='also list N slowest imports')
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_file}', SCHEDULER_MODE='')
+    try:
+        runs = [run_probe(args.config, env) for _ in range(args.runs)]
+        imports = top_imports(args.config, env, args.imports) if args.imports else None
+    finally:
+        os.unlink(db_file)
+
+    report = {'config': args.config, 'runs': args.runs, 'python': sys.version.split()[0]}
+    for key in ('importMs', 'createAppMs', 'firstRequestMs', 'processMs'):
+        values = [run[key] for run in runs]
+        report[key] = {'median': round(statistics.median(values), 2), 'max': round(max(values), 2)}
+    if imports is not None:
+        report['slowestImports'] = imports
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Проверка маршрутизации чтений на реплики (services.replicas)
+
+Запуск (из backend/):
+    python -m benchmarks.check_replicas
+    python -m benchmarks.check_replicas --primary-url postgresql+psycopg2://localhost/mrkt \\
+        --replica-url postgresql+psycopg2://localhost:5433/mrkt
+
+По умолчанию основная БД - временный SQLite-файл с seed_data, реплики -
+его снимки (sqlite3 backup), поэтому записи после снимка на репликах не
+видны, как при отставании репликации. С --primary-url/--replica-url
+используются готовые базы (реплику наполняет репликация Postgres; основная
+БД заполняется seed_data - она будет очищена), проверяются только маршруты.
+
+Проверяется: round-robin по репликам, непомеченные эндпоинты на основной
+БД, read-your-writes после покупки, возврат на реплику после
+REPLICA_PIN_SECONDS, обход недоступной реплики и чтение с основной БД, когда
+живых реплик нет. Код выхода 1 при провале.
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+PASSWORD = 'password123'
+PIN_SECONDS = 1
+
+def _snapshot(primary_path, replica_path):
+    """Копия SQLite-базы с учётом WAL"""
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+def _make_app(primary_url, replica_urls):
+    from app import create_app
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': primary_url,
+        'DATABASE_REPLICA_URLS': replica_urls,
+        'REPLICA_PIN_SECONDS': PIN_SECONDS,
+        'QUERY_STATS': True,
+        'SCHEDULER_MODE': None,
+    })
+
+def run_checks(primary_url, replica_urls, snapshot, broken_url):
+    from database import db
+    from models.marketplace import MarketplaceListing
+    from models.user import User
+    from services import ledger
+    import seed_data
+
+    results = []
+
+    def check(name, ok, detail=''):
+        results.append({'check': name, 'ok': bool(ok), 'detail': detail})
+
+    def route(response):
+        return response.headers.get('X-DB-Route')
+
+    app = _make_app(primary_url, replica_urls)
+    with contextlib.redirect_stdout(sys.stderr):
+        seed_data.seed_database(app)
+
+    with app.app_context():
+        buyer = User.query.filter_by(username='alice').first()
+        listing = MarketplaceListing.query.filter(
+            MarketplaceListing.status == 'active', MarketplaceListing.seller != buyer.id
+        ).order_by(MarketplaceListing.listed_at.desc()).first()
+        buyer_id, listing_id = buyer.id, listing.id
+        # Покупка списывает баланс - пополняем покупателя
+        ledger.transfer(str(uuid.uuid4()), 'deposit', ledger.SYSTEM_PREFIX + 'deposit', buyer_id, 'USDT', listing.price)
+        db.session.commit()
+
+    if snapshot:
+        for url in replica_urls:
+            _snapshot(primary_url[len('sqlite:///'):], url[len('sqlite:///'):])
+
+    client = app.test_client()
+    response = client.post('/api/auth/login', json={'username': 'alice', 'password': PASSWORD})
+    check('login', response.status_code == 200, response.status_code)
+    time.sleep(PIN_SECONDS + 0.1)
+
+    # Round-robin
+    routes = [route(client.get('/api/marketplace/listings')) for _ in range(len(replica_urls) * 2)]
+    expected = [f'replica_{i % len(replica_urls)}' for i in range(len(replica_urls) * 2)]
+    check('round-robin over replicas', routes == expected, routes)
+
+    # GET с записью (views += 1) не помечен - основная БД
+    response = client.get(f'/api/marketplace/listings/{listing_id}')
+    check('unmarked endpoint reads primary', route(response) == 'primary', route(response))
+    time.sleep(PIN_SECONDS + 0.1)
+
+    # Read-your-writes
+    response = client.post(f'/api/marketplace/buy/{listing_id}', json={'buyerId': buyer_id})
+    check('buy on primary', response.status_code == 200, response.get_json().get('error'))
+    response = client.get('/api/marketplace/listings', query_string={'sortBy': 'newest'})
+    ids = [item['id'] for item in response.get_json()['data']['items']]
+    check('pinned to primary after write', route(response) == 'primary (pinned)', route(response))
+    check('own purchase visible', listing_id not in ids)
+
+    time.sleep(PIN_SECONDS + 0.1)
+    response = client.get('/api/marketplace/listings', query_string={'sortBy': 'newest'})
+    check('back to replica after pin', (route(response) or '').startswith('replica_'), route(response))
+    if snapshot:
+        ids = [item['id'] for item in response.get_json()['data']['items']]
+        check('replica data is the snapshot (stale)', listing_id in ids)
+
+    # Недоступная реплика обходится, без живых реплик - основная БД
+    app = _make_app(primary_url, [broken_url, replica_urls[0]])
+    client = app.test_client()
+    routes = [route(client.get('/api/lottery/history')) for _ in range(3)]
+    check('failover skips dead replica', routes == ['replica_1'] * 3, routes)
+    metrics = client.get('/metrics').get_data(as_text=True)
+    check('dead replica reported in metrics', 'db_replica_up{bind="replica_0"} 0' in metrics)
+
+    app = _make_app(primary_url, [broken_url])
+    client = app.test_client()
+    response = client.get('/api/lottery/history')
+    check('no live replica reads primary',
+          route(response) == 'primary (no replica)' and response.status_code == 200, route(response))
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Read replica routing check')
+    parser.add_argument('--primary-url', help='default: temporary SQLite file')
+    parser.add_argument('--replica-url', nargs='+', help='default: two snapshots of the primary')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    broken_url = f'sqlite:///{os.path.join(tmp_dir, "missing", "replica.db")}'
+    try:
+        if args.primary_url:
+            if not args.replica_url:
+                parser.error('--replica-url is required with --primary-url')
+            results = run_checks(args.primary_url, args.replica_url, False, broken_url)
+        else:
+            replica_urls = [f'sqlite:///{os.path.join(tmp_dir, f"replica_{i}.db")}' for i in range(2)]
+            results = run_checks(f'sqlite:///{os.path.join(tmp_dir, "primary.db")}', replica_urls,
+                                 True, broken_url)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    failed = [r for r in results if not r['ok']]
+    for r in results:
+        print(f"{'ok  ' if r['ok'] else 'FAIL'} {r['check']}" + (f"  ({r['detail']})" if r['detail'] != '' else ''))
+    print(f'{len(results) - len(failed)}/{len(results)} checks passed')
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
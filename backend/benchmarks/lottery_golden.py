@@ -0,0 +1,219 @@
+"""
+Эталонные векторы лотереи: результаты lottery_core должны совпадать бит в бит
+
+Розыгрыш проверяем извне (seed из хешей блоков -> score билетов -> победитель
+и proof), поэтому любая оптимизированная реализация обязана воспроизводить
+эти векторы точно, включая tie-breaker и fallback.
+
+Запуск (из backend/):
+    python -m benchmarks.lottery_golden                       # проверить текущую реализацию
+    python -m benchmarks.lottery_golden --impl my.fast_core   # проверить альтернативный модуль
+    python -m benchmarks.lottery_golden --write               # пересоздать корпус (только осознанно!)
+
+Корпус хранится в benchmarks/golden/lottery.json. Сценарии с ничьей
+подменяют calculate_score модуля реализации (unittest.mock), поэтому
+реализация должна вычислять score через свою calculate_score уровня модуля.
+Код выхода 1, если хоть один вектор не совпал.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import random
+import sys
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'lottery.json')
+DEFAULT_IMPL = 'lottery.lottery_core'
+CORPUS_VERSION = 1
+
+def _block_hash(i):
+    return hashlib.sha256(f'block:{i}'.encode()).hexdigest()
+
+def scores_digest(scores):
+    """SHA256 по отсортированным парам билет:score - компактная фиксация всех score"""
+    h = hashlib.sha256()
+    for ticket in sorted(scores):
+        h.update(f'{ticket}:{scores[ticket]}\n'.encode())
+    return h.hexdigest()
+
+def _jsonable_proof(proof):
+    # score - 256-битные числа, в JSON храним строками
+    return {k: str(v) if isinstance(v, int) and not isinstance(v, bool) and k.endswith('Score') else v
+            for k, v in proof.items()}
+
+# Входные данные корпуса (детерминированы, не зависят от реализации)
+
+def _seed_inputs():
+    return [
+        [],
+        [_block_hash(0)],
+        [_block_hash(i) for i in range(3)],
+        [_block_hash(i) for i in range(6)],
+        # Реальные хеши блоков Bitcoin (genesis и #1)
+        ['000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f',
+         '00000000839a8e6886ab5951d76f411475428afc90947ee320161bbf18eb6048'],
+        ['ABCDEF', 'abcdef'],  # Регистр не нормализуется
+    ]
+
+def _score_inputs():
+    seeds = [hashlib.sha256(b'').hexdigest(), hashlib.sha256(b'mrkt').hexdigest(), 'seed', '']
+    tickets = [0, 1, 7, 42, 999_999, 2 ** 31 - 1, 2 ** 64, -1]
+    return [(seed, ticket) for seed in seeds for ticket in tickets]
+
+def _pick_inputs():
+    rng = random.Random(20240101)
+    seed_a = hashlib.sha256(''.join(_block_hash(i) for i in range(6)).encode()).hexdigest()
+    seed_b = hashlib.sha256(b'mrkt').hexdigest()
+    return [
+        ('single', seed_a, [5], {}),
+        ('pair', seed_a, [1, 2], {}),
+        ('duplicates_unsorted', seed_a, [9, 3, 3, 7, 9, 1, 7], {}),
+        ('range_1000', seed_a, list(range(1, 1001)), {}),
+        ('range_1000_other_seed', seed_b, list(range(1, 1001)), {}),
+        ('sparse_5000', seed_b, rng.sample(range(10 ** 9), 5000), {}),
+        ('large_numbers', seed_b, [2 ** 40 + i for i in range(50)], {}),
+        ('custom_rounds', seed_a, list(range(100)), {'tie_breaker_rounds': 1}),
+    ]
+
+def _tie_inputs():
+    """
+    Сценарии ничьей: overrides задаёт score для строки '{seed}:{ticket}'
+    (аргументы calculate_score), остальные score считаются честно
+    """
+    seed = hashlib.sha256(b'tie').hexdigest()
+    tb = lambda ticket, rnd: f'{seed}:{ticket}:tb{rnd}:{ticket}'
+    main = lambda ticket: f'{seed}:{ticket}'
+    return [
+        # Две минимальных score, развязка в первом раунде (честные tb-score)
+        ('tie_two_round1', seed, [10, 20, 30], {}, {main(10): 0, main(20): 0}),
+        # Три минимальных, в первом раунде снова ничья 20/30, развязка во втором
+        ('tie_three_round2', seed, [10, 20, 30, 40], {}, {
+            main(10): 1, main(20): 1, main(30): 1,
+            tb(10, 1): 5, tb(20, 1): 2, tb(30, 1): 2,
+        }),
+        # Ничья во всех раундах -> fallback на минимальный номер билета
+        ('tie_fallback', seed, [30, 20, 10], {}, {
+            **{main(t): 0 for t in (10, 20, 30)},
+            **{tb(t, r): 7 for t in (10, 20, 30) for r in (1, 2, 3)},
+        }),
+        # Fallback раньше при tie_breaker_rounds=1
+        ('tie_fallback_one_round', seed, [4, 8], {'tie_breaker_rounds': 1}, {
+            main(4): 3, main(8): 3, tb(4, 1): 9, tb(8, 1): 9,
+        }),
+        # Без раундов tie-breaker сразу fallback
+        ('tie_zero_rounds', seed, [4, 8, 15], {'tie_breaker_rounds': 0}, {main(8): 0, main(15): 0}),
+    ]
+
+# Прогон реализации
+
+def _mocked_score(impl, overrides):
+    real = impl.calculate_score
+
+    def fake(seed_hex, ticket_number):
+        key = f'{seed_hex}:{ticket_number}'
+        return overrides[key] if key in overrides else real(seed_hex, ticket_number)
+    return mock.patch.object(impl, 'calculate_score', fake)
+
+def _pick(impl, seed, tickets, kwargs, overrides=None):
+    patch = _mocked_score(impl, overrides) if overrides else contextlib.nullcontext()
+    # pick_winner печатает ход tie-breaker
+    with patch, contextlib.redirect_stdout(io.StringIO()):
+        winner, scores, proof = impl.pick_winner(seed, list(tickets), **kwargs)
+    return {
+        'winner': winner,
+        'proof': _jsonable_proof(proof),
+        'ticketCount': len(scores),
+        'scoresDigest': scores_digest(scores),
+    }
+
+def build_corpus(impl):
+    """Построить корпус по реализации impl (используется только для --write)"""
+    corpus = {'version': CORPUS_VERSION, 'seeds': [], 'scores': [], 'picks': [], 'ties': [], 'errors': []}
+    for block_hashes in _seed_inputs():
+        corpus['seeds'].append({'blockHashes': block_hashes, 'seedHex': impl.get_seed_from_blocks(block_hashes).hex()})
+    for seed, ticket in _score_inputs():
+        corpus['scores'].append({'seedHex': seed, 'ticket': ticket, 'score': str(impl.calculate_score(seed, ticket))})
+    for name, seed, tickets, kwargs in _pick_inputs():
+        corpus['picks'].append({'name': name, 'seedHex': seed, 'tickets': tickets, 'kwargs': kwargs,
+                                **_pick(impl, seed, tickets, kwargs)})
+    for name, seed, tickets, kwargs, overrides in _tie_inputs():
+        corpus['ties'].append({'name': name, 'seedHex': seed, 'tickets': tickets, 'kwargs': kwargs,
+                               'overrides': {k: str(v) for k, v in overrides.items()},
+                               **_pick(impl, seed, tickets, kwargs, overrides)})
+    corpus['errors'].append({'name': 'no_tickets', 'seedHex': 'seed', 'tickets': [], 'error': 'ValueError'})
+    return corpus
+
+def check_corpus(impl, corpus):
+    """Сверить реализацию с корпусом, вернуть список расхождений"""
+    failures = []
+
+    def expect(case, field, expected, actual):
+        if expected != actual:
+            failures.append({'case': case, 'field': field, 'expected': expected, 'actual': actual})
+
+    for i, case in enumerate(corpus['seeds']):
+        expect(f'seeds[{i}]', 'seedHex', case['seedHex'], impl.get_seed_from_blocks(case['blockHashes']).hex())
+    for i, case in enumerate(corpus['scores']):
+        expect(f'scores[{i}]', 'score', case['score'], str(impl.calculate_score(case['seedHex'], case['ticket'])))
+
+    for group in ('picks', 'ties'):
+        for case in corpus[group]:
+            overrides = {k: int(v) for k, v in case.get('overrides', {}).items()}
+            try:
+                actual = _pick(impl, case['seedHex'], case['tickets'], case['kwargs'], overrides)
+            except Exception as e:
+                failures.append({'case': case['name'], 'field': 'exception', 'expected': None, 'actual': repr(e)})
+                continue
+            for field in ('winner', 'proof', 'ticketCount', 'scoresDigest'):
+                expect(case['name'], field, case[field], actual[field])
+
+    for case in corpus['errors']:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                impl.pick_winner(case['seedHex'], case['tickets'])
+            actual = None
+        except Exception as e:
+            actual = type(e).__name__
+        expect(case['name'], 'error', case['error'], actual)
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Lottery golden-vector equivalence check')
+    parser.add_argument('--impl', default=DEFAULT_IMPL, help='module with get_seed_from_blocks/calculate_score/pick_winner')
+    parser.add_argument('--corpus', default=GOLDEN_PATH)
+    parser.add_argument('--write', action='store_true', help='regenerate the corpus from --impl')
+    args = parser.parse_args()
+
+    impl = importlib.import_module(args.impl)
+
+    if args.write:
+        os.makedirs(os.path.dirname(args.corpus), exist_ok=True)
+        with open(args.corpus, 'w') as f:
+            json.dump(build_corpus(impl), f, indent=1)
+            f.write('\n')
+        print(json.dumps({'written': args.corpus}))
+        return
+
+    with open(args.corpus) as f:
+        corpus = json.load(f)
+    failures = check_corpus(impl, corpus)
+    total = sum(len(corpus[group]) for group in ('seeds', 'scores', 'picks', 'ties', 'errors'))
+    print(json.dumps({
+        'impl': args.impl,
+        'corpusVersion': corpus.get('version'),
+        'cases': total,
+        'failed': len(failures),
+        'failures': failures[:20],
+    }, indent=2))
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Бюджет SQL-запросов по эндпоинтам: N+1 регрессии ломают CI
+
+Запуск (из backend/):
+    python -m benchmarks.query_budget            # код выхода 1 при превышении бюджета
+    python -m benchmarks.query_budget --report   # только показать фактические значения
+
+На временной SQLite с seed_data.seed_database() каждый эндпоинт из
+QUERY_BUDGETS вызывается через test client (залогинен alice) внутри
+services.query_stats.count_queries(). Ошибка, если запросов больше бюджета
+или одна форма запроса повторилась больше MAX_SHAPE_REPEATS раз - признак
+N+1, который на маленьких seed-данных ещё не вышел за бюджет.
+Результат печатается как JSON.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+PASSWORD = 'password123'
+MAX_SHAPE_REPEATS = 3
+
+# (метод, путь, максимум запросов); {user_id} подставляется после логина
+QUERY_BUDGETS = [
+    ('GET', '/api/marketplace/listings', 3),
+    ('GET', '/api/marketplace/listings?sortBy=price_low', 3),
+    ('GET', '/api/marketplace/listings?sortBy=hashrate_high', 3),
+    # Первое обращение к книге: версия (+ создание её строки в новой БД) и построение (2); дальше 0-1
+    ('GET', '/api/marketplace/stats', 4),
+    ('GET', '/api/lottery/current', 2),
+    ('GET', '/api/lottery/history', 3),
+    ('GET', '/api/lottery/tickets/user/paged', 2),
+    ('GET', '/api/mining/stats?user_id={user_id}', 1),
+    ('GET', '/api/contracts/user', 1),
+    ('GET', '/api/wallet/balance', 4),
+    ('GET', '/api/wallet/history', 1),
+    ('GET', '/api/user/referrals/stats', 2),
+]
+
+def run(username):
+    from app import app
+    import seed_data
+    from services.query_stats import count_queries
+
+    with contextlib.redirect_stdout(sys.stderr):
+        seed_data.seed_database()
+
+    client = app.test_client()
+    response = client.post('/api/auth/login', json={'username': username, 'password': PASSWORD})
+    if response.status_code != 200:
+        raise RuntimeError(f'Login failed: {response.get_json()}')
+    user_id = response.get_json()['data']['userId']
+
+    results = []
+    for method, path, budget in QUERY_BUDGETS:
+        url = path.format(user_id=user_id)
+        with contextlib.redirect_stdout(sys.stderr), count_queries() as queries:
+            response = client.open(url, method=method)
+        max_repeat = max(queries.shapes.values(), default=0)
+        problems = []
+        if response.status_code >= 400:
+            problems.append(f'status {response.status_code}')
+        if queries.count > budget:
+            problems.append(f'{queries.count} queries > budget {budget}')
+        if max_repeat > MAX_SHAPE_REPEATS:
+            problems.append(f'same query repeated {max_repeat} times')
+        results.append({
+            'endpoint': f'{method} {path}',
+            'queries': queries.count,
+            'budget': budget,
+            'maxShapeRepeat': max_repeat,
+            'ok': not problems,
+            'problems': problems,
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-endpoint SQL query budget check')
+    parser.add_argument('--report', action='store_true', help='print counts without failing')
+    parser.add_argument('--username', default='alice')
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+    try:
+        results = run(args.username)
+    finally:
+        os.unlink(db_file)
+
+    failed = [r for r in results if not r['ok']]
+    print(json.dumps({'failed': len(failed), 'endpoints': results}, indent=2))
+    if failed and not args.report:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Конфигурация приложения по окружениям
+
+create_app() берёт класс по APP_ENV (development, production, testing;
+по умолчанию development). Значения читаются из переменных окружения при
+импорте модуля.
+"""
+
+import os
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default) == 'True'
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+class Config:
+    SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///marketplace.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Настройки движка (database.engine_options); DB_TUNING=False - умолчания SQLAlchemy
+    DB_TUNING = _flag('DB_TUNING', 'True')
+    DB_POOL_SIZE = _int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW = _int('DB_MAX_OVERFLOW', 20)
+    DB_POOL_TIMEOUT = _int('DB_POOL_TIMEOUT', 10)
+    DB_POOL_RECYCLE = _int('DB_POOL_RECYCLE', 1800)
+    DB_POOL_PRE_PING = _flag('DB_POOL_PRE_PING', 'True')
+    # Кеш скомпилированных SQL-выражений SQLAlchemy (на движок) и подготовленных
+    # выражений sqlite3 (на соединение)
+    DB_QUERY_CACHE_SIZE = _int('DB_QUERY_CACHE_SIZE', 1200)
+    SQLITE_CACHED_STATEMENTS = _int('SQLITE_CACHED_STATEMENTS', 256)
+
+    # Реплики для чтений (через запятую); маршрутизация - services.replicas
+    DATABASE_REPLICA_URLS = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url]
+    # Сколько секунд после своей записи клиент читает только с основной БД
+    REPLICA_PIN_SECONDS = _int('REPLICA_PIN_SECONDS', 5)
+    # Проверка реплики не чаще раза в N секунд; упавшая исключается на REPLICA_RETRY_SECONDS
+    REPLICA_CHECK_SECONDS = _int('REPLICA_CHECK_SECONDS', 10)
+    REPLICA_RETRY_SECONDS = _int('REPLICA_RETRY_SECONDS', 30)
+    # Postgres: реплика с отставанием больше N секунд считается недоступной (0 - не проверять)
+    REPLICA_MAX_LAG_SECONDS = _int('REPLICA_MAX_LAG_SECONDS', 0)
+
+    # PRAGMA для каждого нового соединения SQLite (database.sqlite_pragmas)
+    SQLITE_WAL = _flag('SQLITE_WAL', 'True')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = _int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    SQLITE_MMAP_SIZE = _int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+    SQLITE_FOREIGN_KEYS = _flag('SQLITE_FOREIGN_KEYS', 'True')
+
+    # Session configuration for cross-origin cookies
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    SESSION_COOKIE_SECURE = False
+    SESSION_COOKIE_HTTPONLY = True
+
+    CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
+
+    # inprocess - планировщик в потоке приложения (разработка); иначе python scheduler.py
+    SCHEDULER_MODE = os.getenv('SCHEDULER_MODE')
+    # Flask-Migrate (тянет alembic, ~0.3 с импорта): None - только под командой flask
+    MIGRATE = None
+
+class DevelopmentConfig(Config):
+    DEBUG = _flag('FLASK_DEBUG', 'True')
+    QUERY_STATS = _flag('QUERY_STATS', 'True')
+
+class ProductionConfig(Config):
+    DEBUG = False
+    SESSION_COOKIE_SECURE = _flag('SESSION_COOKIE_SECURE', 'True')
+    QUERY_STATS = _flag('QUERY_STATS', 'False')
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite://')
+    QUERY_STATS = True
+    SCHEDULER_MODE = None
+    MIGRATE = False
+    DATABASE_REPLICA_URLS = []
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+def get_config(name=None):
+    """Класс конфигурации по имени (или APP_ENV)"""
+    name = name or os.getenv('APP_ENV') or os.getenv('FLASK_ENV') or 'development'
+    if name not in CONFIGS:
+        raise ValueError(f'Unknown config: {name}')
+    return CONFIGS[name]
@@ -1,6 +1,113 @@
 """
 Database instance - отдельный файл чтобы избежать circular imports
+
+engine_options() и sqlite_pragmas() превращают DB_*/SQLITE_* из config.py
+в параметры движка: пул соединений, кеш выражений и PRAGMA SQLite (WAL -
+читатели не ждут пишущую транзакцию).
+
+Реплики из DATABASE_REPLICA_URLS подключаются как binds replica_0, replica_1...
+RoutingSession отправляет на назначенную запросу реплику только чтения;
+какую реплику и когда назначать, решает services.replicas.
 """
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Select
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+class RoutingSession(Session):
+    """
+    Session с репликой для чтений: если запросу назначена реплика
+    (info['replica']), SELECT без FOR UPDATE идут на неё, пока сессия
+    ничего не записала. Flush, UPDATE/DELETE и всё после первой записи -
+    на основную БД.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None and not self._flushing and not self.info.get('wrote') \
+                and isinstance(clause, Select) and clause._for_update_arg is None:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_flush(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def _is_sqlite_memory(url) -> bool:
+    return url.database in (None, '', ':memory:') or 'mode=memory' in str(url)
+
+def engine_options(config, uri=None) -> dict:
+    """Параметры движка для uri (по умолчанию SQLALCHEMY_DATABASE_URI) по DB_* из конфигурации"""
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    options = {'query_cache_size': config['DB_QUERY_CACHE_SIZE']}
+
+    if url.get_backend_name() == 'sqlite':
+        options['connect_args'] = {'cached_statements': config['SQLITE_CACHED_STATEMENTS']}
+        # In-memory база - одно соединение (StaticPool Flask-SQLAlchemy), пул не настраивается
+        if _is_sqlite_memory(url):
+            return options
+    else:
+        # Разорванные сервером соединения (рестарт, idle timeout) - проверка при выдаче
+        options['pool_pre_ping'] = config['DB_POOL_PRE_PING']
+
+    options.update(
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE'],
+    )
+    return options
+
+def sqlite_pragmas(config) -> list:
+    """PRAGMA для нового соединения SQLite"""
+    pragmas = [
+        f"busy_timeout = {config['SQLITE_BUSY_TIMEOUT_MS']}",
+        f"synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"mmap_size = {config['SQLITE_MMAP_SIZE']}",
+        f"foreign_keys = {'ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'}",
+    ]
+    if config['SQLITE_WAL']:
+        pragmas.insert(0, 'journal_mode = WAL')
+    return pragmas
+
+def init_db(app) -> None:
+    """db.init_app с настройками движка, репликами и PRAGMA для SQLite"""
+    tuning = app.config['DB_TUNING']
+    if tuning:
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for index, url in enumerate(app.config.get('DATABASE_REPLICA_URLS') or []):
+        binds[f'{REPLICA_BIND_PREFIX}{index}'] = dict(engine_options(app.config, url) if tuning else {}, url=url)
+    db.init_app(app)
+    if not tuning:
+        return
+
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name != 'sqlite':
+                continue
+            if _is_sqlite_memory(engine.url):
+                # journal_mode/mmap в памяти не применимы
+                engine_pragmas = [p for p in pragmas if p.startswith(('busy_timeout', 'foreign_keys'))]
+            else:
+                engine_pragmas = pragmas
 
-db = SQLAlchemy()
+            @event.listens_for(engine, 'connect')
+            def set_pragmas(dbapi_connection, connection_record, pragmas=engine_pragmas):
+                cursor = dbapi_connection.cursor()
+                try:
+                    for pragma in pragmas:
+                        cursor.execute(f'PRAGMA {pragma}')
+                finally:
+                    cursor.close()
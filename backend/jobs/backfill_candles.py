@@ -0,0 +1,28 @@
+"""
+Пересборка OHLCV свечей из истории сделок
+Запустить (из backend/):
+    python -m jobs.backfill_candles
+    python -m jobs.backfill_candles --since 2025-01-01 --chunk-size 10000
+"""
+
+import argparse
+from datetime import datetime
+
+from app import app
+from services import candles
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild price candles from buy transactions')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='rebuild from this date (default: all history)')
+    parser.add_argument('--chunk-size', type=int, default=candles.BACKFILL_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with app.app_context():
+        processed = candles.backfill(
+            args.since, args.chunk_size,
+            progress=lambda done, day: print(f"Backfilled {done} trades (up to {day.date().isoformat()})")
+        )
+        print(f"✅ Candles rebuilt from {processed} trades")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""
+Перевод истёкших контрактов в статус expired (остановка майнинга, снятие листингов)
+Запустить (из backend/):
+    python -m jobs.expire_contracts
+    python -m jobs.expire_contracts --batch-size 1000 --max-batches 10
+"""
+
+import argparse
+import json
+
+from app import app
+from services.expiration import EXPIRATION_BATCH_SIZE, sweep_expired
+
+def main():
+    parser = argparse.ArgumentParser(description='Expire contracts past their expiration date')
+    parser.add_argument('--batch-size', type=int, default=EXPIRATION_BATCH_SIZE)
+    parser.add_argument('--max-batches', type=int, help='stop after this many batches')
+    args = parser.parse_args()
+
+    with app.app_context():
+        stats = sweep_expired(batch_size=args.batch_size, max_batches=args.max_batches)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+"""
+Достроить closure-таблицу рефералов по users.referred_by и пересчитать friends_invited
+Запустить (из backend/):
+    python -m jobs.rebuild_referrals
+"""
+
+import json
+
+from app import app
+from services.referrals import rebuild_closure
+
+def main():
+    with app.app_context():
+        stats = rebuild_closure()
+    print(json.dumps(stats, indent=2))
+
+if __name__ == '__main__':
+    main()
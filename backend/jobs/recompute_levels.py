@@ -0,0 +1,25 @@
+"""
+Пересчёт total_volume и уровней всех пользователей по истории покупок
+Запустить (из backend/):
+    python -m jobs.recompute_levels
+    python -m jobs.recompute_levels --dry-run
+"""
+
+import argparse
+import json
+
+from app import app
+from services.points import RECOMPUTE_CHUNK_SIZE, recompute_levels
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild user volume and levels from transaction history')
+    parser.add_argument('--chunk-size', type=int, default=RECOMPUTE_CHUNK_SIZE)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    with app.app_context():
+        stats = recompute_levels(chunk_size=args.chunk_size, dry_run=args.dry_run)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+Сверка журнала балансов с кэшем в users (сначала пишет снимки балансов)
+Запустить (из backend/):
+    python -m jobs.reconcile_ledger
+    python -m jobs.reconcile_ledger --open-balances   # сначала проводки для старых балансов
+Код возврата 1, если найдены расхождения.
+"""
+
+import argparse
+import json
+import sys
+
+from app import app
+from database import db
+from services import ledger
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify ledger against cached user balances')
+    parser.add_argument('--chunk-size', type=int, default=ledger.RECONCILE_CHUNK_SIZE)
+    parser.add_argument('--open-balances', action='store_true',
+                        help='post opening entries for users with balances but no ledger entries')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.open_balances:
+            print(f"Opened balances for {ledger.open_balances(args.chunk_size)} users")
+        snapshots = ledger.take_snapshots()
+        db.session.commit()
+        print(f"Wrote {snapshots} balance snapshots")
+        report = ledger.reconcile(args.chunk_size)
+
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report['ok'] else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Пересчёт fair_price, roi и daily_income всех контрактов
+Запустить (из backend/):
+    python -m jobs.revalue_contracts --btc-price 65000
+    python -m jobs.revalue_contracts --difficulty 9.5e13 --discount 0.12 --dry-run
+"""
+
+import argparse
+import json
+
+from app import app
+from services.valuation import (
+    ValuationParams,
+    VALUATION_CHUNK_SIZE,
+    btc_per_th_day_from_difficulty,
+    revalue_contracts,
+)
+
+def main():
+    defaults = ValuationParams()
+    parser = argparse.ArgumentParser(description='Recompute contract valuations')
+    parser.add_argument('--btc-price', type=float, default=defaults.btc_price_usd)
+    parser.add_argument('--btc-per-th-day', type=float, default=defaults.btc_per_th_day)
+    parser.add_argument('--difficulty', type=float, help='derive BTC/TH/day from network difficulty')
+    parser.add_argument('--block-reward', type=float, default=3.125)
+    parser.add_argument('--discount', type=float, default=defaults.annual_discount_rate, help='annual discount rate')
+    parser.add_argument('--tolerance', type=float, default=defaults.tolerance, help='relative change to write back')
+    parser.add_argument('--chunk-size', type=int, default=VALUATION_CHUNK_SIZE)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    btc_per_th_day = args.btc_per_th_day
+    if args.difficulty:
+        btc_per_th_day = btc_per_th_day_from_difficulty(args.difficulty, args.block_reward)
+
+    params = ValuationParams(
+        btc_price_usd=args.btc_price,
+        btc_per_th_day=btc_per_th_day,
+        annual_discount_rate=args.discount,
+        tolerance=args.tolerance,
+    )
+
+    with app.app_context():
+        stats = revalue_contracts(params, chunk_size=args.chunk_size, dry_run=args.dry_run)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == '__main__':
+    main()
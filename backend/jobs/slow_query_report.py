@@ -0,0 +1,37 @@
+"""
+Top-N медленных запросов по журналу SLOW_QUERY_FILE (все воркеры)
+Запустить (из backend/):
+    python -m jobs.slow_query_report
+    python -m jobs.slow_query_report --file /var/log/mrkt/slow.jsonl --top 10 --sort maxMs
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.slow_queries import SLOW_QUERY_FILE, SlowQueryLog
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate the slow query log into a top-N report')
+    parser.add_argument('--file', default=SLOW_QUERY_FILE, required=not SLOW_QUERY_FILE)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--sort', choices=['totalMs', 'maxMs', 'count'], default='totalMs')
+    args = parser.parse_args()
+
+    log = SlowQueryLog(log_file=None, max_shapes=sys.maxsize)
+    entries = 0
+    with open(args.file) as f:
+        for line in f:
+            try:
+                log.record(json.loads(line))
+            except (ValueError, KeyError):
+                continue
+            entries += 1
+
+    print(json.dumps({'entries': entries, 'top': log.top(args.top, sort=args.sort)}, indent=2))
+
+if __name__ == '__main__':
+    main()
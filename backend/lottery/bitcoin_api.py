@@ -3,12 +3,16 @@ Bitcoin API Integration - ported from lottery-BTC-v1
 Получение хешей блоков Bitcoin для лотереи
 """
 
-import requests
 from typing import List, Optional
 import os
 
 BITCOIN_API_URL = os.getenv('BITCOIN_API_URL', 'https://blockstream.info/api')
 
+def _http():
+    """requests (с certifi) заметно удлиняет старт - импортируем при первом обращении к API"""
+    import requests
+    return requests
+
 def get_latest_block_height() -> Optional[int]:
     """
     Получает высоту последнего блока Bitcoin
@@ -18,7 +22,7 @@ def get_latest_block_height() -> Optional[int]:
     """
     try:
         url = f"{BITCOIN_API_URL}/blocks/tip/height"
-        response = requests.get(url, timeout=10)
+        response = _http().get(url, timeout=10)
         response.raise_for_status()
         return int(response.text.strip())
     except Exception as e:
@@ -37,7 +41,7 @@ def get_block_hash(height: int) -> Optional[str]:
     """
     try:
         url = f"{BITCOIN_API_URL}/block-height/{height}"
-        response = requests.get(url, timeout=10)
+        response = _http().get(url, timeout=10)
         response.raise_for_status()
         return response.text.strip()
     except Exception as e:
@@ -101,7 +105,7 @@ def get_block_info(block_hash: str) -> Optional[dict]:
     """
     try:
         url = f"{BITCOIN_API_URL}/block/{block_hash}"
-        response = requests.get(url, timeout=10)
+        response = _http().get(url, timeout=10)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -1,16 +1,29 @@
 from .user import User
 from .contract import SmartContract
-from .marketplace import MarketplaceListing
+from .marketplace import MarketplaceListing, MarketplaceOffer, OrderBookVersion, OrderBookChange
 from .mining import MiningSession
 from .lottery import LotteryDraw, LotteryTicket
 from .transaction import Transaction
+from .candle import PriceCandle
+from .ledger import LedgerEntry, BalanceSnapshot
+from .referral import ReferralLink, ReferralStats
+from .job_lease import JobLease
 
 __all__ = [
     'User',
     'SmartContract',
     'MarketplaceListing',
+    'MarketplaceOffer',
+    'OrderBookVersion',
+    'OrderBookChange',
     'MiningSession',
     'LotteryDraw',
     'LotteryTicket',
     'Transaction',
+    'PriceCandle',
+    'LedgerEntry',
+    'BalanceSnapshot',
+    'ReferralLink',
+    'ReferralStats',
+    'JobLease',
 ]
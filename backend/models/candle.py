@@ -0,0 +1,38 @@
+from datetime import datetime
+from database import db
+
+class PriceCandle(db.Model):
+    """OHLCV свеча цены за TH/s по сделкам покупки (1m, 1h, 1d)"""
+    __tablename__ = 'price_candles'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    interval = db.Column(db.String(8), nullable=False)  # 1m, 1h, 1d
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    open = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    close = db.Column(db.Float, nullable=False)
+    volume = db.Column(db.Float, default=0.0)  # Объём в USDT
+    volume_th = db.Column(db.Float, default=0.0)  # Объём в TH/s
+    trades = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('interval', 'bucket_start', name='uq_price_candles_interval_bucket'),
+    )
+    
+    def to_dict(self):
+        return {
+            'interval': self.interval,
+            'time': self.bucket_start.isoformat() if self.bucket_start else None,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.volume,
+            'volumeTh': self.volume_th,
+            'trades': self.trades,
+        }
+    
+    def __repr__(self):
+        return f'<PriceCandle {self.interval} {self.bucket_start}>'
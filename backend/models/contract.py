@@ -14,7 +14,7 @@ class SmartContract(db.Model):
     current_price = db.Column(db.Float, nullable=False)
     initial_price = db.Column(db.Float)  # Цена при первом выставлении
     owner = db.Column(db.String(36), db.ForeignKey('users.id'), index=True)
-    status = db.Column(db.String(50), default='available')  # available, mining, on_sale, sold
+    status = db.Column(db.String(50), default='available')  # available, owned, mining, on_sale, withdrawn, expired
     listed_on_marketplace = db.Column(db.Boolean, default=False)
     daily_income = db.Column(db.Float, default=0.0)
     total_earned = db.Column(db.Float, default=0.0)
@@ -26,6 +26,11 @@ class SmartContract(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Поиск свежеистёкших контрактов: WHERE status IN (...) AND expiration_date <= now
+    __table_args__ = (
+        db.Index('ix_smart_contracts_status_expiration', 'status', 'expiration_date'),
+    )
+    
     # Relationships
     marketplace_listing = db.relationship('MarketplaceListing', backref='contract_item', uselist=False)
     mining_session = db.relationship('MiningSession', backref='contract', uselist=False)
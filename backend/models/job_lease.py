@@ -0,0 +1,37 @@
+from datetime import datetime
+from database import db
+
+class JobLease(db.Model):
+    """
+    Аренда периодической задачи планировщика: задачу выполняет только
+    владелец действующей аренды. Заодно хранит метрики последнего запуска.
+    """
+    __tablename__ = 'job_leases'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(100))  # host:pid:uuid экземпляра планировщика
+    expires_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_started_at = db.Column(db.DateTime)
+    last_finished_at = db.Column(db.DateTime)
+    last_duration = db.Column(db.Float)  # Секунды
+    last_status = db.Column(db.String(20))  # ok, failed
+    last_error = db.Column(db.Text)
+    runs = db.Column(db.Integer, default=0)
+    failures = db.Column(db.Integer, default=0)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'owner': self.owner,
+            'expiresAt': self.expires_at.isoformat() if self.expires_at else None,
+            'lastStartedAt': self.last_started_at.isoformat() if self.last_started_at else None,
+            'lastFinishedAt': self.last_finished_at.isoformat() if self.last_finished_at else None,
+            'lastDuration': self.last_duration,
+            'lastStatus': self.last_status,
+            'lastError': self.last_error,
+            'runs': self.runs or 0,
+            'failures': self.failures or 0,
+        }
+    
+    def __repr__(self):
+        return f'<JobLease {self.name} {self.owner}>'
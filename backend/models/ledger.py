@@ -0,0 +1,54 @@
+from datetime import datetime
+from database import db
+
+class LedgerEntry(db.Model):
+    """
+    Проводка двойной записи. Суммы в минимальных единицах (integer):
+    USDT - 10^-6, BTC - сатоши (10^-8). Сумма проводок одной группы
+    (entry_group) по каждой валюте равна нулю. Таблица только дополняется.
+    """
+    __tablename__ = 'ledger_entries'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entry_group = db.Column(db.String(36), nullable=False, index=True)  # Transaction.id или uuid
+    account = db.Column(db.String(64), nullable=False)  # user id или system:<name>
+    currency = db.Column(db.String(8), nullable=False)  # USDT, BTC
+    amount = db.Column(db.BigInteger, nullable=False)  # Минимальные единицы, со знаком
+    kind = db.Column(db.String(50), nullable=False)  # opening, purchase, mining_payout
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_ledger_entries_account_currency_id', 'account', 'currency', 'id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'group': self.entry_group,
+            'account': self.account,
+            'currency': self.currency,
+            'amount': self.amount,
+            'kind': self.kind,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+        }
+    
+    def __repr__(self):
+        return f'<LedgerEntry {self.id} {self.account} {self.amount} {self.currency}>'
+
+class BalanceSnapshot(db.Model):
+    """Баланс счёта по всем проводкам с id <= last_entry_id"""
+    __tablename__ = 'balance_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    account = db.Column(db.String(64), nullable=False)
+    currency = db.Column(db.String(8), nullable=False)
+    last_entry_id = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_balance_snapshots_account_currency_entry', 'account', 'currency', 'last_entry_id'),
+    )
+    
+    def __repr__(self):
+        return f'<BalanceSnapshot {self.account} {self.currency} @{self.last_entry_id}>'
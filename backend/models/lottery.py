@@ -2,6 +2,9 @@ from datetime import datetime
 from database import db
 import json
 
+# to_dict() без prize_contract_id розыгрыша: None - это "у розыгрыша нет приза"
+_NOT_LOADED = object()
+
 class LotteryDraw(db.Model):
     __tablename__ = 'lottery_draws'
     
@@ -49,13 +52,24 @@ class LotteryTicket(db.Model):
     prize_contract_id = db.Column(db.String(36), db.ForeignKey('smart_contracts.id'))  # Claimed prize contract
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        from models.lottery import LotteryDraw
+    __table_args__ = (
+        db.Index('ix_lottery_tickets_user_created', 'user_id', 'created_at'),
+    )
+    
+    def to_dict(self, draw_prize_contract_id=_NOT_LOADED):
+        """
+        draw_prize_contract_id: prize_contract_id розыгрыша (в том числе None),
+        если он уже получен вызывающим кодом (например, через JOIN) - тогда
+        лишний запрос к lottery_draws не выполняется
+        """
         prize_contract = None
         if self.draw_id and self.status == 'won':
-            draw = LotteryDraw.query.filter_by(id=self.draw_id).first()
-            if draw and draw.prize_contract_id:
-                prize_contract = draw.prize_contract_id
+            if draw_prize_contract_id is not _NOT_LOADED:
+                prize_contract = draw_prize_contract_id
+            else:
+                draw = db.session.get(LotteryDraw, self.draw_id)
+                if draw and draw.prize_contract_id:
+                    prize_contract = draw.prize_contract_id
         
         return {
             'id': self.id,
@@ -18,10 +18,8 @@ class MarketplaceListing(db.Model):
     sold_at = db.Column(db.DateTime)
     
     def to_dict(self):
-        from models.contract import SmartContract
-        
-        # Get the contract item
-        contract = SmartContract.query.get(self.item_id)
+        # Get the contract item (many-to-one: из identity map или selectinload)
+        contract = self.contract_item
         
         badges_list = self.badges.split(',') if self.badges else []
         
@@ -42,3 +40,58 @@ class MarketplaceListing(db.Model):
     
     def __repr__(self):
         return f'<MarketplaceListing {self.id}>'
+
+class MarketplaceOffer(db.Model):
+    """Бид (оффер): покупатель готов купить контракты по цене за TH/s"""
+    __tablename__ = 'marketplace_offers'
+    
+    id = db.Column(db.String(36), primary_key=True)
+    bidder = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    price_per_th = db.Column(db.Float, nullable=False)  # USDT за 1 TH/s
+    budget = db.Column(db.Float, nullable=False)  # Общий бюджет в USDT
+    remaining_budget = db.Column(db.Float, nullable=False)
+    min_expiration_days = db.Column(db.Integer, default=0)  # Мин. оставшийся срок контракта
+    status = db.Column(db.String(50), default='active')  # active, filled, cancelled, expired
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime)
+    filled_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_marketplace_offers_status_price', 'status', 'price_per_th'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'userId': self.bidder,
+            'pricePerTh': self.price_per_th,
+            'budget': self.budget,
+            'remainingBudget': self.remaining_budget,
+            'minExpirationDays': self.min_expiration_days or 0,
+            'status': self.status,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'expiresAt': self.expires_at.isoformat() if self.expires_at else None,
+        }
+    
+    def __repr__(self):
+        return f'<MarketplaceOffer {self.id}>'
+
+class OrderBookVersion(db.Model):
+    """
+    Счётчик изменений книги заявок (одна строка). Пишущая транзакция
+    увеличивает его перед commit и держит блокировку строки до commit,
+    поэтому версии становятся видны строго по порядку.
+    """
+    __tablename__ = 'order_book_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class OrderBookChange(db.Model):
+    """Листинг или оффер, изменённый транзакцией с этой версией книги"""
+    __tablename__ = 'order_book_changes'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    version = db.Column(db.BigInteger, nullable=False, index=True)
+    kind = db.Column(db.String(8), nullable=False)  # bid, ask
+    ref_id = db.Column(db.String(36), nullable=False)  # MarketplaceOffer.id / MarketplaceListing.id
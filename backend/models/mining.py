@@ -12,6 +12,7 @@ class MiningSession(db.Model):
     daily_income = db.Column(db.Float, default=0.0)
     total_earned = db.Column(db.Float, default=0.0)
     last_payout_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # Последнее начисление
     status = db.Column(db.String(50), default='active')  # active, paused, stopped
     hashrate = db.Column(db.Float, nullable=False)
     
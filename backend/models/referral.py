@@ -0,0 +1,44 @@
+from datetime import datetime
+from database import db
+
+class ReferralLink(db.Model):
+    """
+    Closure-таблица реферального дерева: строка на каждую пару
+    (предок, потомок) с глубиной (1 - прямой реферер). Все предки
+    пользователя читаются одним запросом по индексу на descendant_id.
+    """
+    __tablename__ = 'referral_links'
+    
+    ancestor_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    descendant_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+    earned_points = db.Column(db.Integer, default=0)  # Комиссия предка с покупок потомка
+    total_volume = db.Column(db.Float, default=0.0)  # Объём покупок потомка
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_referral_links_descendant_depth', 'descendant_id', 'depth'),
+    )
+    
+    def __repr__(self):
+        return f'<ReferralLink {self.ancestor_id} -> {self.descendant_id} ({self.depth})>'
+
+class ReferralStats(db.Model):
+    """Счётчики реферальной программы пользователя (обновляются при покупках)"""
+    __tablename__ = 'referral_stats'
+    
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    active_referrals = db.Column(db.Integer, default=0)  # Рефералы с хотя бы одной покупкой
+    earned_points = db.Column(db.Integer, default=0)
+    referred_volume = db.Column(db.Float, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'activeReferrals': self.active_referrals or 0,
+            'earnedPoints': self.earned_points or 0,
+            'referredVolume': self.referred_volume or 0.0,
+        }
+    
+    def __repr__(self):
+        return f'<ReferralStats {self.user_id}>'
@@ -16,6 +16,11 @@ class Transaction(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     confirmed_at = db.Column(db.DateTime)
     
+    # История кошелька: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+    __table_args__ = (
+        db.Index('ix_transactions_user_created', user_id, created_at.desc(), id.desc()),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -1,6 +1,6 @@
 from datetime import datetime
 from database import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from services.passwords import hash_password, needs_rehash, password_verifier
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -39,14 +39,18 @@ class User(db.Model):
     transactions = db.relationship('Transaction', backref='user', lazy='dynamic', foreign_keys='Transaction.user_id')
     
     def set_password(self, password):
-        """Set password hash using werkzeug"""
-        self.password_hash = generate_password_hash(password)
+        """Set password hash using configured PASSWORD_HASH_METHOD"""
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        """Check password against hash using werkzeug"""
+        """Check password against hash (runs in bounded verifier pool)"""
         if not self.password_hash:
             return False
-        return check_password_hash(self.password_hash, password)
+        return password_verifier.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True if stored hash uses a different scheme/parameters than configured"""
+        return bool(self.password_hash) and needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -0,0 +1,97 @@
+"""
+Процесс планировщика периодических задач
+Запустить (из backend/):
+    python scheduler.py                   # цикл планировщика
+    python scheduler.py --list            # расписание задач
+    python scheduler.py --run mining_accrual
+
+Расписание задачи переопределяется переменной SCHEDULE_<ИМЯ>
+(например SCHEDULE_REVALUE_CONTRACTS="*/5 * * * *"), "off" отключает её.
+SCHEDULER_MODE=inprocess запускает планировщик в потоке процесса
+приложения (разработка и тесты) вместо отдельного процесса.
+"""
+
+import argparse
+import json
+import os
+
+from services.scheduler import Scheduler
+
+def _accrue_mining():
+    from services.mining import accrue_earnings
+    accrue_earnings()
+
+def _expire_contracts():
+    from services.expiration import sweep_expired
+    sweep_expired()
+
+def _revalue_contracts():
+    from services.valuation import revalue_contracts
+    revalue_contracts()
+
+def _recompute_levels():
+    from services.points import recompute_levels
+    recompute_levels()
+
+def _reconcile_ledger():
+    from database import db
+    from services import ledger
+    ledger.take_snapshots()
+    db.session.commit()
+    report = ledger.reconcile()
+    if not report['ok']:
+        raise RuntimeError(
+            f"Ledger mismatch: {len(report['balanceMismatches'])} balances, "
+            f"{len(report['snapshotMismatches'])} snapshots, {len(report['unbalancedGroups'])} groups"
+        )
+
+def _prune_order_book():
+    from database import db
+    from services.order_book import prune_changes
+    prune_changes()
+    db.session.commit()
+
+# name, cron, func, jitter (секунды), аренда (секунды)
+JOBS = [
+    ('expire_contracts', '* * * * *', _expire_contracts, 5, 300),
+    ('mining_accrual', '* * * * *', _accrue_mining, 5, 120),
+    ('revalue_contracts', '*/15 * * * *', _revalue_contracts, 30, 900),
+    ('recompute_levels', '0 3 * * *', _recompute_levels, 60, 3600),
+    ('reconcile_ledger', '30 3 * * *', _reconcile_ledger, 60, 3600),
+    ('prune_order_book', '17 * * * *', _prune_order_book, 30, 600),
+]
+
+def create_scheduler(app, **kwargs) -> Scheduler:
+    scheduler = Scheduler(app, **kwargs)
+    for name, cron, func, jitter, lease_seconds in JOBS:
+        cron = os.getenv(f'SCHEDULE_{name.upper()}', cron)
+        if cron == 'off':
+            continue
+        scheduler.add_job(name, cron, func, jitter=jitter, lease_seconds=lease_seconds)
+    return scheduler
+
+def main():
+    parser = argparse.ArgumentParser(description='Run periodic backend jobs')
+    parser.add_argument('--list', action='store_true', help='print job schedule and exit')
+    parser.add_argument('--run', metavar='JOB', help='run one job now and exit')
+    args = parser.parse_args()
+
+    from app import app
+    scheduler = create_scheduler(app)
+
+    if args.list:
+        print(json.dumps(scheduler.metrics(), indent=2))
+        return
+    if args.run:
+        ran = scheduler.run_job(args.run)
+        print(json.dumps({args.run: scheduler.metrics()[args.run], 'ran': ran}, indent=2))
+        return
+
+    print(f"Scheduler {scheduler.owner} started with jobs: {', '.join(scheduler.jobs)}")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+if __name__ == '__main__':
+    main()
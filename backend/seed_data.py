@@ -3,7 +3,7 @@ Seed Data для тестирования
 Запустить: python seed_data.py
 """
 
-from app import app
+from app import create_app
 from database import db
 from models.user import User
 from models.contract import SmartContract
@@ -13,13 +13,12 @@ from datetime import datetime, timedelta
 import uuid
 import json
 import random
-from werkzeug.security import generate_password_hash
+from services.passwords import hash_password
+from services import ledger
 
-def hash_password(password):
-    """Password hashing using werkzeug with pbkdf2"""
-    return generate_password_hash(password, method='pbkdf2:sha256')
-
-def seed_database():
+def seed_database(app=None):
+    """app - уже созданное приложение (тесты, бенчмарки); по умолчанию создаётся своё"""
+    app = app or create_app()
     with app.app_context():
         # Очистить базу данных
         print("Clearing database...")
@@ -347,6 +346,9 @@ def seed_database():
         
         db.session.commit()
         
+        # Вступительные проводки журнала для стартовых балансов
+        ledger.open_balances()
+        
         print("\n✅ Database seeded successfully!")
         print(f"Created {len(users)} users")
         print(f"Created {len(contracts)} contracts")
@@ -0,0 +1,362 @@
+"""
+Генератор большого синтетического набора данных (поверх seed_data.py)
+Запустить (из backend/):
+    python seed_large.py                              # ~10^5 пользователей, 10^6 транзакций
+    python seed_large.py --users 1000 --transactions 20000 --seed 7
+    python seed_large.py --append --transactions 500000 --seed 8
+
+Сначала выполняется seed_data.seed_database() (тестовые пользователи
+alice, bob, ... с паролем password123), затем синтетические строки
+вставляются чанками: в PostgreSQL через COPY FROM STDIN, в остальных БД -
+executemany одного INSERT на чанк. При одном и том же --seed набор данных
+воспроизводится полностью, включая id (uuid5 от seed и номера строки).
+
+Распределения:
+- хешрейт - логнормальное (медиана ~100 TH/s, 10..1000), цена за TH/s
+  20..26 USDT со скидкой 0..40%,
+- владельцы контрактов и авторы транзакций - степенное распределение
+  (несколько "китов" с 10^5 транзакций),
+- время транзакций смещено к недавнему, срок контрактов 90..730 дней,
+  отсчёт от момента запуска.
+Уровни, closure-таблица рефералов, вступительные проводки журнала и
+свечи затем пересобираются из сгенерированных данных.
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import time
+import uuid
+from array import array
+from datetime import datetime, timedelta
+
+from app import app
+from database import db
+from models.user import User
+from models.contract import SmartContract
+from models.marketplace import MarketplaceListing
+from models.mining import MiningSession
+from models.lottery import LotteryDraw, LotteryTicket
+from models.transaction import Transaction
+from services.passwords import hash_password
+
+CHUNK_SIZE = 10000
+BTC_PER_TH_DAY = 0.00000042
+NAMESPACE = uuid.UUID('6f1c1a52-3b0e-4f7e-9d43-0c5b8a1f2e77')
+
+def _uid(seed, kind, index):
+    return str(uuid.uuid5(NAMESPACE, f'{seed}:{kind}:{index}'))
+
+def _skewed(rng, n, power):
+    """Индекс 0..n-1, смещённый к началу (степенное распределение)"""
+    return min(int(n * rng.random() ** power), n - 1)
+
+def _recent(rng, now, days, power=1.5):
+    """Момент в прошлом за days дней, чаще недавний"""
+    return now - timedelta(seconds=days * 86400 * rng.random() ** power)
+
+# Загрузка
+
+def _copy_rows(table, rows):
+    """COPY FROM STDIN (psycopg2) - самый быстрый путь загрузки в PostgreSQL"""
+    columns = list(rows[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.dbapi_connection.cursor()
+    cursor.copy_expert(
+        f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer
+    )
+
+def _insert_rows(table, rows):
+    if not rows:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        _copy_rows(table, rows)
+    else:
+        db.session.execute(table.insert(), rows)
+
+class Loader:
+    """Копит строки таблицы и сбрасывает их чанками с commit"""
+
+    def __init__(self, model, chunk_size):
+        self.table = model.__table__
+        self.chunk_size = chunk_size
+        self.rows = []
+        self.count = 0
+        self.started = time.perf_counter()
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            _insert_rows(self.table, self.rows)
+            db.session.commit()
+            self.count += len(self.rows)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        elapsed = time.perf_counter() - self.started
+        rate = self.count / elapsed if elapsed else 0
+        print(f"  {self.table.name:24} {self.count:>10} rows  {elapsed:7.1f}s  {rate:>9.0f} rows/s")
+
+# Генерация
+
+def generate(users=100000, contracts=200000, listings=50000, sessions=50000, tickets=200000,
+             transactions=1000000, days=365, seed=42, chunk_size=CHUNK_SIZE):
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    # Один хеш на всех: pbkdf2 на каждого пользователя занял бы часы
+    password_hash = hash_password('password123')
+
+    print(f"Generating users={users} contracts={contracts} listings={listings} sessions={sessions} "
+          f"tickets={tickets} transactions={transactions} seed={seed}")
+
+    # Пользователи
+    loader = Loader(User, chunk_size)
+    for i in range(users):
+        created_at = _recent(rng, now, days, power=0.7)
+        loader.add({
+            'id': _uid(seed, 'user', i),
+            'telegram_id': 10 ** 9 + seed * 10 ** 7 + i,
+            'username': f'gen{seed}_{i}',
+            'password_hash': password_hash,
+            'first_name': f'User{i}',
+            'last_name': None,
+            'wallet_address': None,
+            'usdt_balance': round(rng.lognormvariate(4, 1.5), 2),
+            'btc_balance': 0.0,
+            'ecos_points': int(rng.lognormvariate(5, 1.5)),
+            'level': 1,
+            'total_volume': 0.0,  # Пересчитывается из транзакций (recompute_levels)
+            'cashback_bonus': 0.0,
+            'referral_code': f'GEN{seed}X{i}',
+            'referred_by': _uid(seed, 'user', rng.randrange(i)) if i and rng.random() < 0.3 else None,
+            'friends_invited': 0,
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+    loader.close()
+
+    # Контракты: листинги и сессии майнинга - непересекающиеся подмножества
+    picked = rng.sample(range(contracts), min(listings + sessions, contracts))
+    listed = set(picked[:listings])
+    mining = set(picked[listings:])
+    owners = array('I')
+    hashrates = array('d')
+    prices = array('d')
+
+    loader = Loader(SmartContract, chunk_size)
+    for i in range(contracts):
+        hashrate = round(min(max(rng.lognormvariate(4.6, 0.7), 10), 1000), 1)
+        fair_price = round(hashrate * rng.uniform(20, 26), 2)
+        current_price = round(fair_price * (1 - rng.uniform(0, 0.4)), 2)
+        created_at = _recent(rng, now, days, power=1.0)
+        expiration = created_at + timedelta(days=rng.randint(90, 730))
+        owner = _skewed(rng, users, 2)
+        if i in listed:
+            status = 'on_sale'
+        elif i in mining:
+            status = 'mining'
+        elif expiration <= now:
+            status = 'expired'
+        else:
+            status = rng.choice(('available', 'owned'))
+        # Истёкшие не выставляются и не майнят
+        if expiration <= now and status != 'expired':
+            expiration = now + timedelta(days=rng.randint(1, 365))
+        owners.append(owner)
+        hashrates.append(hashrate)
+        prices.append(current_price)
+        loader.add({
+            'id': _uid(seed, 'contract', i),
+            'token_id': f'TON-NFT-G{seed}-{i}',
+            'contract_number': f'MC-G{seed}-{i}',
+            'hashrate': hashrate,
+            'expiration_date': expiration,
+            'fair_price': fair_price,
+            'current_price': current_price,
+            'initial_price': current_price,
+            'owner': _uid(seed, 'user', owner),
+            'status': status,
+            'listed_on_marketplace': status == 'on_sale',
+            'daily_income': hashrate * BTC_PER_TH_DAY,
+            'total_earned': 0.0,
+            'roi': round(rng.uniform(20, 45), 1),
+            'metadata_json': json.dumps({'name': f'Mining Contract #G{i}'}),
+            'mining_started_at': None,
+            'mining_locked_until': None,
+            'cart_add_count': int(rng.expovariate(0.2)),
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+    loader.close()
+
+    # Листинги
+    loader = Loader(MarketplaceListing, chunk_size)
+    for i in sorted(listed):
+        badges = []
+        if rng.random() < 0.2:
+            badges.append('hot')
+        if hashrates[i] >= 100:
+            badges.append('premium')
+        loader.add({
+            'id': _uid(seed, 'listing', i),
+            'item_type': 'contract',
+            'item_id': _uid(seed, 'contract', i),
+            'price': prices[i],
+            'seller': _uid(seed, 'user', owners[i]),
+            'seller_rating': round(rng.uniform(4.0, 5.0), 2),
+            'views': int(rng.expovariate(1 / 200)),
+            'watchlist_count': int(rng.expovariate(1 / 20)),
+            'badges': ','.join(badges),
+            'status': 'active',
+            'listed_at': _recent(rng, now, 30),
+            'sold_at': None,
+        })
+    loader.close()
+
+    # Сессии майнинга
+    loader = Loader(MiningSession, chunk_size)
+    for i in sorted(mining):
+        started_at = _recent(rng, now, 90)
+        daily_income = hashrates[i] * BTC_PER_TH_DAY
+        loader.add({
+            'id': _uid(seed, 'session', i),
+            'contract_id': _uid(seed, 'contract', i),
+            'user_id': _uid(seed, 'user', owners[i]),
+            'started_at': started_at,
+            'stopped_at': None,
+            'daily_income': daily_income,
+            'total_earned': daily_income * (now - started_at).total_seconds() / 86400,
+            'last_payout_at': None,
+            'status': 'active',
+            'hashrate': hashrates[i],
+            'updated_at': now,
+        })
+    loader.close()
+
+    # Розыгрыши и билеты: ~40% билетов участвовали в прошлых розыгрышах
+    draws = max(tickets // 2000, 1) if tickets else 0
+    loader = Loader(LotteryDraw, chunk_size)
+    for d in range(draws):
+        loader.add({
+            'id': _uid(seed, 'draw', d),
+            'draw_number': seed * 10 ** 6 + d + 1,
+            'seed_hex': uuid.UUID(int=rng.getrandbits(128)).hex * 2,
+            'block_hashes': json.dumps([]),
+            'block_heights': json.dumps([]),
+            'tickets': json.dumps([]),
+            'winner': rng.randint(1, 99999),
+            'prize_contract_id': _uid(seed, 'contract', rng.randrange(contracts)) if contracts else None,
+            'draw_date': now - timedelta(days=days * (draws - d) / draws),
+            'verified': True,
+            'proof_json': None,
+        })
+    loader.close()
+
+    loader = Loader(LotteryTicket, chunk_size)
+    for i in range(tickets):
+        draw = rng.randrange(draws) if rng.random() < 0.4 else None
+        if draw is None:
+            status = 'active'
+        else:
+            status = 'won' if rng.random() < 0.001 else 'lost'
+        loader.add({
+            'id': _uid(seed, 'ticket', i),
+            'ticket_number': rng.randint(1, 99999),
+            'user_id': _uid(seed, 'user', _skewed(rng, users, 2)),
+            'draw_id': _uid(seed, 'draw', draw) if draw is not None else None,
+            'status': status,
+            'claimed': False,
+            'prize_contract_id': None,
+            'created_at': _recent(rng, now, days),
+        })
+    loader.close()
+
+    # Транзакции
+    loader = Loader(Transaction, chunk_size)
+    for i in range(transactions):
+        user = _skewed(rng, users, 3)
+        contract = rng.randrange(contracts) if contracts else None
+        kind = rng.random()
+        if kind < 0.6:
+            tx_type = 'buy'
+            amount = prices[contract] if contract is not None else round(rng.lognormvariate(7.5, 1), 2)
+        elif kind < 0.9:
+            tx_type = 'mining_payout'
+            amount = round(rng.expovariate(1 / 0.0005), 8)
+        else:
+            tx_type = rng.choice(('sell', 'transfer'))
+            amount = round(rng.lognormvariate(5, 1.5), 2)
+        created_at = _recent(rng, now, days)
+        user_id = _uid(seed, 'user', user)
+        loader.add({
+            'id': _uid(seed, 'tx', i),
+            'type': tx_type,
+            'amount': amount,
+            'from_address': 'mining_pool' if tx_type == 'mining_payout' else user_id,
+            'to_address': user_id if tx_type == 'mining_payout' else _uid(seed, 'user', rng.randrange(users)),
+            'item_id': _uid(seed, 'contract', contract) if contract is not None else None,
+            'user_id': user_id,
+            'status': 'confirmed' if rng.random() < 0.97 else rng.choice(('pending', 'failed')),
+            'tx_hash': _uid(seed, 'hash', i),
+            'created_at': created_at,
+            'confirmed_at': created_at,
+        })
+    loader.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Load a large synthetic dataset')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--contracts', type=int, default=200000)
+    parser.add_argument('--listings', type=int, default=50000)
+    parser.add_argument('--sessions', type=int, default=50000)
+    parser.add_argument('--tickets', type=int, default=200000)
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=365, help='history length')
+    parser.add_argument('--seed', type=int, default=42, help='RNG seed (also namespaces ids)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--append', action='store_true', help='keep existing data (no seed_data reset)')
+    parser.add_argument('--skip-derived', action='store_true',
+                        help='skip levels, referral closure, ledger opening entries and candles')
+    args = parser.parse_args()
+
+    if args.listings + args.sessions > args.contracts:
+        parser.error('listings + sessions must not exceed contracts')
+    if args.users < 1:
+        parser.error('at least one user is required')
+
+    if not args.append:
+        from seed_data import seed_database
+        seed_database()
+
+    started = time.perf_counter()
+    with app.app_context():
+        generate(
+            users=args.users, contracts=args.contracts, listings=args.listings, sessions=args.sessions,
+            tickets=args.tickets, transactions=args.transactions, days=args.days, seed=args.seed,
+            chunk_size=args.chunk_size,
+        )
+
+        if not args.skip_derived:
+            from services import candles, ledger, points, referrals
+            print("Rebuilding derived data...")
+            print(f"  levels: {points.recompute_levels()}")
+            print(f"  referrals: {referrals.rebuild_closure()}")
+            print(f"  ledger opening balances: {ledger.open_balances()}")
+            print(f"  candles: {candles.backfill()} trades")
+
+    print(f"\n✅ Synthetic dataset loaded in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+"""
+Сервисы backend. Пакет ничего не реэкспортирует: импортируйте модули
+напрямую (from services.order_book import order_book), чтобы импорт
+models не тянул за собой все сервисы.
+"""
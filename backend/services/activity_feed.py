@@ -0,0 +1,184 @@
+"""
+Activity Feed - лента активности в памяти процесса
+
+Пути записи (покупка, выставление на продажу, получение наград) публикуют
+компактные события в ограниченный кольцевой буфер. /api/activity/feed
+отдаёт ленту прямо из буфера, /api/activity/stream пушит новые события
+подключенным клиентам через Server-Sent Events.
+
+При холодном старте буфер один раз заполняется из БД (последний час
+Transaction и MarketplaceListing). Буфер локален для процесса: при
+нескольких воркерах каждый видит свои записи плюс снимок из БД.
+"""
+
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+FEED_BUFFER_SIZE = 500
+FEED_WINDOW = timedelta(hours=1)
+
+def _mask_user(user_id: Optional[str]) -> str:
+    return f'***{str(user_id)[-4:]}'
+
+def generate_activity_message(transaction) -> str:
+    """Генерирует сообщение для активности"""
+    if transaction.type == 'buy':
+        return f'User bought mining contract'
+    elif transaction.type == 'sell':
+        return f'User sold mining contract'
+    elif transaction.type == 'mining_payout':
+        return f'Mining payout claimed'
+    elif transaction.type == 'transfer':
+        return f'Contract transferred'
+    else:
+        return 'Transaction completed'
+
+def transaction_event(transaction) -> Dict[str, Any]:
+    """Событие ленты из Transaction (можно вызывать до commit)"""
+    created_at = transaction.created_at or datetime.utcnow()
+    return {
+        'id': transaction.id,
+        'type': 'sale' if transaction.type == 'buy' else transaction.type,
+        'userId': transaction.user_id,
+        'username': _mask_user(transaction.user_id),
+        'message': generate_activity_message(transaction),
+        'highlight': f'${transaction.amount:.2f}' if transaction.type in ['buy', 'sell'] else None,
+        'itemId': transaction.item_id,
+        'timestamp': created_at.isoformat()
+    }
+
+def listing_event(listing) -> Dict[str, Any]:
+    """Событие ленты из MarketplaceListing (можно вызывать до commit)"""
+    listed_at = listing.listed_at or datetime.utcnow()
+    return {
+        'id': listing.id,
+        'type': 'listing',
+        'userId': listing.seller,
+        'username': _mask_user(listing.seller),
+        'message': f'New listing: Mining contract',
+        'highlight': f'Price: ${listing.price:.2f}',
+        'itemId': listing.item_id,
+        'timestamp': listed_at.isoformat()
+    }
+
+def lottery_win_event(ticket, contract) -> Dict[str, Any]:
+    """Событие ленты о получении приза лотереи"""
+    return {
+        'id': ticket.id,
+        'type': 'lottery_win',
+        'userId': ticket.user_id,
+        'username': _mask_user(ticket.user_id),
+        'message': f'Lottery prize claimed',
+        'highlight': f'{contract.hashrate} TH/s',
+        'itemId': contract.id,
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
+class ActivityFeed:
+    """
+    Ограниченный кольцевой буфер событий с монотонными номерами (seq).
+
+    Номер события используется как id в SSE, поэтому клиент может
+    переподключиться с Last-Event-ID и получить пропущенные события.
+    Номера 1..maxlen зарезервированы под снимок из БД при прогреве: живые
+    события начинаются с maxlen + 1 и свой номер никогда не меняют.
+    """
+
+    def __init__(self, maxlen: int = FEED_BUFFER_SIZE):
+        self._events = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self._seq = maxlen
+        self._warm = False
+        self._warm_lock = threading.Lock()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        """Добавить событие в буфер и разбудить ожидающих подписчиков"""
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event))
+            self._cond.notify_all()
+            return self._seq
+
+    def recent(self, limit: int = 20, window: Optional[timedelta] = FEED_WINDOW) -> List[Dict[str, Any]]:
+        """Последние события, от новых к старым"""
+        self.ensure_warm()
+        cutoff = (datetime.utcnow() - window).isoformat() if window else None
+        with self._cond:
+            snapshot = list(self._events)
+
+        result = []
+        for _, event in reversed(snapshot):
+            if cutoff and event['timestamp'] < cutoff:
+                continue
+            result.append(event)
+            if len(result) >= limit:
+                break
+        return result
+
+    def since(self, seq: int) -> List[tuple]:
+        """События с номером больше seq, от старых к новым"""
+        with self._cond:
+            if seq >= self._seq:
+                return []
+            return [(s, e) for s, e in self._events if s > seq]
+
+    def wait(self, seq: int, timeout: float) -> List[tuple]:
+        """Дождаться событий новее seq (или таймаута)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq, timeout=timeout)
+        return self.since(seq)
+
+    def ensure_warm(self) -> None:
+        """Заполнить буфер из БД при первом обращении (холодный старт)"""
+        if self._warm:
+            return
+        # Запросы к БД - без _cond, чтобы не блокировать publish
+        with self._warm_lock:
+            if self._warm:
+                return
+            events = load_recent_events(self._events.maxlen)
+            with self._cond:
+                # Живые события, опубликованные до прогрева, уже закоммичены и
+                # попали в снимок - оставляем их живые копии с исходными номерами
+                live = list(self._events)
+                live_ids = {event['id'] for _, event in live}
+                snapshot = [event for event in events if event['id'] not in live_ids]
+                first_seq = (live[0][0] if live else self._seq + 1) - len(snapshot)
+                self._events = deque(
+                    [(first_seq + i, event) for i, event in enumerate(snapshot)] + live,
+                    maxlen=self._events.maxlen
+                )
+                self._warm = True
+
+    def reset(self) -> None:
+        with self._cond:
+            self._events.clear()
+            self._warm = False
+
+def load_recent_events(limit: int) -> List[Dict[str, Any]]:
+    """Снимок ленты из БД за последний час, от старых к новым"""
+    from models.transaction import Transaction
+    from models.marketplace import MarketplaceListing
+
+    since = datetime.utcnow() - FEED_WINDOW
+
+    transactions = Transaction.query.filter(
+        Transaction.created_at >= since
+    ).order_by(Transaction.created_at.desc()).limit(limit).all()
+
+    listings = MarketplaceListing.query.filter(
+        MarketplaceListing.listed_at >= since
+    ).order_by(MarketplaceListing.listed_at.desc()).limit(limit).all()
+
+    events = [transaction_event(tx) for tx in transactions]
+    events += [listing_event(listing) for listing in listings]
+    events.sort(key=lambda x: x['timestamp'])
+    return events[-limit:]
+
+activity_feed = ActivityFeed()
@@ -0,0 +1,192 @@
+"""
+Candles - OHLCV свечи цены за TH/s
+
+record_trade() вызывается в пути покупки (в той же транзакции БД, до
+commit) и обновляет свечи 1m/1h/1d одним UPSERT на интервал
+(INSERT ... ON CONFLICT DO UPDATE - SQLite и PostgreSQL), поэтому
+параллельные воркеры не конфликтуют по уникальному ключу.
+
+backfill() пересобирает свечи из истории Transaction(type='buy') по дням:
+удаление свечей дня и их сборка из сделок дня (чанками по keyset
+created_at, id, свёртка в памяти, тот же UPSERT) - одна транзакция. На
+PostgreSQL она сначала блокирует price_candles от записи, поэтому
+record_trade() параллельной покупки ждёт её commit и не попадает в свечи
+дважды; в SQLite запись и так ждёт единственного пишущего.
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import db
+from models.candle import PriceCandle
+
+INTERVALS = {
+    '1m': timedelta(minutes=1),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+}
+MAX_CANDLES = 500
+BACKFILL_CHUNK_SIZE = 5000
+# Строк в одном INSERT (ограничение SQLite на число параметров)
+UPSERT_BATCH_SIZE = 500
+
+def bucket_start(ts: datetime, interval: str) -> datetime:
+    if interval == '1m':
+        return ts.replace(second=0, microsecond=0)
+    if interval == '1h':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if interval == '1d':
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f'Unknown interval: {interval}')
+
+def _upsert(rows: List[Dict]) -> None:
+    """Слить свечи в таблицу: open - первая, close - последняя, high/low - экстремумы"""
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        _upsert_batch(rows[i:i + UPSERT_BATCH_SIZE])
+
+def _upsert_batch(rows: List[Dict]) -> None:
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(PriceCandle).values(rows)
+        greatest, least = func.greatest, func.least
+    else:
+        stmt = sqlite.insert(PriceCandle).values(rows)
+        greatest, least = func.max, func.min
+    table = PriceCandle.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['interval', 'bucket_start'],
+        set_={
+            'high': greatest(table.high, stmt.excluded.high),
+            'low': least(table.low, stmt.excluded.low),
+            'close': stmt.excluded.close,
+            'volume': table.volume + stmt.excluded.volume,
+            'volume_th': table.volume_th + stmt.excluded.volume_th,
+            'trades': table.trades + stmt.excluded.trades,
+            'updated_at': stmt.excluded.updated_at,
+        }
+    )
+    db.session.execute(stmt)
+
+def record_trade(amount: float, hashrate: float, ts: Optional[datetime] = None) -> None:
+    """Учесть сделку во всех интервалах (без commit)"""
+    if not hashrate:
+        return
+    ts = ts or datetime.utcnow()
+    price = amount / hashrate
+    now = datetime.utcnow()
+    _upsert([{
+        'interval': interval,
+        'bucket_start': bucket_start(ts, interval),
+        'open': price, 'high': price, 'low': price, 'close': price,
+        'volume': amount, 'volume_th': hashrate, 'trades': 1,
+        'updated_at': now,
+    } for interval in INTERVALS])
+
+def _fold(trades: Iterable[Tuple[datetime, float, float]]) -> List[Dict]:
+    """Свернуть упорядоченные по времени сделки в свечи"""
+    candles: Dict[Tuple[str, datetime], Dict] = {}
+    now = datetime.utcnow()
+    for ts, amount, hashrate in trades:
+        if not hashrate:
+            continue
+        price = amount / hashrate
+        for interval in INTERVALS:
+            key = (interval, bucket_start(ts, interval))
+            candle = candles.get(key)
+            if candle is None:
+                candles[key] = {
+                    'interval': interval, 'bucket_start': key[1],
+                    'open': price, 'high': price, 'low': price, 'close': price,
+                    'volume': amount, 'volume_th': hashrate, 'trades': 1,
+                    'updated_at': now,
+                }
+            else:
+                candle['high'] = max(candle['high'], price)
+                candle['low'] = min(candle['low'], price)
+                candle['close'] = price
+                candle['volume'] += amount
+                candle['volume_th'] += hashrate
+                candle['trades'] += 1
+    return list(candles.values())
+
+def _backfill_day(day: datetime, chunk_size: int) -> int:
+    """Пересобрать свечи одного дня в одной транзакции. Возвращает число сделок"""
+    from models.transaction import Transaction
+    from models.contract import SmartContract
+
+    next_day = day + INTERVALS['1d']
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Блокирует UPSERT из record_trade до commit (и сама ждёт начатые)
+        db.session.execute(db.text('LOCK TABLE price_candles IN SHARE ROW EXCLUSIVE MODE'))
+    db.session.query(PriceCandle).filter(
+        PriceCandle.bucket_start >= day, PriceCandle.bucket_start < next_day
+    ).delete(synchronize_session=False)
+
+    processed = 0
+    last_key = None
+    while True:
+        query = db.session.query(
+            Transaction.created_at, Transaction.id, Transaction.amount, SmartContract.hashrate
+        ).join(
+            SmartContract, Transaction.item_id == SmartContract.id
+        ).filter(
+            Transaction.type == 'buy',
+            Transaction.created_at >= day,
+            Transaction.created_at < next_day
+        )
+        if last_key is not None:
+            query = query.filter(db.tuple_(Transaction.created_at, Transaction.id) > last_key)
+        rows = query.order_by(Transaction.created_at, Transaction.id).limit(chunk_size).all()
+        if not rows:
+            break
+        _upsert(_fold((ts, amount, hashrate) for ts, _, amount, hashrate in rows))
+        processed += len(rows)
+        last_key = (rows[-1][0], rows[-1][1])
+    db.session.commit()
+    return processed
+
+def backfill(since: Optional[datetime] = None, chunk_size: int = BACKFILL_CHUNK_SIZE,
+             progress: Optional[Callable[[int, datetime], None]] = None) -> int:
+    """
+    Пересобрать свечи начиная с since (по умолчанию - вся история), по дню
+    на транзакцию. progress(обработано сделок, день) вызывается после
+    каждого дня со сделками. Возвращает количество обработанных сделок.
+    """
+    from models.transaction import Transaction
+
+    if since is None:
+        first_trade = db.session.query(func.min(Transaction.created_at)).filter(Transaction.type == 'buy').scalar()
+        first_candle = db.session.query(func.min(PriceCandle.bucket_start)).scalar()
+        starts = [ts for ts in (first_trade, first_candle) if ts is not None]
+        if not starts:
+            return 0
+        since = min(starts)
+    db.session.commit()
+
+    processed = 0
+    day = bucket_start(since, '1d')
+    last_day = bucket_start(datetime.utcnow(), '1d')
+    while day <= last_day:
+        trades = _backfill_day(day, chunk_size)
+        processed += trades
+        if trades and progress:
+            progress(processed, day)
+        day += INTERVALS['1d']
+    return processed
+
+def get_candles(interval: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                limit: int = MAX_CANDLES) -> List[PriceCandle]:
+    """Последние свечи интервала в диапазоне, по возрастанию времени"""
+    query = PriceCandle.query.filter(PriceCandle.interval == interval)
+    if start:
+        query = query.filter(PriceCandle.bucket_start >= start)
+    if end:
+        query = query.filter(PriceCandle.bucket_start < end)
+    candles = query.order_by(PriceCandle.bucket_start.desc()).limit(max(1, min(limit, MAX_CANDLES))).all()
+    candles.reverse()
+    return candles
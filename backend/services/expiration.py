@@ -0,0 +1,152 @@
+"""
+Expiration - перевод истёкших контрактов в статус expired
+
+sweep_expired() выбирает по индексу (status, expiration_date) только
+контракты с неконечным статусом и expiration_date <= now - то есть
+истёкшие с прошлого прохода, - и обрабатывает их пакетами:
+- активные сессии майнинга получают доход до момента экспирации и
+  останавливаются (один bulk UPDATE по первичному ключу),
+- активные листинги контрактов снимаются одним UPDATE ... WHERE IN,
+- контракты переводятся в expired одним UPDATE ... WHERE IN.
+Затем так же пакетами истекают офферы с expires_at <= now: статус expired,
+остаток бюджета возвращается из резерва (ledger.ESCROW_ACCOUNT).
+Каждый пакет коммитится отдельно. Вызывается планировщиком (scheduler.py).
+"""
+
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+from database import db
+
+# Статусы, из которых контракт может истечь
+EXPIRABLE_STATUSES = ('available', 'owned', 'mining', 'on_sale', 'withdrawn')
+EXPIRATION_BATCH_SIZE = 500
+
+def _stop_mining(contract_ids, expirations: Dict[str, datetime], now: datetime) -> int:
+    from models.mining import MiningSession
+
+    sessions = db.session.query(
+        MiningSession.id,
+        MiningSession.contract_id,
+        MiningSession.status,
+        MiningSession.started_at,
+        MiningSession.updated_at,
+        MiningSession.daily_income,
+        MiningSession.total_earned,
+    ).filter(
+        MiningSession.contract_id.in_(contract_ids),
+        MiningSession.status.in_(('active', 'paused'))
+    ).all()
+    if not sessions:
+        return 0
+
+    changes = []
+    for session in sessions:
+        ended_at = min(expirations[session.contract_id], now)
+        total_earned = session.total_earned or 0.0
+        if session.status == 'active':
+            last_update = session.updated_at or session.started_at or ended_at
+            hours_passed = max((ended_at - last_update).total_seconds(), 0.0) / 3600
+            total_earned += (session.daily_income or 0.0) / 24 * hours_passed
+        changes.append({
+            'id': session.id,
+            'status': 'stopped',
+            'stopped_at': ended_at,
+            'updated_at': ended_at,
+            'total_earned': total_earned,
+        })
+    db.session.execute(db.update(MiningSession), changes)
+    return len(changes)
+
+def _expire_offers(now: datetime, batch_size: int) -> int:
+    """Один пакет истёкших офферов: статус expired и возврат остатка бюджета"""
+    from models.marketplace import MarketplaceOffer
+    from services import ledger
+    from services.order_book import record_changes
+
+    offer_ids = [offer_id for (offer_id,) in db.session.query(MarketplaceOffer.id).filter(
+        MarketplaceOffer.status == 'active',
+        MarketplaceOffer.expires_at <= now
+    ).limit(batch_size)]
+    if not offer_ids:
+        return 0
+
+    expired = db.session.execute(
+        db.update(MarketplaceOffer).where(
+            MarketplaceOffer.id.in_(offer_ids),
+            MarketplaceOffer.status == 'active'
+        ).values(status='expired').returning(
+            MarketplaceOffer.id, MarketplaceOffer.bidder, MarketplaceOffer.remaining_budget
+        ).execution_options(synchronize_session=False)
+    ).all()
+    for offer_id, bidder, remaining_budget in expired:
+        if remaining_budget and remaining_budget > 0:
+            ledger.transfer(str(uuid.uuid4()), 'offer_refund', ledger.ESCROW_ACCOUNT,
+                            bidder, 'USDT', remaining_budget)
+    record_changes(bids=[offer_id for offer_id, _, _ in expired])
+    db.session.commit()
+    return len(offer_ids)
+
+def sweep_expired(now: Optional[datetime] = None, batch_size: int = EXPIRATION_BATCH_SIZE,
+                  max_batches: Optional[int] = None) -> Dict[str, int]:
+    """Обработать контракты, истёкшие к now. Возвращает счётчики"""
+    from models.contract import SmartContract
+    from models.marketplace import MarketplaceListing
+    from services.order_book import order_book, record_changes
+
+    now = now or datetime.utcnow()
+    stats = {'contracts': 0, 'miningSessions': 0, 'listings': 0, 'offers': 0, 'batches': 0}
+
+    while max_batches is None or stats['batches'] < max_batches:
+        rows = db.session.query(
+            SmartContract.id, SmartContract.expiration_date
+        ).filter(
+            SmartContract.status.in_(EXPIRABLE_STATUSES),
+            SmartContract.expiration_date <= now
+        ).order_by(SmartContract.expiration_date).limit(batch_size).all()
+        if not rows:
+            break
+
+        contract_ids = [contract_id for contract_id, _ in rows]
+        expirations = dict(rows)
+
+        stats['miningSessions'] += _stop_mining(contract_ids, expirations, now)
+
+        listing_ids = [listing_id for (listing_id,) in db.session.query(MarketplaceListing.id).filter(
+            MarketplaceListing.item_id.in_(contract_ids),
+            MarketplaceListing.status == 'active'
+        )]
+        if listing_ids:
+            db.session.execute(
+                db.update(MarketplaceListing).where(
+                    MarketplaceListing.id.in_(listing_ids),
+                    MarketplaceListing.status == 'active'
+                ).values(status='cancelled').execution_options(synchronize_session=False)
+            )
+
+        db.session.execute(
+            db.update(SmartContract).where(
+                SmartContract.id.in_(contract_ids)
+            ).values(
+                status='expired', listed_on_marketplace=False, updated_at=now
+            ).execution_options(synchronize_session=False)
+        )
+        record_changes(asks=listing_ids)
+        db.session.commit()
+
+        # Книга заявок этого процесса; воркеры применят изменения по версии книги
+        for listing_id in listing_ids:
+            order_book.remove_ask(listing_id)
+
+        stats['contracts'] += len(contract_ids)
+        stats['listings'] += len(listing_ids)
+        stats['batches'] += 1
+
+    while max_batches is None or stats['batches'] < max_batches:
+        expired = _expire_offers(now, batch_size)
+        if not expired:
+            break
+        stats['offers'] += expired
+        stats['batches'] += 1
+    return stats
@@ -0,0 +1,301 @@
+"""
+Ledger - журнал балансов с двойной записью
+
+Каждое движение средств - группа проводок LedgerEntry с нулевой суммой
+по каждой валюте (например: покупатель -X USDT, продавец +X USDT).
+Суммы хранятся целыми в минимальных единицах валюты.
+
+Баланс счёта = последний BalanceSnapshot + сумма проводок после него.
+balance() только читает. Снимки пишет take_snapshots() из задачи сверки
+(jobs/reconcile_ledger.py, планировщик) для счетов, у которых хвост
+достиг LEDGER_SNAPSHOT_EVERY проводок. Снимок покрывает проводки не новее
+LEDGER_SNAPSHOT_HORIZON_SECONDS: id выдаются до commit, и проводка с
+меньшим id может стать видна позже, чем с большим - снимок по max(id)
+видимых проводок потерял бы её навсегда.
+
+User.usdt_balance / btc_balance остаются кэшем баланса: post() обновляет
+их атомарным UPDATE в той же транзакции, reconcile() сверяет кэш с
+журналом, читая журнал чанками. Списание с пользователя - условный UPDATE
+(WHERE баланс >= суммы): если средств нет, post() бросает InsufficientFunds.
+
+Бюджет оффера резервируется на ESCROW_ACCOUNT при размещении; исполнение
+платит продавцу из резерва, остаток возвращается при отмене, истечении
+или полном исполнении оффера.
+"""
+
+import os
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from database import db
+from models.ledger import LedgerEntry, BalanceSnapshot
+from services.user_cache import invalidate_on_commit
+
+CURRENCY_DECIMALS = {
+    'USDT': 6,
+    'BTC': 8,
+}
+USER_BALANCE_COLUMNS = {
+    'USDT': 'usdt_balance',
+    'BTC': 'btc_balance',
+}
+SYSTEM_PREFIX = 'system:'
+ESCROW_ACCOUNT = SYSTEM_PREFIX + 'offer_escrow'
+LEDGER_SNAPSHOT_EVERY = int(os.getenv('LEDGER_SNAPSHOT_EVERY', 100))
+# Дольше этого транзакция с проводками не живёт - старше проводки все видны
+LEDGER_SNAPSHOT_HORIZON_SECONDS = int(os.getenv('LEDGER_SNAPSHOT_HORIZON_SECONDS', 300))
+RECONCILE_CHUNK_SIZE = 10000
+
+class LedgerError(ValueError):
+    """Несбалансированная или некорректная группа проводок"""
+
+class InsufficientFunds(LedgerError):
+    """Баланс пользователя меньше списания"""
+
+def to_minor(amount: float, currency: str) -> int:
+    units = Decimal(str(amount)).scaleb(CURRENCY_DECIMALS[currency])
+    return int(units.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def from_minor(units: int, currency: str) -> float:
+    return float(Decimal(units).scaleb(-CURRENCY_DECIMALS[currency]))
+
+def is_system_account(account: str) -> bool:
+    return account.startswith(SYSTEM_PREFIX)
+
+def post(entry_group: str, kind: str, postings: Iterable[Tuple[str, str, int]]) -> List[LedgerEntry]:
+    """
+    Записать группу проводок (account, currency, amount_minor) и обновить
+    кэш балансов пользователей. Commit делает вызывающий код.
+    """
+    from models.user import User
+
+    postings = [(account, currency, int(amount)) for account, currency, amount in postings if amount]
+    totals: Dict[str, int] = {}
+    for account, currency, amount in postings:
+        if currency not in CURRENCY_DECIMALS:
+            raise LedgerError(f'Unknown currency: {currency}')
+        totals[currency] = totals.get(currency, 0) + amount
+    unbalanced = {currency: total for currency, total in totals.items() if total != 0}
+    if unbalanced:
+        raise LedgerError(f'Unbalanced entry group {entry_group}: {unbalanced}')
+
+    entries = [
+        LedgerEntry(entry_group=entry_group, account=account, currency=currency, amount=amount, kind=kind)
+        for account, currency, amount in postings
+    ]
+    db.session.add_all(entries)
+
+    touched_users = set()
+    for account, currency, amount in postings:
+        if is_system_account(account):
+            continue
+        column = getattr(User, USER_BALANCE_COLUMNS[currency])
+        update = db.update(User).where(User.id == account)
+        if amount < 0:
+            # Проверка и списание одним UPDATE; полединицы - допуск на округление float-кэша
+            update = update.where(
+                func.coalesce(column, 0) >= from_minor(-amount, currency) - from_minor(1, currency) / 2
+            )
+        result = db.session.execute(
+            update.values(
+                {column: func.coalesce(column, 0) + from_minor(amount, currency)}
+            ).execution_options(synchronize_session=False)
+        )
+        if amount < 0 and result.rowcount != 1:
+            raise InsufficientFunds(f'Insufficient funds: {account} {from_minor(-amount, currency)} {currency}')
+        touched_users.add(account)
+    if touched_users:
+        invalidate_on_commit(*touched_users)
+    return entries
+
+def transfer(entry_group: str, kind: str, from_account: str, to_account: str,
+             currency: str, amount: float) -> List[LedgerEntry]:
+    """Перевод amount (в единицах валюты) со счёта на счёт"""
+    units = to_minor(amount, currency)
+    return post(entry_group, kind, [
+        (from_account, currency, -units),
+        (to_account, currency, units),
+    ])
+
+def _last_snapshot(account: str, currency: str) -> Tuple[int, int]:
+    last = db.session.query(
+        BalanceSnapshot.last_entry_id, BalanceSnapshot.balance
+    ).filter_by(
+        account=account, currency=currency
+    ).order_by(BalanceSnapshot.last_entry_id.desc()).first()
+    return tuple(last) if last else (0, 0)
+
+def balance(account: str, currency: str) -> int:
+    """Баланс счёта в минимальных единицах: снимок + хвост проводок"""
+    last_entry_id, base = _last_snapshot(account, currency)
+    tail_sum = db.session.query(
+        func.coalesce(func.sum(LedgerEntry.amount), 0)
+    ).filter(
+        LedgerEntry.account == account,
+        LedgerEntry.currency == currency,
+        LedgerEntry.id > last_entry_id
+    ).scalar()
+    return base + int(tail_sum)
+
+def balances(account: str) -> Dict[str, float]:
+    """Балансы счёта по всем валютам (в единицах валюты)"""
+    return {currency: from_minor(balance(account, currency), currency) for currency in CURRENCY_DECIMALS}
+
+def take_snapshots(min_tail: int = LEDGER_SNAPSHOT_EVERY,
+                   horizon_seconds: int = LEDGER_SNAPSHOT_HORIZON_SECONDS) -> int:
+    """
+    Снимки для счетов, у которых после последнего снимка min_tail и больше
+    проводок. Снимок - до последней проводки старше horizon_seconds.
+    Commit делает вызывающий код. Возвращает число снимков.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=horizon_seconds)
+    horizon_id = db.session.query(func.max(LedgerEntry.id)).filter(LedgerEntry.created_at <= cutoff).scalar()
+    if not horizon_id:
+        return 0
+
+    last = db.session.query(
+        BalanceSnapshot.account, BalanceSnapshot.currency,
+        func.max(BalanceSnapshot.last_entry_id).label('last_entry_id')
+    ).group_by(BalanceSnapshot.account, BalanceSnapshot.currency).subquery()
+    tails = db.session.query(
+        LedgerEntry.account, LedgerEntry.currency
+    ).outerjoin(last, db.and_(
+        last.c.account == LedgerEntry.account, last.c.currency == LedgerEntry.currency
+    )).filter(
+        LedgerEntry.id > func.coalesce(last.c.last_entry_id, 0),
+        LedgerEntry.id <= horizon_id
+    ).group_by(
+        LedgerEntry.account, LedgerEntry.currency
+    ).having(func.count(LedgerEntry.id) >= min_tail).all()
+
+    for account, currency in tails:
+        last_entry_id, base = _last_snapshot(account, currency)
+        tail_sum = db.session.query(func.coalesce(func.sum(LedgerEntry.amount), 0)).filter(
+            LedgerEntry.account == account,
+            LedgerEntry.currency == currency,
+            LedgerEntry.id > last_entry_id,
+            LedgerEntry.id <= horizon_id
+        ).scalar()
+        db.session.add(BalanceSnapshot(
+            account=account, currency=currency, last_entry_id=horizon_id, balance=base + int(tail_sum)
+        ))
+    return len(tails)
+
+def open_balances(chunk_size: int = RECONCILE_CHUNK_SIZE) -> int:
+    """
+    Вступительные проводки для пользователей, у которых есть кэшированный
+    баланс, но нет проводок (данные до появления журнала).
+    """
+    from models.user import User
+
+    opened = 0
+    last_id = None
+    while True:
+        query = db.session.query(User.id, User.usdt_balance, User.btc_balance).filter(
+            ~db.exists().where(LedgerEntry.account == User.id)
+        )
+        if last_id is not None:
+            query = query.filter(User.id > last_id)
+        rows = query.order_by(User.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        for user_id, usdt, btc in rows:
+            postings = []
+            for currency, cached in (('USDT', usdt), ('BTC', btc)):
+                units = to_minor(cached or 0.0, currency)
+                if units:
+                    postings += [(user_id, currency, units), (SYSTEM_PREFIX + 'opening', currency, -units)]
+            if postings:
+                # Кэш уже содержит эти суммы - пишем только проводки
+                entry_group = str(uuid.uuid4())
+                db.session.add_all([
+                    LedgerEntry(entry_group=entry_group, account=a, currency=c, amount=m, kind='opening')
+                    for a, c, m in postings
+                ])
+                opened += 1
+        db.session.commit()
+    return opened
+
+def reconcile(chunk_size: int = RECONCILE_CHUNK_SIZE) -> Dict:
+    """
+    Сверка журнала: поток проводок чанками по id, накопление балансов по
+    счетам, проверка снимков по пути, затем сравнение с кэшем в users и
+    проверка нулевой суммы групп.
+    """
+    from models.user import User
+
+    running: Dict[Tuple[str, str], int] = {}
+    report = {
+        'entries': 0,
+        'snapshotsChecked': 0,
+        'snapshotMismatches': [],
+        'balanceMismatches': [],
+        'unbalancedGroups': [],
+    }
+
+    last_id = 0
+    while True:
+        rows = db.session.query(
+            LedgerEntry.id, LedgerEntry.account, LedgerEntry.currency, LedgerEntry.amount
+        ).filter(LedgerEntry.id > last_id).order_by(LedgerEntry.id).limit(chunk_size).all()
+        if not rows:
+            break
+
+        snapshots: Dict[int, List] = {}
+        for snap in BalanceSnapshot.query.filter(
+            BalanceSnapshot.last_entry_id > last_id,
+            BalanceSnapshot.last_entry_id <= rows[-1][0]
+        ):
+            snapshots.setdefault(snap.last_entry_id, []).append(snap)
+
+        for entry_id, account, currency, amount in rows:
+            key = (account, currency)
+            running[key] = running.get(key, 0) + amount
+            for snap in snapshots.get(entry_id, ()):
+                report['snapshotsChecked'] += 1
+                expected = running.get((snap.account, snap.currency), 0)
+                if snap.balance != expected:
+                    report['snapshotMismatches'].append({
+                        'account': snap.account, 'currency': snap.currency,
+                        'lastEntryId': snap.last_entry_id, 'snapshot': snap.balance, 'ledger': expected,
+                    })
+
+        report['entries'] += len(rows)
+        last_id = rows[-1][0]
+        db.session.expunge_all()
+
+    last_user = None
+    while True:
+        query = db.session.query(User.id, User.usdt_balance, User.btc_balance)
+        if last_user is not None:
+            query = query.filter(User.id > last_user)
+        users = query.order_by(User.id).limit(chunk_size).all()
+        if not users:
+            break
+        last_user = users[-1][0]
+        for user_id, usdt, btc in users:
+            for currency, cached in (('USDT', usdt), ('BTC', btc)):
+                ledger_units = running.get((user_id, currency), 0)
+                if abs(to_minor(cached or 0.0, currency) - ledger_units) > 1:
+                    report['balanceMismatches'].append({
+                        'userId': user_id, 'currency': currency,
+                        'cached': cached or 0.0, 'ledger': from_minor(ledger_units, currency),
+                    })
+
+    unbalanced = db.session.query(
+        LedgerEntry.entry_group, LedgerEntry.currency, func.sum(LedgerEntry.amount)
+    ).group_by(
+        LedgerEntry.entry_group, LedgerEntry.currency
+    ).having(func.sum(LedgerEntry.amount) != 0).limit(1000).all()
+    report['unbalancedGroups'] = [
+        {'group': group, 'currency': currency, 'sum': int(total)} for group, currency, total in unbalanced
+    ]
+
+    report['ok'] = not (report['snapshotMismatches'] or report['balanceMismatches'] or report['unbalancedGroups'])
+    return report
@@ -0,0 +1,189 @@
+"""
+Market Stats - агрегаты активных листингов по корзинам
+
+Для каждой корзины хешрейта и полосы срока до экспирации (а также по
+рынку в целом) инкрементально поддерживаются:
+- минимальная цена за TH/s (min-куча с ленивым удалением; когда мёртвых
+  записей в куче больше, чем живых, она пересобирается),
+- количество листингов,
+- оценка медианы по логарифмической гистограмме цен (~5% точность).
+
+Обновляется книгой заявок (services.order_book) на выставлении, покупке,
+исполнении и снятии листинга, поэтому /api/marketplace/stats не делает
+запросов к БД. Для каждого листинга хранится дата экспирации: раз в
+REBUCKET_SECONDS снимок перекладывает листинги, чей оставшийся срок
+перешёл границу полосы (O(n) по памяти, без БД). Снимок кэшируется до
+следующего изменения.
+"""
+
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Нижние границы корзин хешрейта (TH/s) и полос срока (дни)
+HASHRATE_BUCKETS = [0, 50, 100, 200, 500]
+EXPIRATION_BANDS = [0, 90, 180, 365]
+# Запас мёртвых записей в куче, при котором она ещё не пересобирается
+HEAP_COMPACT_SLACK = 64
+# Как часто пересчитывать полосы срока (секунды)
+REBUCKET_SECONDS = 3600
+
+# Логарифмическая гистограмма цены за TH/s
+PRICE_BIN_MIN = 1.0
+PRICE_BIN_MAX = 1000.0
+PRICE_BINS = 64
+_LOG_MIN = math.log(PRICE_BIN_MIN)
+_LOG_STEP = (math.log(PRICE_BIN_MAX) - _LOG_MIN) / PRICE_BINS
+
+def remaining_days(expiration_date: Optional[datetime], now: Optional[datetime] = None) -> int:
+    if not expiration_date:
+        return 0
+    return max((expiration_date - (now or datetime.utcnow())).days, 0)
+
+def _price_bin(price: float) -> int:
+    if price <= PRICE_BIN_MIN:
+        return 0
+    return min(int((math.log(price) - _LOG_MIN) / _LOG_STEP), PRICE_BINS - 1)
+
+def _bin_midpoint(index: int) -> float:
+    return math.exp(_LOG_MIN + (index + 0.5) * _LOG_STEP)
+
+def _bucket_index(bounds: List[int], value: float) -> int:
+    index = 0
+    for i, bound in enumerate(bounds):
+        if value >= bound:
+            index = i
+    return index
+
+def _bucket_label(bounds: List[int], index: int) -> str:
+    if index + 1 < len(bounds):
+        return f'{bounds[index]}-{bounds[index + 1]}'
+    return f'{bounds[index]}+'
+
+class BucketStats:
+    def __init__(self):
+        self.count = 0
+        self._histogram = [0] * PRICE_BINS
+        self._heap = []
+        self._prices: Dict[str, float] = {}
+
+    def add(self, listing_id: str, price: float) -> None:
+        if listing_id in self._prices:
+            self.remove(listing_id)
+        self._prices[listing_id] = price
+        heapq.heappush(self._heap, (price, listing_id))
+        self._histogram[_price_bin(price)] += 1
+        self.count += 1
+
+    def remove(self, listing_id: str) -> None:
+        price = self._prices.pop(listing_id, None)
+        if price is None:
+            return
+        self._histogram[_price_bin(price)] -= 1
+        self.count -= 1
+        if len(self._heap) > 2 * len(self._prices) + HEAP_COMPACT_SLACK:
+            self._heap = [(price, listing_id) for listing_id, price in self._prices.items()]
+            heapq.heapify(self._heap)
+
+    def min_price(self) -> Optional[float]:
+        heap = self._heap
+        while heap:
+            price, listing_id = heap[0]
+            if self._prices.get(listing_id) == price:
+                return price
+            heapq.heappop(heap)
+        return None
+
+    def median_estimate(self) -> Optional[float]:
+        if not self.count:
+            return None
+        half = (self.count + 1) / 2
+        cumulative = 0
+        for index, bin_count in enumerate(self._histogram):
+            cumulative += bin_count
+            if cumulative >= half:
+                return round(_bin_midpoint(index), 2)
+        return None
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'minPricePerTh': self.min_price(),
+            'medianPricePerTh': self.median_estimate(),
+        }
+
+class MarketAggregates:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.overall = BucketStats()
+        self.by_hashrate = [BucketStats() for _ in HASHRATE_BUCKETS]
+        self.by_expiration = [BucketStats() for _ in EXPIRATION_BANDS]
+        self._members: Dict[str, tuple] = {}
+        self._version = 0
+        self._snapshot_version = -1
+        self._snapshot = None
+        self._rebucketed_at = time.monotonic()
+
+    def add(self, listing_id: str, price_per_th: float, hashrate: float,
+            expiration_date: Optional[datetime]) -> None:
+        with self._lock:
+            self._remove(listing_id)
+            h = _bucket_index(HASHRATE_BUCKETS, hashrate)
+            e = _bucket_index(EXPIRATION_BANDS, remaining_days(expiration_date))
+            self._members[listing_id] = (h, e, price_per_th, expiration_date)
+            self.overall.add(listing_id, price_per_th)
+            self.by_hashrate[h].add(listing_id, price_per_th)
+            self.by_expiration[e].add(listing_id, price_per_th)
+            self._version += 1
+
+    def remove(self, listing_id: str) -> None:
+        with self._lock:
+            if self._remove(listing_id):
+                self._version += 1
+
+    def _remove(self, listing_id: str) -> bool:
+        buckets = self._members.pop(listing_id, None)
+        if buckets is None:
+            return False
+        h, e = buckets[:2]
+        self.overall.remove(listing_id)
+        self.by_hashrate[h].remove(listing_id)
+        self.by_expiration[e].remove(listing_id)
+        return True
+
+    def _rebucket(self) -> None:
+        """Перенести листинги, чей оставшийся срок перешёл границу полосы"""
+        now = datetime.utcnow()
+        for listing_id, (h, e, price_per_th, expiration_date) in list(self._members.items()):
+            band = _bucket_index(EXPIRATION_BANDS, remaining_days(expiration_date, now))
+            if band != e:
+                self.by_expiration[e].remove(listing_id)
+                self.by_expiration[band].add(listing_id, price_per_th)
+                self._members[listing_id] = (h, band, price_per_th, expiration_date)
+                self._version += 1
+        self._rebucketed_at = time.monotonic()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            if time.monotonic() - self._rebucketed_at >= REBUCKET_SECONDS:
+                self._rebucket()
+            if self._snapshot_version != self._version:
+                self._snapshot = {
+                    'overall': self.overall.to_dict(),
+                    'byHashrate': [
+                        dict(bucket=_bucket_label(HASHRATE_BUCKETS, i), **stats.to_dict())
+                        for i, stats in enumerate(self.by_hashrate)
+                    ],
+                    'byExpiration': [
+                        dict(bucket=_bucket_label(EXPIRATION_BANDS, i), minDays=EXPIRATION_BANDS[i], **stats.to_dict())
+                        for i, stats in enumerate(self.by_expiration)
+                    ],
+                }
+                self._snapshot_version = self._version
+            return self._snapshot
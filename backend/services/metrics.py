@@ -0,0 +1,386 @@
+"""
+Metrics - метрики приложения в текстовом формате Prometheus (/metrics)
+
+Счётчики, гистограммы и gauge с inc/dec пишутся в шарды по потокам: каждый
+поток меняет только свой dict, поэтому горячий путь обходится без блокировок
+(lock берётся один раз - при регистрации шарда нового потока). При сборе
+шарды складываются, шарды завершившихся потоков сворачиваются в общий итог.
+Значения, которые проще снять в момент сбора (пул соединений, попадания в
+кеш), отдаются коллекторами - функциями, вызываемыми при снимке.
+
+Несколько процессов (воркеры gunicorn): если задан METRICS_DIR, каждый
+процесс раз в METRICS_FLUSH_SECONDS сохраняет снимок в METRICS_DIR/<pid>.json,
+а /metrics объединяет снимки всех процессов: счётчики и гистограммы
+суммируются (в том числе от завершившихся воркеров), gauge - только от
+живых. Каталог нужно очищать при перезапуске сервиса.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Metric:
+    type = ''
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help: str, labelnames: Iterable[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple:
+        return (self.name, tuple(str(labels.get(label, '')) for label in self.labelnames))
+
+    def describe(self) -> Dict:
+        return {'type': self.type, 'help': self.help, 'labelnames': list(self.labelnames)}
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard = self.registry._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Gauge с inc/dec (например, запросы в обработке); живые значения - через коллекторы"""
+    type = 'gauge'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard = self.registry._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        shard = self.registry._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # [счётчики по корзинам (не кумулятивные) ..., +Inf, sum]
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        else:
+            state[len(self.buckets)] += 1
+        state[-1] += value
+
+    def describe(self) -> Dict:
+        return {**super().describe(), 'buckets': list(self.buckets)}
+
+def _add(totals: Dict, key, value) -> None:
+    """Прибавить значение (число или состояние гистограммы) к totals[key]"""
+    if key not in totals:
+        totals[key] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        totals[key] = [x + y for x, y in zip(totals[key], value)]
+    else:
+        totals[key] += value
+
+class MetricsRegistry:
+    def __init__(self, directory: Optional[str] = METRICS_DIR, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[Tuple]]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[threading.Thread, Dict]] = []
+        self._retired: Dict = {}
+        self._flusher_pid: Optional[int] = None
+
+    # Регистрация
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric already registered: {metric.name}')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def add_collector(self, key: str, func: Callable[[], Iterable[Tuple]]) -> None:
+        """
+        func() -> [(name, type, help, {labels}, value), ...] при каждом снимке.
+        Повторная регистрация с тем же key заменяет коллектор (новый экземпляр приложения)
+        """
+        self._collectors[key] = func
+
+    # Шарды
+
+    def _shard(self) -> Dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _values(self) -> Dict:
+        """Сумма всех шардов: (name, labels) -> значение"""
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    for key, value in dict(shard).items():
+                        _add(self._retired, key, value)
+            self._shards = alive
+            totals = {}
+            for key, value in self._retired.items():
+                _add(totals, key, value)
+            shards = [shard for _, shard in alive]
+
+        for shard in shards:
+            # dict() копирует под GIL целиком - владелец шарда может писать параллельно
+            for key, value in dict(shard).items():
+                _add(totals, key, value)
+        return totals
+
+    # Снимки
+
+    def snapshot(self) -> Dict:
+        """Снимок процесса: {name: {type, help, labelnames, [buckets], samples: [[labels, value]]}}"""
+        metrics = {name: {**metric.describe(), 'samples': []} for name, metric in self._metrics.items()}
+        for (name, labels), value in self._values().items():
+            metrics[name]['samples'].append([list(labels), value])
+
+        for collector in list(self._collectors.values()):
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, metric_type, help, labels, value in samples:
+                entry = metrics.setdefault(name, {
+                    'type': metric_type, 'help': help, 'labelnames': list(labels), 'samples': []
+                })
+                entry['samples'].append([[str(v) for v in labels.values()], value])
+        return {'pid': os.getpid(), 'time': time.time(), 'metrics': metrics}
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def flush(self) -> None:
+        """Сохранить снимок процесса в METRICS_DIR (атомарно через rename)"""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def ensure_flusher(self) -> None:
+        """Запустить фоновую запись снимков в этом процессе (после fork - заново)"""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+
+        def loop():
+            while True:
+                time.sleep(self.flush_seconds)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Metrics flush failed: {e}")
+
+        threading.Thread(target=loop, name='metrics-flusher', daemon=True).start()
+
+    def _process_snapshots(self) -> List[Tuple[Dict, bool]]:
+        """Снимки всех процессов: [(snapshot, жив ли процесс)]"""
+        if not self.directory:
+            return [(self.snapshot(), True)]
+        self.flush()
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots.append((snapshot, _pid_alive(snapshot.get('pid'))))
+        return snapshots
+
+    def collect(self) -> Dict:
+        """Объединённые метрики всех процессов"""
+        merged: Dict[str, Dict] = {}
+        for snapshot, alive in self._process_snapshots():
+            for name, metric in snapshot['metrics'].items():
+                if metric['type'] == 'gauge' and not alive:
+                    continue
+                entry = merged.setdefault(name, {**{k: v for k, v in metric.items() if k != 'samples'}, 'samples': {}})
+                for labels, value in metric['samples']:
+                    _add(entry['samples'], tuple(labels), value)
+        return merged
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus 0.0.4"""
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f'# HELP {name} {metric["help"]}')
+            lines.append(f'# TYPE {name} {metric["type"]}')
+            labelnames = metric['labelnames']
+            for labels, value in sorted(metric['samples'].items()):
+                pairs = list(zip(labelnames, labels))
+                if metric['type'] == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(metric['buckets'] + ['+Inf'], value[:-1]):
+                        cumulative += count
+                        le = bound if bound == '+Inf' else _format_value(bound)
+                        lines.append(f'{name}_bucket{_format_labels(pairs + [("le", le)])} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(pairs)} {_format_value(value[-1])}')
+                    lines.append(f'{name}_count{_format_labels(pairs)} {cumulative}')
+                else:
+                    lines.append(f'{name}{_format_labels(pairs)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _format_value(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+# Метрики приложения
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests', ['blueprint', 'endpoint', 'method', 'status'])
+http_request_duration_seconds = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ['blueprint', 'endpoint'])
+http_requests_in_flight = registry.gauge(
+    'http_requests_in_flight', 'HTTP requests being processed')
+marketplace_buy_total = registry.counter(
+    'marketplace_buy_total', 'Marketplace buy attempts by result', ['result'])
+db_read_route_total = registry.counter(
+    'db_read_route_total', 'Replica-eligible requests by database target', ['target'])
+lottery_draw_duration_seconds = registry.histogram(
+    'lottery_draw_duration_seconds', 'Lottery draw (seed + scoring + winner) duration',
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0))
+lottery_tickets_scored_total = registry.counter(
+    'lottery_tickets_scored_total', 'Tickets scored in draws')
+lottery_scoring_seconds_total = registry.counter(
+    'lottery_scoring_seconds_total', 'Time spent in draws; tickets/s = rate(scored) / rate(seconds)')
+
+def observe_draw(ticket_count: int, seconds: float) -> None:
+    lottery_draw_duration_seconds.observe(seconds)
+    lottery_tickets_scored_total.inc(ticket_count)
+    lottery_scoring_seconds_total.inc(seconds)
+
+def _cache_samples():
+    from services.user_cache import user_cache
+    help = 'Cache lookups by result'
+    return [
+        ('cache_requests_total', 'counter', help, {'cache': 'user', 'result': 'hit'}, user_cache.hits),
+        ('cache_requests_total', 'counter', help, {'cache': 'user', 'result': 'miss'}, user_cache.misses),
+    ]
+
+def _pool_collector(engines):
+    def samples():
+        result = []
+        for bind, engine in engines.items():
+            pool = engine.pool
+            labels = {'bind': bind or 'default'}
+            for name, attr, help in (
+                ('db_pool_size', 'size', 'Configured pool size'),
+                ('db_pool_checked_out', 'checkedout', 'Connections checked out of the pool'),
+                ('db_pool_overflow', 'overflow', 'Connections above pool size'),
+            ):
+                if hasattr(pool, attr):
+                    # overflow() отрицателен, пока пул не заполнен
+                    result.append((name, 'gauge', help, labels, max(getattr(pool, attr)(), 0)))
+        return result
+    return samples
+
+def init_metrics(app) -> None:
+    """Метрики запросов, коллекторы и эндпоинт /metrics"""
+    from flask import Response, g, request
+    from database import db
+
+    with app.app_context():
+        registry.add_collector('db_pool', _pool_collector(dict(db.engines)))
+    registry.add_collector('cache', _cache_samples)
+
+    @app.before_request
+    def start_request_metrics():
+        registry.ensure_flusher()
+        g._metrics_started = time.perf_counter()
+        http_requests_in_flight.inc()
+
+    def record(status):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        blueprint = request.blueprint or 'app'
+        endpoint = request.endpoint or 'unmatched'
+        http_requests_total.inc(blueprint=blueprint, endpoint=endpoint, method=request.method, status=status)
+        http_request_duration_seconds.observe(time.perf_counter() - started, blueprint=blueprint, endpoint=endpoint)
+        http_requests_in_flight.dec()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def abort_request_metrics(exc):
+        # after_request пропускается при необработанном исключении
+        record(500)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,46 @@
+"""
+Mining - начисление BTC активным сессиям майнинга
+
+accrue_earnings() добавляет к total_earned доход за время с последнего
+начисления (updated_at) и вызывается планировщиком (scheduler.py) раз в
+минуту, а также вручную через POST /api/mining/calculate-earnings.
+Начисление идёт не дальше expiration_date контракта - так же, как
+services.expiration при остановке сессии, даже если sweep ещё не прошёл.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from database import db
+from models.contract import SmartContract
+from models.mining import MiningSession
+
+ACCRUAL_CHUNK_SIZE = 1000
+
+def accrue_earnings(now: Optional[datetime] = None, chunk_size: int = ACCRUAL_CHUNK_SIZE) -> int:
+    """Начислить доход всем активным сессиям, коммитит по чанкам. Возвращает число сессий"""
+    now = now or datetime.utcnow()
+    updated = 0
+    last_id = None
+    while True:
+        query = db.session.query(MiningSession, SmartContract.expiration_date).join(
+            SmartContract, MiningSession.contract_id == SmartContract.id
+        ).filter(MiningSession.status == 'active')
+        if last_id is not None:
+            query = query.filter(MiningSession.id > last_id)
+        rows = query.order_by(MiningSession.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0].id
+
+        for session, expiration_date in rows:
+            last_update = session.updated_at or session.started_at or now
+            accrued_until = min(now, expiration_date) if expiration_date else now
+            if accrued_until <= last_update:
+                continue
+            hours_passed = (accrued_until - last_update).total_seconds() / 3600
+            session.total_earned = (session.total_earned or 0.0) + (session.daily_income or 0.0) / 24 * hours_passed
+            session.updated_at = accrued_until
+        db.session.commit()
+        updated += len(rows)
+    return updated
@@ -0,0 +1,576 @@
+"""
+Order Book - книга заявок по цене за TH/s
+
+Биды (MarketplaceOffer) и аски (активные MarketplaceListing) хранятся в
+кучах в памяти процесса, книга строится из БД при первом обращении:
+
+- биды разбиты на полосы по min_expiration_days, в каждой полосе max-куча
+  по цене за TH/s (при равной цене - более ранний бид первым);
+- аски - min-куча по цене за TH/s.
+
+Вставка - O(log n), отмена - O(1) (ленивое удаление: запись убирается из
+индекса, устаревшие вершины куч выкидываются при чтении, кучи сжимаются,
+когда мёртвых записей больше половины). Лучший бид и floor price читаются
+с вершин куч. Агрегаты по корзинам хешрейта и срока (services.market_stats)
+обновляются здесь же.
+
+Книга - только индекс. Источник истины - БД, которую меняют и другие
+воркеры, и процесс планировщика. Каждая пишущая транзакция перед commit
+вызывает record_changes(): увеличивает версию в строке order_book_version
+и записывает id изменённых офферов/листингов в order_book_changes.
+Строка версии заблокирована до commit, поэтому версии видны по порядку.
+Раз в ORDER_BOOK_REFRESH_SECONDS (а перед match() - всегда) книга читает
+версию по первичному ключу; если версия выросла, перечитываются только
+изменённые строки - O(изменений), без сканирования таблиц. Полная
+пересборка (в отдельном соединении, с подменой книги целиком) - только
+при первой загрузке и при отставании больше ORDER_BOOK_MAX_DELTA версий.
+Старые изменения удаляет prune_changes() из планировщика.
+
+match() списывает бюджет бида условным UPDATE (status='active' AND
+remaining_budget >= amount), поэтому бид, исполненный в другом процессе
+после сверки, не исполнится дважды - он просто выкидывается из книги.
+Продавцу платит резерв офферов (ledger.ESCROW_ACCOUNT), куда бюджет
+переведён при размещении; остаток исполненного оффера возвращается
+покупателю.
+"""
+
+import heapq
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import exc
+
+from database import db
+from services import ledger
+from services.market_stats import MarketAggregates, remaining_days
+from services.purchases import record_purchase
+
+# Сколько лучших бидов максимум перебирать при исполнении одного листинга
+MAX_MATCH_CANDIDATES = 50
+# Как часто сверять версию книги с БД (секунды)
+ORDER_BOOK_REFRESH_SECONDS = float(os.getenv('ORDER_BOOK_REFRESH_SECONDS', 2))
+# Отставание (в версиях), после которого книга пересобирается целиком
+ORDER_BOOK_MAX_DELTA = int(os.getenv('ORDER_BOOK_MAX_DELTA', 1000))
+# Сколько последних версий хранить в order_book_changes (больше MAX_DELTA)
+ORDER_BOOK_CHANGE_RETENTION = int(os.getenv('ORDER_BOOK_CHANGE_RETENTION', 10000))
+# Сжимать кучу, когда мёртвых записей больше, чем живых (плюс запас)
+COMPACT_SLACK = 64
+
+@dataclass
+class Bid:
+    offer_id: str
+    bidder: str
+    price_per_th: float
+    remaining_budget: float
+    min_expiration_days: int
+    expires_at: Optional[datetime]
+    seq: int
+
+    def to_dict(self):
+        return {
+            'id': self.offer_id,
+            'userId': self.bidder,
+            'pricePerTh': self.price_per_th,
+            'remainingBudget': self.remaining_budget,
+            'minExpirationDays': self.min_expiration_days,
+            'expiresAt': self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+@dataclass
+class Ask:
+    listing_id: str
+    seller: str
+    price_per_th: float
+    seq: int
+
+@dataclass
+class Fill:
+    offer_id: str
+    listing_id: str
+    bidder: str
+    price_per_th: float
+    amount: float
+    transaction: Any = field(default=None, repr=False)
+
+    def to_dict(self):
+        return {
+            'offerId': self.offer_id,
+            'listingId': self.listing_id,
+            'buyer': self.bidder,
+            'pricePerTh': self.price_per_th,
+            'amount': self.amount,
+            'transactionId': self.transaction.id if self.transaction else None,
+        }
+
+def record_changes(bids: Iterable[str] = (), asks: Iterable[str] = ()) -> None:
+    """
+    Отметить изменённые офферы (bids) и листинги (asks) в текущей
+    транзакции. Вызывать непосредственно перед commit: строка версии
+    остаётся заблокированной до конца транзакции.
+    """
+    from models.marketplace import OrderBookChange, OrderBookVersion
+
+    changes = [('bid', ref_id) for ref_id in bids] + [('ask', ref_id) for ref_id in asks]
+    if not changes:
+        return
+    version = db.session.execute(
+        db.update(OrderBookVersion).where(OrderBookVersion.id == 1).values(
+            version=OrderBookVersion.version + 1
+        ).returning(OrderBookVersion.version).execution_options(synchronize_session=False)
+    ).scalar()
+    if version is None:
+        # Книга ещё ни разу не загружалась и строки нет
+        version = 1
+        db.session.add(OrderBookVersion(id=1, version=version))
+    db.session.execute(db.insert(OrderBookChange), [
+        {'version': version, 'kind': kind, 'ref_id': ref_id} for kind, ref_id in changes
+    ])
+
+def prune_changes(keep: int = ORDER_BOOK_CHANGE_RETENTION) -> int:
+    """Удалить изменения старше keep версий. Commit делает вызывающий код"""
+    from models.marketplace import OrderBookChange, OrderBookVersion
+
+    version = db.session.query(OrderBookVersion.version).filter_by(id=1).scalar()
+    if not version or version <= keep:
+        return 0
+    return db.session.execute(
+        db.delete(OrderBookChange).where(OrderBookChange.version <= version - keep)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def _current_version(conn) -> int:
+    from models.marketplace import OrderBookVersion
+
+    version = conn.execute(
+        db.select(OrderBookVersion.version).where(OrderBookVersion.id == 1)
+    ).scalar()
+    if version is not None:
+        return version
+    try:
+        conn.execute(db.insert(OrderBookVersion).values(id=1, version=0))
+        conn.commit()
+    except exc.IntegrityError:
+        # Строку создал другой процесс
+        conn.rollback()
+        return _current_version(conn)
+    return 0
+
+class OrderBook:
+    def __init__(self):
+        self._bands: Dict[int, list] = {}
+        self._bids: Dict[str, Bid] = {}
+        self._asks_heap: list = []
+        self._asks: Dict[str, Ask] = {}
+        self._seq = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self.aggregates = MarketAggregates()
+
+    # ============= Загрузка =============
+
+    def ensure_loaded(self, max_age: float = ORDER_BOOK_REFRESH_SECONDS) -> None:
+        """Построить книгу или применить изменения из БД (сверка версии не чаще max_age)"""
+        if self._loaded and time.monotonic() - self._checked_at < max_age:
+            return
+        # Чтения не ждут чужую сверку - отвечают по текущей книге
+        if not self._refresh_lock.acquire(blocking=not self._loaded or max_age == 0):
+            return
+        try:
+            if self._loaded and time.monotonic() - self._checked_at < max_age:
+                return
+            # Своё соединение: ни незакоммиченные изменения запроса, ни реплика
+            with db.engine.connect() as conn:
+                started = time.monotonic()
+                version = _current_version(conn)
+                if self._loaded and self._version is not None \
+                        and 0 <= version - self._version <= ORDER_BOOK_MAX_DELTA:
+                    if version != self._version:
+                        self._apply_changes(conn, self._version, version)
+                        self._version = version
+                    self._checked_at = started
+                    return
+                fresh = OrderBook()
+                fresh._populate(conn)
+            with self._lock:
+                self._bands, self._bids = fresh._bands, fresh._bids
+                self._asks_heap, self._asks = fresh._asks_heap, fresh._asks
+                self._seq = max(self._seq, fresh._seq)
+                self.aggregates = fresh.aggregates
+                self._version = version
+                self._checked_at = started
+                self._loaded = True
+        finally:
+            self._refresh_lock.release()
+
+    def reload(self) -> None:
+        """Пересобрать книгу из БД целиком"""
+        self._version = None
+        self.ensure_loaded(max_age=0)
+
+    def _apply_changes(self, conn, since: int, until: int) -> None:
+        """Перечитать офферы и листинги, изменённые в версиях (since, until]"""
+        from models.marketplace import MarketplaceListing, MarketplaceOffer, OrderBookChange
+        from models.contract import SmartContract
+
+        changes = conn.execute(db.select(OrderBookChange.kind, OrderBookChange.ref_id).where(
+            OrderBookChange.version > since, OrderBookChange.version <= until
+        )).all()
+        bid_ids = {ref_id for kind, ref_id in changes if kind == 'bid'}
+        ask_ids = {ref_id for kind, ref_id in changes if kind == 'ask'}
+        offers = {row.id: row for row in conn.execute(
+            db.select(MarketplaceOffer.__table__).where(MarketplaceOffer.id.in_(bid_ids))
+        )} if bid_ids else {}
+        listings = {row.id: row for row in conn.execute(db.select(
+            MarketplaceListing.id, MarketplaceListing.seller, MarketplaceListing.price, MarketplaceListing.status,
+            SmartContract.hashrate, SmartContract.expiration_date
+        ).join(
+            SmartContract, MarketplaceListing.item_id == SmartContract.id
+        ).where(MarketplaceListing.id.in_(ask_ids)))} if ask_ids else {}
+
+        with self._lock:
+            for offer_id in bid_ids:
+                offer = offers.get(offer_id)
+                bid = self._bids.get(offer_id)
+                if offer is None or offer.status != 'active':
+                    self._bids.pop(offer_id, None)
+                elif bid is not None and bid.price_per_th == offer.price_per_th \
+                        and bid.min_expiration_days == (offer.min_expiration_days or 0):
+                    # Место в куче не меняется
+                    bid.remaining_budget = offer.remaining_budget
+                    bid.expires_at = offer.expires_at
+                else:
+                    self._bids.pop(offer_id, None)
+                    self._add_bid(offer, push=True)
+            self._compact_bids()
+
+            for listing_id in ask_ids:
+                row = listings.get(listing_id)
+                if row is not None and row.status == 'active' and row.hashrate and row.hashrate > 0:
+                    if listing_id not in self._asks:
+                        self._add_ask(listing_id, row.seller, row.price / row.hashrate,
+                                      row.hashrate, row.expiration_date, push=True)
+                else:
+                    self.remove_ask(listing_id)
+
+    def _populate(self, conn) -> None:
+        from models.marketplace import MarketplaceListing, MarketplaceOffer
+        from models.contract import SmartContract
+
+        offers = conn.execute(
+            db.select(MarketplaceOffer.__table__).where(MarketplaceOffer.status == 'active')
+            .order_by(MarketplaceOffer.created_at)
+        ).all()
+        for offer in offers:
+            self._add_bid(offer)
+
+        rows = conn.execute(db.select(
+            MarketplaceListing.id, MarketplaceListing.seller, MarketplaceListing.price,
+            SmartContract.hashrate, SmartContract.expiration_date
+        ).join(
+            SmartContract, MarketplaceListing.item_id == SmartContract.id
+        ).where(
+            MarketplaceListing.status == 'active'
+        ).order_by(MarketplaceListing.listed_at)).all()
+        for listing_id, seller, price, hashrate, expiration_date in rows:
+            if hashrate and hashrate > 0:
+                self._add_ask(listing_id, seller, price / hashrate, hashrate, expiration_date)
+
+        for heap in self._bands.values():
+            heapq.heapify(heap)
+        heapq.heapify(self._asks_heap)
+
+    def _next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    # ============= Биды =============
+
+    def _add_bid(self, offer, push: bool = False) -> Bid:
+        bid = Bid(
+            offer_id=offer.id,
+            bidder=offer.bidder,
+            price_per_th=offer.price_per_th,
+            remaining_budget=offer.remaining_budget,
+            min_expiration_days=offer.min_expiration_days or 0,
+            expires_at=offer.expires_at,
+            seq=self._next_seq(),
+        )
+        self._bids[bid.offer_id] = bid
+        band = self._bands.setdefault(bid.min_expiration_days, [])
+        entry = (-bid.price_per_th, bid.seq, bid.offer_id)
+        if push:
+            heapq.heappush(band, entry)
+        else:
+            band.append(entry)
+        return bid
+
+    def add_bid(self, offer) -> None:
+        """Добавить бид после commit - O(log n)"""
+        self.ensure_loaded()
+        with self._lock:
+            self._add_bid(offer, push=True)
+
+    def cancel_bid(self, offer_id: str) -> None:
+        """Убрать бид - O(1), запись в куче удалится лениво"""
+        with self._lock:
+            self._bids.pop(offer_id, None)
+            self._compact_bids()
+
+    def _compact_bids(self) -> None:
+        if sum(len(heap) for heap in self._bands.values()) <= 2 * len(self._bids) + COMPACT_SLACK:
+            return
+        self._bands = {}
+        for bid in self._bids.values():
+            self._bands.setdefault(bid.min_expiration_days, []).append((-bid.price_per_th, bid.seq, bid.offer_id))
+        for heap in self._bands.values():
+            heapq.heapify(heap)
+
+    def _band_top(self, band_key: int, now: datetime) -> Optional[Bid]:
+        heap = self._bands[band_key]
+        while heap:
+            _, seq, offer_id = heap[0]
+            bid = self._bids.get(offer_id)
+            if bid is not None and bid.seq == seq:
+                if bid.expires_at is None or bid.expires_at > now:
+                    return bid
+                del self._bids[offer_id]
+            heapq.heappop(heap)
+        return None
+
+    def best_bid(self, min_days: Optional[int] = None) -> Optional[Bid]:
+        """
+        Лучший бид. Если задан min_days (оставшийся срок контракта),
+        учитываются только биды, чьё требование к сроку он выполняет.
+        """
+        self.ensure_loaded()
+        now = datetime.utcnow()
+        with self._lock:
+            best = None
+            for band_key in list(self._bands):
+                if min_days is not None and band_key > min_days:
+                    continue
+                top = self._band_top(band_key, now)
+                if top and (best is None or (top.price_per_th, -top.seq) > (best.price_per_th, -best.seq)):
+                    best = top
+            return best
+
+    def bids(self, limit: int = 50) -> List[Bid]:
+        """Активные биды от лучшего к худшему (для списка офферов)"""
+        self.ensure_loaded()
+        now = datetime.utcnow()
+        with self._lock:
+            active = [b for b in self._bids.values() if b.expires_at is None or b.expires_at > now]
+        return heapq.nsmallest(limit, active, key=lambda b: (-b.price_per_th, b.seq))
+
+    # ============= Аски =============
+
+    def _add_ask(self, listing_id: str, seller: str, price_per_th: float,
+                 hashrate: float, expiration_date: Optional[datetime], push: bool = False) -> None:
+        ask = Ask(listing_id=listing_id, seller=seller, price_per_th=price_per_th, seq=self._next_seq())
+        self._asks[listing_id] = ask
+        self.aggregates.add(listing_id, price_per_th, hashrate, expiration_date)
+        entry = (ask.price_per_th, ask.seq, listing_id)
+        if push:
+            heapq.heappush(self._asks_heap, entry)
+        else:
+            self._asks_heap.append(entry)
+
+    def add_ask(self, listing_id: str, seller: str, price_per_th: float,
+                hashrate: float, expiration_date: Optional[datetime]) -> None:
+        self.ensure_loaded()
+        with self._lock:
+            self._add_ask(listing_id, seller, price_per_th, hashrate, expiration_date, push=True)
+
+    def remove_ask(self, listing_id: str) -> None:
+        with self._lock:
+            self._asks.pop(listing_id, None)
+            self.aggregates.remove(listing_id)
+            if len(self._asks_heap) > 2 * len(self._asks) + COMPACT_SLACK:
+                self._asks_heap = [(ask.price_per_th, ask.seq, ask.listing_id) for ask in self._asks.values()]
+                heapq.heapify(self._asks_heap)
+
+    def floor_price(self) -> Optional[float]:
+        """Минимальная цена за TH/s среди активных листингов"""
+        self.ensure_loaded()
+        with self._lock:
+            heap = self._asks_heap
+            while heap:
+                _, seq, listing_id = heap[0]
+                ask = self._asks.get(listing_id)
+                if ask is not None and ask.seq == seq:
+                    return ask.price_per_th
+                heapq.heappop(heap)
+            return None
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        best = self.best_bid()
+        return {
+            'bestOffer': best.price_per_th if best else None,
+            'floorPrice': self.floor_price(),
+            'bidCount': len(self._bids),
+            'askCount': len(self._asks),
+        }
+
+    def market_snapshot(self) -> Dict[str, Any]:
+        """
+        Агрегаты листингов по корзинам + лучший оффер и спред. Для полосы
+        срока учитываются биды, которым подходит её нижняя граница.
+        """
+        self.ensure_loaded()
+        snapshot = self.aggregates.snapshot()
+
+        def with_offer(stats, min_days):
+            best = self.best_bid(min_days)
+            best_price = best.price_per_th if best else None
+            floor = stats['minPricePerTh']
+            return dict(
+                stats,
+                bestOfferPerTh=best_price,
+                spread=round(floor - best_price, 4) if floor is not None and best_price is not None else None
+            )
+
+        return {
+            'overall': with_offer(snapshot['overall'], None),
+            'byHashrate': snapshot['byHashrate'],
+            'byExpiration': [with_offer(band, band['minDays']) for band in snapshot['byExpiration']],
+        }
+
+    # ============= Исполнение =============
+
+    def match(self, listing, contract, min_price_per_th: Optional[float] = None) -> Optional[Fill]:
+        """
+        Исполнить листинг по лучшему подходящему биду (срок контракта,
+        бюджет, не свой бид, цена не ниже min_price_per_th).
+
+        Изменения добавляются в текущую сессию, commit делает вызывающий
+        код одним commit вместе с листингом; затем нужно вызвать settle().
+        """
+        from models.marketplace import MarketplaceOffer
+        from models.transaction import Transaction
+
+        # Биды, выставленные в других воркерах, не должны пропускаться
+        self.ensure_loaded(max_age=0)
+        if not contract.hashrate or contract.hashrate <= 0:
+            return None
+        days = remaining_days(contract.expiration_date)
+        now = datetime.utcnow()
+
+        with self._lock:
+            skipped = []
+            try:
+                for _ in range(MAX_MATCH_CANDIDATES):
+                    bid = self._pop_best(days, now)
+                    if bid is None:
+                        return None
+                    if min_price_per_th is not None and bid.price_per_th < min_price_per_th:
+                        skipped.append(bid)
+                        return None
+
+                    amount = round(bid.price_per_th * contract.hashrate, 2)
+                    if bid.bidder == listing.seller or bid.remaining_budget < amount:
+                        skipped.append(bid)
+                        continue
+
+                    # Списание бюджета: атомарно и только если бид ещё активен
+                    offer = db.session.execute(
+                        db.update(MarketplaceOffer).where(
+                            MarketplaceOffer.id == bid.offer_id,
+                            MarketplaceOffer.status == 'active',
+                            MarketplaceOffer.remaining_budget >= amount
+                        ).values(
+                            remaining_budget=MarketplaceOffer.remaining_budget - amount,
+                            status=db.case(
+                                (MarketplaceOffer.remaining_budget - amount < bid.price_per_th, 'filled'),
+                                else_='active'
+                            ),
+                            filled_at=now
+                        ).returning(MarketplaceOffer.remaining_budget, MarketplaceOffer.status)
+                    ).first()
+                    if offer is None:
+                        # Бид исполнен/отменён в другом процессе - в книгу не возвращаем
+                        continue
+
+                    transaction = Transaction(
+                        id=str(uuid.uuid4()),
+                        type='buy',
+                        amount=amount,
+                        from_address=bid.bidder,
+                        to_address=listing.seller,
+                        item_id=contract.id,
+                        user_id=bid.bidder,
+                        status='confirmed',
+                        tx_hash=str(uuid.uuid4())
+                    )
+                    db.session.add(transaction)
+                    record_purchase(transaction, contract, listing.seller, now, payer=ledger.ESCROW_ACCOUNT)
+                    remaining_budget, status = offer
+                    if status == 'filled' and remaining_budget > 0:
+                        ledger.transfer(str(uuid.uuid4()), 'offer_refund', ledger.ESCROW_ACCOUNT,
+                                        bid.bidder, 'USDT', remaining_budget)
+
+                    listing.status = 'sold'
+                    listing.sold_at = now
+                    contract.owner = bid.bidder
+                    contract.status = 'available'
+                    contract.listed_on_marketplace = False
+
+                    skipped.append(bid)
+                    return Fill(
+                        offer_id=bid.offer_id,
+                        listing_id=listing.id,
+                        bidder=bid.bidder,
+                        price_per_th=bid.price_per_th,
+                        amount=amount,
+                        transaction=transaction,
+                    )
+                return None
+            finally:
+                for bid in skipped:
+                    self._restore(bid)
+
+    def _pop_best(self, days: int, now: datetime) -> Optional[Bid]:
+        best_key, best = None, None
+        for band_key in list(self._bands):
+            if band_key > days:
+                continue
+            top = self._band_top(band_key, now)
+            if top and (best is None or (top.price_per_th, -top.seq) > (best.price_per_th, -best.seq)):
+                best_key, best = band_key, top
+        if best is None:
+            return None
+        heapq.heappop(self._bands[best_key])
+        del self._bids[best.offer_id]
+        return best
+
+    def _restore(self, bid: Bid) -> None:
+        self._bids[bid.offer_id] = bid
+        heapq.heappush(self._bands[bid.min_expiration_days], (-bid.price_per_th, bid.seq, bid.offer_id))
+
+    def settle(self, fill: Fill) -> None:
+        """Отразить commit исполнения в книге"""
+        with self._lock:
+            self.remove_ask(fill.listing_id)
+            bid = self._bids.get(fill.offer_id)
+            if bid is None:
+                return
+            bid.remaining_budget -= fill.amount
+            if bid.remaining_budget < bid.price_per_th:
+                del self._bids[fill.offer_id]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._bands, self._bids = {}, {}
+            self._asks_heap, self._asks = [], {}
+            self.aggregates = MarketAggregates()
+            self._version = None
+            self._loaded = False
+
+order_book = OrderBook()
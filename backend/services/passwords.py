@@ -0,0 +1,95 @@
+"""
+Passwords - хеширование паролей с настраиваемыми параметрами
+
+- PASSWORD_HASH_METHOD задаёт схему и параметры в формате werkzeug
+  (pbkdf2:sha256:600000, scrypt:32768:8:1, ...). Параметры указываются
+  явно, чтобы не зависеть от значений по умолчанию версии werkzeug.
+- needs_rehash() сравнивает схему сохранённого хеша с текущей: при
+  успешном логине хеш прозрачно пересчитывается в новую схему.
+- Проверка пароля выполняется в ограниченном пуле потоков (hashlib
+  отпускает GIL на pbkdf2/scrypt). Если очередь переполнена, verify
+  сразу бросает PasswordVerifierBusy - всплеск логинов получает 503,
+  а не занимает все воркеры запросов. Проверка дольше
+  PASSWORD_VERIFY_TIMEOUT бросает concurrent.futures.TimeoutError (тоже 503).
+- dummy_hash() считается при старте приложения (create_app).
+"""
+
+import functools
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+PASSWORD_SALT_LENGTH = int(os.getenv('PASSWORD_SALT_LENGTH', 16))
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', os.cpu_count() or 1))
+PASSWORD_QUEUE_SIZE = int(os.getenv('PASSWORD_QUEUE_SIZE', PASSWORD_WORKERS * 8))
+PASSWORD_VERIFY_TIMEOUT = float(os.getenv('PASSWORD_VERIFY_TIMEOUT', 10))
+
+class PasswordVerifierBusy(Exception):
+    """Очередь проверки паролей переполнена"""
+
+def hash_password(password: str, method: Optional[str] = None) -> str:
+    return generate_password_hash(
+        password,
+        method=method or PASSWORD_HASH_METHOD,
+        salt_length=PASSWORD_SALT_LENGTH
+    )
+
+@functools.lru_cache(maxsize=1)
+def dummy_hash() -> str:
+    """
+    Хеш для логина несуществующего пользователя: проверка по нему занимает
+    столько же, сколько по настоящему, и имена нельзя перебрать по времени ответа
+    """
+    return hash_password(secrets.token_urlsafe(16))
+
+def hash_method(pwhash: str) -> str:
+    """Схема с параметрами из хеша: 'pbkdf2:sha256:600000$salt$hash' -> 'pbkdf2:sha256:600000'"""
+    return pwhash.split('$', 1)[0]
+
+def needs_rehash(pwhash: str) -> bool:
+    return hash_method(pwhash) != PASSWORD_HASH_METHOD
+
+class PasswordVerifier:
+    """Ограниченный пул потоков для check_password_hash"""
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_size: int = PASSWORD_QUEUE_SIZE):
+        self.workers = workers
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix='password-verify'
+                    )
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordVerifierBusy('Too many concurrent password checks')
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=PASSWORD_VERIFY_TIMEOUT)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def hash(self, password: str) -> str:
+        return self._run(hash_password, password)
+
+password_verifier = PasswordVerifier()
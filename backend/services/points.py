@@ -0,0 +1,104 @@
+"""
+Points - ECOS баллы и уровни пользователей
+
+Уровень определяется объёмом покупок (total_volume, USDT) по порогам
+LEVEL_THRESHOLDS, баллы начисляются кэшбэком POINTS_CASHBACK_RATE от
+суммы покупки.
+
+apply_purchase() вызывается в пути покупки (services.purchases) до
+commit: один атомарный UPDATE ... RETURNING увеличивает объём и баллы,
+уровень ищется bisect по таблице порогов и записывается только при
+повышении. Ручные/стартовые уровни выше рассчитанного не понижаются.
+
+recompute_levels() пересобирает total_volume всех пользователей из
+истории покупок одним агрегатом GROUP BY и повышает level по нему.
+"""
+
+import bisect
+from typing import Dict, Optional
+
+from sqlalchemy import func
+
+from database import db
+from services.user_cache import invalidate_on_commit
+
+# Нижние границы объёма (USDT) для уровней 1..5
+LEVEL_THRESHOLDS = [0, 100000, 250000, 500000, 1000000]
+POINTS_CASHBACK_RATE = 0.01
+RECOMPUTE_CHUNK_SIZE = 10000
+
+def level_for_volume(volume: Optional[float]) -> int:
+    """Уровень по объёму торгов (1..len(LEVEL_THRESHOLDS))"""
+    return max(bisect.bisect_right(LEVEL_THRESHOLDS, volume or 0.0), 1)
+
+def points_for_amount(amount: float) -> int:
+    return int(amount * POINTS_CASHBACK_RATE)
+
+def apply_purchase(user_id: str, amount: float) -> Dict:
+    """Начислить объём и баллы покупателю, повысить уровень (без commit)"""
+    from models.user import User
+
+    points = points_for_amount(amount)
+    row = db.session.execute(
+        db.update(User).where(User.id == user_id).values(
+            total_volume=func.coalesce(User.total_volume, 0) + amount,
+            ecos_points=func.coalesce(User.ecos_points, 0) + points,
+        ).returning(User.total_volume, User.level).execution_options(synchronize_session=False)
+    ).one_or_none()
+    if row is None:
+        raise LookupError(f'User {user_id} not found')
+    volume, level = row
+
+    new_level = level_for_volume(volume)
+    if new_level > (level or 1):
+        db.session.execute(
+            db.update(User).where(User.id == user_id).values(level=new_level)
+            .execution_options(synchronize_session=False)
+        )
+        level = new_level
+
+    invalidate_on_commit(user_id)
+    return {'totalVolume': volume, 'level': level or 1, 'pointsEarned': points}
+
+def recompute_levels(chunk_size: int = RECOMPUTE_CHUNK_SIZE, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Пересчитать total_volume и level всех пользователей по Transaction(type='buy').
+    ecos_points не трогаем - баллы бывают не только от покупок.
+    """
+    from models.user import User
+    from models.transaction import Transaction
+
+    volumes = dict(db.session.query(
+        Transaction.user_id, func.sum(Transaction.amount)
+    ).filter(
+        Transaction.type == 'buy',
+        Transaction.user_id.isnot(None)
+    ).group_by(Transaction.user_id).all())
+
+    stats = {'scanned': 0, 'updated': 0}
+    last_id = None
+    while True:
+        query = db.session.query(User.id, User.total_volume, User.level)
+        if last_id is not None:
+            query = query.filter(User.id > last_id)
+        rows = query.order_by(User.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        changes = []
+        for user_id, old_volume, old_level in rows:
+            volume = float(volumes.get(user_id) or 0.0)
+            # Как в apply_purchase: ручные/стартовые уровни не понижаем
+            level = max(old_level or 1, level_for_volume(volume))
+            if abs((old_volume or 0.0) - volume) > 1e-6 or old_level != level:
+                changes.append({'id': user_id, 'total_volume': volume, 'level': level})
+
+        if changes and not dry_run:
+            db.session.execute(db.update(User), changes)
+            invalidate_on_commit(*[change['id'] for change in changes])
+            db.session.commit()
+
+        stats['scanned'] += len(rows)
+        stats['updated'] += len(changes)
+    return stats
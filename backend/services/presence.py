@@ -0,0 +1,142 @@
+"""
+Presence - подсчёт пользователей онлайн
+
+Скользящее окно из минутных корзин: пользователь считается онлайн, если
+делал запросы в последние PRESENCE_WINDOW_MINUTES минут. Считаются только
+залогиненные пользователи (ключ - user id). Хук before_request
+вызывает touch() на каждом запросе, но в бэкенд попадает только первое
+касание ключа в текущей минуте - остальные отсекаются проверкой в set.
+
+Бэкенды:
+- LocalPresenceBackend - в памяти процесса (по умолчанию)
+- RedisPresenceBackend - общий для всех воркеров, HyperLogLog на минуту
+  (PFADD/PFCOUNT). Подходит любой клиент с pipeline()/pfadd/expire/pfcount,
+  поэтому вместо Redis можно подставить локальную заглушку.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+PRESENCE_WINDOW_MINUTES = int(os.getenv('PRESENCE_WINDOW_MINUTES', 5))
+PRESENCE_COUNT_CACHE_SECONDS = 5
+
+def _current_bucket(now: Optional[float] = None) -> int:
+    return int((now if now is not None else time.time()) // 60)
+
+class LocalPresenceBackend:
+    """
+    Корзины minute -> set(ключей) и last_seen ключ -> minute.
+
+    Ключ хранится только в корзине своего последнего появления, поэтому
+    сумма размеров корзин в окне = число уникальных ключей. Сумма ведётся
+    инкрементально, count() - O(1).
+    """
+
+    def __init__(self, window_minutes: int = PRESENCE_WINDOW_MINUTES):
+        self.window_minutes = window_minutes
+        self._buckets = {}
+        self._last_seen = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def touch(self, key: str, bucket: int) -> None:
+        with self._lock:
+            self._expire(bucket)
+            previous = self._last_seen.get(key)
+            if previous == bucket:
+                return
+            if previous is not None and previous in self._buckets:
+                self._buckets[previous].discard(key)
+                self._total -= 1
+            self._buckets.setdefault(bucket, set()).add(key)
+            self._last_seen[key] = bucket
+            self._total += 1
+
+    def count(self, bucket: int) -> int:
+        with self._lock:
+            self._expire(bucket)
+            return self._total
+
+    def _expire(self, bucket: int) -> None:
+        oldest_allowed = bucket - self.window_minutes + 1
+        # Корзины создаются по возрастанию минут - dict хранит порядок вставки
+        while self._buckets:
+            oldest = next(iter(self._buckets))
+            if oldest >= oldest_allowed:
+                break
+            expired = self._buckets.pop(oldest)
+            self._total -= len(expired)
+            for key in expired:
+                if self._last_seen.get(key) == oldest:
+                    del self._last_seen[key]
+
+class RedisPresenceBackend:
+    """Общий бэкенд: одна HyperLogLog-структура на минуту"""
+
+    def __init__(self, client, window_minutes: int = PRESENCE_WINDOW_MINUTES,
+                 prefix: str = 'presence'):
+        self.client = client
+        self.window_minutes = window_minutes
+        self.prefix = prefix
+
+    def _key(self, bucket: int) -> str:
+        return f'{self.prefix}:{bucket}'
+
+    def touch(self, key: str, bucket: int) -> None:
+        name = self._key(bucket)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.pfadd(name, key)
+        pipe.expire(name, (self.window_minutes + 1) * 60)
+        pipe.execute()
+
+    def count(self, bucket: int) -> int:
+        keys = [self._key(b) for b in range(bucket - self.window_minutes + 1, bucket + 1)]
+        return int(self.client.pfcount(*keys))
+
+class PresenceTracker:
+    """Фасад для хука и эндпоинта: дедупликация касаний и кэш счётчика"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or LocalPresenceBackend()
+        self._seen_bucket = None
+        self._seen = set()
+        self._cached_count = None
+        self._cached_at = 0.0
+
+    def touch(self, key: Optional[str], now: Optional[float] = None) -> None:
+        if not key:
+            return
+        bucket = _current_bucket(now)
+        if bucket != self._seen_bucket:
+            self._seen_bucket = bucket
+            self._seen = set()
+        elif key in self._seen:
+            return
+        self._seen.add(key)
+        try:
+            self.backend.touch(key, bucket)
+        except Exception as e:
+            print(f"Presence backend error: {e}")
+
+    def count(self, now: Optional[float] = None) -> int:
+        now = now if now is not None else time.time()
+        if self._cached_count is not None and now - self._cached_at < PRESENCE_COUNT_CACHE_SECONDS:
+            return self._cached_count
+        self._cached_count = self.backend.count(_current_bucket(now))
+        self._cached_at = now
+        return self._cached_count
+
+def create_presence_tracker() -> PresenceTracker:
+    """Redis, если задан PRESENCE_REDIS_URL, иначе память процесса"""
+    redis_url = os.getenv('PRESENCE_REDIS_URL')
+    if redis_url:
+        try:
+            import redis
+            return PresenceTracker(RedisPresenceBackend(redis.Redis.from_url(redis_url)))
+        except ImportError:
+            print("redis package not installed, falling back to local presence tracking")
+    return PresenceTracker()
+
+presence_tracker = create_presence_tracker()
@@ -0,0 +1,257 @@
+"""
+RequestProfiler - профилирование отдельных запросов в работающем сервисе
+
+Запрос профилируется cProfile, если:
+- в нём есть подписанный заголовок X-Profile: "<expires>.<hmac>" (HMAC-SHA256
+  от expires на PROFILER_SECRET, выдаётся POST /api/profiler/token),
+- включён админский тумблер (POST /api/profiler/toggle) - следующие N
+  запросов, при желании только к одному endpoint,
+- или выпал случайный 1 из PROFILE_SAMPLE_RATE.
+
+Захват сохраняется в PROFILE_DIR как pstats (.prof, открывается snakeviz /
+pstats) с метаданными рядом (.json); каталог - кольцо на PROFILE_MAX_CAPTURES
+файлов, старые удаляются. Ответ получает X-Profile-Id для скачивания.
+
+Если PROFILER_SECRET не задан и PROFILE_SAMPLE_RATE = 0, хуки не
+регистрируются вовсе - накладных расходов нет. Одновременно идёт не больше
+одного захвата на процесс: cProfile в нескольких потоках сразу мешает
+точности (а в Python 3.12+ запрещён).
+"""
+
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PROFILER_SECRET = os.getenv('PROFILER_SECRET', '')
+PROFILE_SAMPLE_RATE = int(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'mrkt-profiles'))
+PROFILE_MAX_CAPTURES = int(os.getenv('PROFILE_MAX_CAPTURES', 50))
+PROFILE_HEADER = 'X-Profile'
+MAX_TOKEN_TTL_SECONDS = 24 * 3600
+
+CAPTURE_ID = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{8}$')
+# Ключи сортировки текстового отчёта (cumulative, tottime, calls, ...)
+SORT_KEYS = tuple(pstats.Stats.sort_arg_dict_default)
+
+class RequestProfiler:
+    def __init__(self, secret: str = PROFILER_SECRET, sample_rate: int = PROFILE_SAMPLE_RATE,
+                 directory: str = PROFILE_DIR, max_captures: int = PROFILE_MAX_CAPTURES):
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.max_captures = max_captures
+        self._capture_lock = threading.Lock()
+        self._toggle_lock = threading.Lock()
+        self._toggle_remaining = 0
+        self._toggle_endpoint: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.secret) or self.sample_rate > 0
+
+    # Подписи и доступ
+
+    def _signature(self, expires: int) -> str:
+        return hmac.new(self.secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+
+    def sign(self, ttl: int) -> str:
+        """Значение заголовка X-Profile, действующее ttl секунд"""
+        expires = int(time.time()) + min(ttl, MAX_TOKEN_TTL_SECONDS)
+        return f'{expires}.{self._signature(expires)}'
+
+    def verify(self, value: Optional[str]) -> bool:
+        if not self.secret or not value or '.' not in value:
+            return False
+        expires, signature = value.split('.', 1)
+        if not expires.isdigit() or int(expires) < time.time():
+            return False
+        return hmac.compare_digest(signature, self._signature(int(expires)))
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        return bool(self.secret) and bool(token) and hmac.compare_digest(token, self.secret)
+
+    # Тумблер
+
+    def toggle(self, count: int, endpoint: Optional[str] = None) -> Dict:
+        """Профилировать следующие count запросов (0 - выключить) в этом процессе"""
+        with self._toggle_lock:
+            self._toggle_remaining = max(count, 0)
+            self._toggle_endpoint = endpoint if count > 0 else None
+        return self.toggle_state()
+
+    def toggle_state(self) -> Dict:
+        return {'remaining': self._toggle_remaining, 'endpoint': self._toggle_endpoint}
+
+    def _toggle_matches(self, endpoint: Optional[str]) -> bool:
+        return self._toggle_remaining > 0 and (not self._toggle_endpoint or self._toggle_endpoint == endpoint)
+
+    def _take_toggle(self, endpoint: Optional[str]) -> bool:
+        if not self._toggle_remaining:
+            return False
+        with self._toggle_lock:
+            if not self._toggle_matches(endpoint):
+                return False
+            self._toggle_remaining -= 1
+            if not self._toggle_remaining:
+                self._toggle_endpoint = None
+            return True
+
+    # Решение о профилировании
+
+    def reason_for(self, header: Optional[str], endpoint: Optional[str]) -> Optional[str]:
+        """
+        Причина профилировать запрос. Слот тумблера здесь не расходуется:
+        его списывает begin(), когда захват действительно начался
+        """
+        if header and self.verify(header):
+            return 'header'
+        if self._toggle_matches(endpoint):
+            return 'toggle'
+        if self.sample_rate > 0 and random.randrange(self.sample_rate) == 0:
+            return 'sample'
+        return None
+
+    # Захваты
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if not self._capture_lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Уже работает другой профилировщик
+            self._capture_lock.release()
+            return None
+        return profile
+
+    def begin(self, reason: str, endpoint: Optional[str]) -> Optional[cProfile.Profile]:
+        """start() и списание слота тумблера, если захват идёт по нему"""
+        profile = self.start()
+        if profile is None or reason != 'toggle' or self._take_toggle(endpoint):
+            return profile
+        # Тумблер выключили или слот забрали между reason_for и start
+        try:
+            profile.disable()
+        finally:
+            self._capture_lock.release()
+        return None
+
+    def finish(self, profile: cProfile.Profile, meta: Dict) -> Optional[str]:
+        """Остановить профилирование и сохранить захват, вернуть его id"""
+        try:
+            profile.disable()
+        finally:
+            self._capture_lock.release()
+
+        capture_id = f'{datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, f'{capture_id}.prof'))
+            with open(os.path.join(self.directory, f'{capture_id}.json'), 'w') as f:
+                json.dump({'id': capture_id, **meta}, f)
+            self._trim()
+        except OSError as e:
+            print(f"Failed to store profile {capture_id}: {e}")
+            return None
+        return capture_id
+
+    def _trim(self) -> None:
+        ids = self._capture_ids()
+        for capture_id in ids[:-self.max_captures] if len(ids) > self.max_captures else []:
+            for ext in ('prof', 'json'):
+                try:
+                    os.remove(os.path.join(self.directory, f'{capture_id}.{ext}'))
+                except FileNotFoundError:
+                    pass
+
+    def _capture_ids(self) -> List[str]:
+        """id захватов от старых к новым (id начинается со времени)"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith('.json') and CAPTURE_ID.match(name[:-5]))
+
+    def captures(self) -> List[Dict]:
+        result = []
+        for capture_id in reversed(self._capture_ids()):
+            try:
+                with open(os.path.join(self.directory, f'{capture_id}.json')) as f:
+                    result.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    def capture_path(self, capture_id: str) -> Optional[str]:
+        if not CAPTURE_ID.match(capture_id):
+            return None
+        path = os.path.join(self.directory, f'{capture_id}.prof')
+        return path if os.path.exists(path) else None
+
+    def render_text(self, capture_id: str, sort: str = 'cumulative', limit: int = 50) -> Optional[str]:
+        if sort not in SORT_KEYS:
+            raise ValueError(f'Unknown sort key: {sort}')
+        path = self.capture_path(capture_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    # Flask
+
+    def init_app(self, app) -> None:
+        if not self.enabled:
+            return
+        from flask import g, request
+
+        @app.before_request
+        def start_profile():
+            reason = self.reason_for(request.headers.get(PROFILE_HEADER), request.endpoint)
+            if reason is None:
+                return
+            profile = self.begin(reason, request.endpoint)
+            if profile is not None:
+                g._profile = (profile, reason, time.perf_counter())
+
+        def stop(status):
+            state = g.pop('_profile', None)
+            if state is None:
+                return None
+            profile, reason, started = state
+            return self.finish(profile, {
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': status,
+                'reason': reason,
+                'durationMs': round((time.perf_counter() - started) * 1000, 3),
+                'capturedAt': datetime.utcnow().isoformat(),
+            })
+
+        @app.after_request
+        def finish_profile(response):
+            capture_id = stop(response.status_code)
+            if capture_id:
+                response.headers['X-Profile-Id'] = capture_id
+            return response
+
+        @app.teardown_request
+        def abort_profile(exc):
+            # after_request пропускается при необработанном исключении
+            stop(500)
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,25 @@
+"""
+Purchases - побочные эффекты покупки контракта
+
+record_purchase() вызывается во всех путях покупки (прямая покупка
+листинга, исполнение по офферу) после создания Transaction и до commit,
+чтобы всё записалось одной транзакцией БД. Если у покупателя не хватает
+средств, ledger.InsufficientFunds - вызывающий код откатывает транзакцию.
+"""
+
+from datetime import datetime
+
+from services import candles, ledger, points, referrals
+
+def record_purchase(transaction, contract, seller_id: str, ts: datetime = None, payer: str = None) -> None:
+    # Свечи цены за TH/s
+    candles.record_trade(transaction.amount, contract.hashrate, ts)
+
+    # Покупатель (или резерв его оффера - payer) платит продавцу
+    ledger.transfer(transaction.id, 'purchase', payer or transaction.user_id, seller_id, 'USDT', transaction.amount)
+
+    # Объём, ECOS баллы и уровень покупателя
+    points.apply_purchase(transaction.user_id, transaction.amount)
+
+    # Комиссии реферерам покупателя
+    referrals.apply_purchase(transaction.user_id, transaction.amount, transaction.id)
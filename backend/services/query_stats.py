@@ -0,0 +1,164 @@
+"""
+QueryStats - счётчик SQL-запросов и времени БД на запрос
+
+События SQLAlchemy (before/after_cursor_execute) слушаются на уровне класса
+Engine, так что учитываются все движки приложения. Статистика копится в
+thread-local сборщиках: один на HTTP-запрос (before_request/after_request)
+и любые вложенные count_queries() - из тестов и скриптов.
+
+В dev-режиме (QUERY_STATS, по умолчанию как FLASK_DEBUG) ответ получает
+заголовки X-DB-Queries, X-DB-Time и Server-Timing, а повтор одной формы
+запроса больше QUERY_REPEAT_THRESHOLD раз за запрос пишется в лог как
+подозрение на N+1.
+
+Проверка бюджета запросов:
+
+    with assert_max_queries(3):
+        client.get('/api/marketplace/listings')
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_REPEAT_THRESHOLD = 10
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+_WHITESPACE = re.compile(r'\s+')
+_PARAM_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SELECT_COLUMNS = re.compile(r'^SELECT .+? FROM ')
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """Форма запроса: без литералов, списки параметров IN (...) схлопнуты"""
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    shape = _LITERAL.sub('?', shape)
+    return _PARAM_LIST.sub('(?)', shape)
+
+def short_shape(shape: str, limit: int = 300) -> str:
+    """Форма для логов: список колонок SELECT опущен"""
+    return _SELECT_COLUMNS.sub('SELECT ... FROM ', shape, count=1)[:limit]
+
+class QueryCollector:
+    """Статистика запросов одного блока кода (HTTP-запрос или count_queries)"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # Секунды
+        self.statements: List[str] = []
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements.append(statement)
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Формы, выполненные больше threshold раз"""
+        return {shape: n for shape, n in self.shapes.items() if n > threshold}
+
+def _collectors() -> List[QueryCollector]:
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    return _local.collectors
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collectors():
+        conn.info['query_stats_started'] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _collectors()
+    started = conn.info.pop('query_stats_started', None)
+    if not collectors or started is None:
+        return
+    duration = time.perf_counter() - started
+    for collector in collectors:
+        collector.record(statement, duration)
+
+def install() -> None:
+    """Подписаться на события Engine (один раз на процесс)"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _installed = True
+
+@contextmanager
+def count_queries():
+    """Считать запросы текущего потока внутри блока"""
+    install()
+    collector = QueryCollector()
+    _collectors().append(collector)
+    try:
+        yield collector
+    finally:
+        _collectors().remove(collector)
+
+@contextmanager
+def assert_max_queries(max_count: int, label: str = ''):
+    """AssertionError, если блок выполнил больше max_count запросов"""
+    with count_queries() as collector:
+        yield collector
+    if collector.count > max_count:
+        statements = '\n'.join(f'  {n}x {short_shape(shape)}' for shape, n in collector.shapes.most_common())
+        raise AssertionError(
+            f'{label or "block"} executed {collector.count} queries, expected at most {max_count}:\n{statements}'
+        )
+
+def current_request_stats() -> Optional[QueryCollector]:
+    return g.get('_query_stats')
+
+def init_query_stats(app) -> None:
+    """Подключить учёт запросов к приложению"""
+    enabled = os.getenv('QUERY_STATS', os.getenv('FLASK_DEBUG', 'True')) == 'True'
+    app.config.setdefault('QUERY_STATS', enabled)
+    app.config.setdefault('QUERY_REPEAT_THRESHOLD', int(os.getenv('QUERY_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)))
+    if not app.config['QUERY_STATS']:
+        return
+    install()
+
+    @app.before_request
+    def start_query_stats():
+        g._query_stats = QueryCollector()
+        _collectors().append(g._query_stats)
+
+    @app.after_request
+    def emit_query_stats(response):
+        collector = g.pop('_query_stats', None)
+        if collector is None:
+            return response
+        if collector in _collectors():
+            _collectors().remove(collector)
+
+        db_ms = collector.duration * 1000
+        response.headers['X-DB-Queries'] = str(collector.count)
+        response.headers['X-DB-Time'] = f'{db_ms:.2f}'
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.2f};desc="{collector.count} queries"')
+
+        for shape, n in collector.repeated(app.config['QUERY_REPEAT_THRESHOLD']).items():
+            app.logger.warning('Possible N+1: %s %s ran the same query %d times: %s',
+                               request.method, request.path, n, short_shape(shape))
+        return response
+
+    @app.teardown_request
+    def drop_query_stats(exc):
+        # after_request не вызывается при необработанном исключении
+        collector = g.pop('_query_stats', None)
+        if collector is not None and collector in _collectors():
+            _collectors().remove(collector)
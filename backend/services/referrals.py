@@ -0,0 +1,220 @@
+"""
+Referrals - реферальные связи и комиссии
+
+Дерево рефералов хранится closure-таблицей ReferralLink (предок, потомок,
+глубина), поэтому все рефереры покупателя - один индексный запрос по
+descendant_id. Комиссия начисляется ECOS баллами в пути покупки
+(services.purchases) до commit: ставка по уровню реферера
+(REFERRAL_COMMISSION_RATES), доля по глубине (REFERRAL_DEPTH_SHARES,
+сейчас только прямой реферер).
+
+Баллы и счётчики (ReferralStats) зачисляются пакетно: один executemany
+UPDATE по users и один UPSERT по referral_stats на покупку, так что
+/api/user/referrals/stats не считает строки users.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import db
+from models.referral import ReferralLink, ReferralStats
+from services.user_cache import invalidate_on_commit
+
+# Ставка комиссии для уровней 1..5 (см. services.points.LEVEL_THRESHOLDS)
+REFERRAL_COMMISSION_RATES = [0.20, 0.25, 0.30, 0.35, 0.40]
+# Доля комиссии для предка на глубине 1, 2, ...
+REFERRAL_DEPTH_SHARES = [1.0]
+REFERRAL_MAX_DEPTH = len(REFERRAL_DEPTH_SHARES)
+# Защита от циклов в referred_by при пересборке
+REBUILD_MAX_DEPTH = 64
+
+def commission_rate(level: Optional[int]) -> float:
+    index = min(max((level or 1) - 1, 0), len(REFERRAL_COMMISSION_RATES) - 1)
+    return REFERRAL_COMMISSION_RATES[index]
+
+def commission_points(amount: float, level: Optional[int], depth: int = 1) -> int:
+    if depth > REFERRAL_MAX_DEPTH:
+        return 0
+    return int(amount * commission_rate(level) * REFERRAL_DEPTH_SHARES[depth - 1])
+
+def find_referrer(referral_code: str):
+    from models.user import User
+    return User.query.filter_by(referral_code=referral_code).first()
+
+def link_referral(user, referrer_id: str) -> None:
+    """
+    Привязать нового пользователя к рефереру: referred_by, строки
+    closure-таблицы для реферера и всех его предков, счётчик приглашённых.
+    Без commit; user должен быть уже добавлен в сессию.
+    """
+    from models.user import User
+
+    if not referrer_id or referrer_id == user.id or user.referred_by:
+        return
+
+    user.referred_by = referrer_id
+    db.session.flush()
+
+    links = ReferralLink.__table__
+    db.session.execute(links.insert().values(
+        ancestor_id=referrer_id, descendant_id=user.id, depth=1, earned_points=0, total_volume=0.0
+    ))
+    db.session.execute(links.insert().from_select(
+        ['ancestor_id', 'descendant_id', 'depth', 'earned_points', 'total_volume'],
+        db.select(
+            links.c.ancestor_id,
+            db.literal(user.id),
+            links.c.depth + 1,
+            db.literal(0),
+            db.literal(0.0),
+        ).where(links.c.descendant_id == referrer_id)
+    ))
+    db.session.execute(
+        db.update(User).where(User.id == referrer_id).values(
+            friends_invited=func.coalesce(User.friends_invited, 0) + 1
+        ).execution_options(synchronize_session=False)
+    )
+    invalidate_on_commit(referrer_id)
+
+def _upsert_stats(rows: List[Dict]) -> None:
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    stmt = insert(ReferralStats.__table__)
+    table = ReferralStats.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={
+            'active_referrals': table.active_referrals + stmt.excluded.active_referrals,
+            'earned_points': table.earned_points + stmt.excluded.earned_points,
+            'referred_volume': table.referred_volume + stmt.excluded.referred_volume,
+            'updated_at': stmt.excluded.updated_at,
+        }
+    )
+    db.session.execute(stmt, rows)
+
+def apply_purchase(buyer_id: str, amount: float, transaction_id: str) -> int:
+    """
+    Начислить комиссии реферерам покупателя (без commit). Возвращает сумму баллов.
+    transaction_id - текущая покупка: она не считается предыдущей при поиске первой
+    """
+    from models.user import User
+    from models.transaction import Transaction
+
+    ancestors = db.session.query(
+        ReferralLink.ancestor_id, ReferralLink.depth, User.level
+    ).join(
+        User, User.id == ReferralLink.ancestor_id
+    ).filter(
+        ReferralLink.descendant_id == buyer_id,
+        ReferralLink.depth <= REFERRAL_MAX_DEPTH
+    ).all()
+    if not ancestors:
+        return 0
+
+    # Первая покупка реферала - нет других Transaction(type='buy'); по объёму
+    # её не определить, покупка с нулевой суммой его не меняет
+    first_purchase = db.session.query(Transaction.id).filter(
+        Transaction.user_id == buyer_id,
+        Transaction.type == 'buy',
+        Transaction.id != transaction_id
+    ).first() is None
+
+    links = ReferralLink.__table__
+    now = datetime.utcnow()
+    credits = []
+    stats = []
+    for ancestor_id, depth, level in ancestors:
+        points = commission_points(amount, level, depth)
+        db.session.execute(
+            links.update().where(
+                links.c.ancestor_id == ancestor_id,
+                links.c.descendant_id == buyer_id
+            ).values(
+                total_volume=links.c.total_volume + amount,
+                earned_points=links.c.earned_points + points
+            )
+        )
+        if points:
+            credits.append({'ancestor': ancestor_id, 'points': points})
+        stats.append({
+            'user_id': ancestor_id,
+            'active_referrals': 1 if first_purchase else 0,
+            'earned_points': points,
+            'referred_volume': amount,
+            'updated_at': now,
+        })
+
+    if credits:
+        users = User.__table__
+        db.session.execute(
+            users.update().where(users.c.id == bindparam('ancestor')).values(
+                ecos_points=func.coalesce(users.c.ecos_points, 0) + bindparam('points')
+            ),
+            credits
+        )
+        invalidate_on_commit(*[credit['ancestor'] for credit in credits])
+    _upsert_stats(stats)
+    return sum(credit['points'] for credit in credits)
+
+def referral_stats(user_id: str) -> Dict:
+    """Статистика рефералов из поддерживаемых счётчиков (два запроса по PK)"""
+    from models.user import User
+
+    user = db.session.get(User, user_id)
+    stats = db.session.get(ReferralStats, user_id) or ReferralStats(user_id=user_id)
+    data = {
+        'code': user.referral_code if user else None,
+        'totalInvited': (user.friends_invited or 0) if user else 0,
+        'commissionRate': commission_rate(user.level if user else 1),
+    }
+    data.update(stats.to_dict())
+    return data
+
+def rebuild_closure() -> Dict[str, int]:
+    """
+    Достроить closure-таблицу по users.referred_by (недостающие пары,
+    по одному set-based INSERT на уровень глубины) и пересчитать
+    friends_invited у пользователей с прямыми рефералами в closure-таблице
+    (у остальных счётчик не трогается). Счётчики существующих пар не трогаются.
+    """
+    from models.user import User
+
+    links = ReferralLink.__table__
+    users = User.__table__
+    columns = ['ancestor_id', 'descendant_id', 'depth', 'earned_points', 'total_volume']
+
+    def missing(ancestor, descendant):
+        return ~db.exists().where(links.c.ancestor_id == ancestor, links.c.descendant_id == descendant)
+
+    inserted = db.session.execute(links.insert().from_select(columns,
+        db.select(users.c.referred_by, users.c.id, db.literal(1), db.literal(0), db.literal(0.0))
+        .where(users.c.referred_by.isnot(None), missing(users.c.referred_by, users.c.id))
+    )).rowcount
+
+    depth = 1
+    while depth < REBUILD_MAX_DEPTH:
+        has_level = db.session.query(
+            db.exists().where(links.c.depth == depth)
+        ).scalar()
+        if not has_level:
+            break
+        parent = links.alias('parent')
+        inserted += db.session.execute(links.insert().from_select(columns,
+            db.select(parent.c.ancestor_id, users.c.id, db.literal(depth + 1), db.literal(0), db.literal(0.0))
+            .select_from(users.join(parent, parent.c.descendant_id == users.c.referred_by))
+            .where(parent.c.depth == depth, missing(parent.c.ancestor_id, users.c.id))
+        )).rowcount
+        depth += 1
+
+    invited = db.select(func.count()).select_from(links).where(
+        links.c.ancestor_id == users.c.id, links.c.depth == 1
+    ).scalar_subquery()
+    db.session.execute(users.update().where(
+        db.exists().where(links.c.ancestor_id == users.c.id, links.c.depth == 1)
+    ).values(friends_invited=invited))
+    db.session.commit()
+
+    return {'inserted': inserted, 'maxDepth': depth - 1}
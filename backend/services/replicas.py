@@ -0,0 +1,184 @@
+"""
+ReplicaRouter - чтения помеченных GET-эндпоинтов с реплик
+
+Эндпоинт помечается декоратором @replica_read. На такой запрос роутер
+назначает сессии реплику (round-robin по DATABASE_REPLICA_URLS), и
+RoutingSession отправляет на неё SELECT; записи всегда идут на основную БД.
+
+Read-your-writes: если запрос что-то записал, в cookie-сессию клиента
+кладётся db_primary_until - следующие REPLICA_PIN_SECONDS секунд его
+чтения идут на основную БД (cookie общая для всех воркеров).
+
+Здоровье: перед назначением реплика проверяется (SELECT 1, для Postgres с
+REPLICA_MAX_LAG_SECONDS - отставание репликации) не чаще раза в
+REPLICA_CHECK_SECONDS. Недоступная реплика или ошибка соединения во время
+запроса исключают её на REPLICA_RETRY_SECONDS; если живых реплик нет,
+читаем с основной БД.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, exc
+
+from database import REPLICA_BIND_PREFIX, db
+from services.metrics import db_read_route_total, registry
+
+PIN_SESSION_KEY = 'db_primary_until'
+POSTGRES_LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+def replica_read(view):
+    """Разрешить чтения этого эндпоинта с реплики (ставится под @bp.route)"""
+    view.replica_read = True
+    return view
+
+class ReplicaState:
+    def __init__(self, key: str, engine):
+        self.key = key
+        self.engine = engine
+        self.checked_at = float('-inf')
+        self.down_until = 0.0
+        self.error: Optional[str] = None
+
+    def to_dict(self, now: float) -> Dict:
+        return {
+            'bind': self.key,
+            'up': self.down_until <= now,
+            'retryInSeconds': round(max(self.down_until - now, 0), 1),
+            'error': self.error,
+        }
+
+class ReplicaRouter:
+    def __init__(self):
+        self.pin_seconds = 5
+        self.check_seconds = 10
+        self.retry_seconds = 30
+        self.max_lag_seconds = 0
+        self.replicas: List[ReplicaState] = []
+        self._by_engine: Dict = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self.logger = None
+
+    def choose(self) -> Optional[ReplicaState]:
+        """Следующая живая реплика по кругу или None"""
+        if not self.replicas:
+            return None
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        now = time.monotonic()
+        for offset in range(len(self.replicas)):
+            state = self.replicas[(start + offset) % len(self.replicas)]
+            if state.down_until > now:
+                continue
+            if now - state.checked_at >= self.check_seconds and not self.check(state):
+                continue
+            return state
+        return None
+
+    def check(self, state: ReplicaState) -> bool:
+        try:
+            with state.engine.connect() as conn:
+                if self.max_lag_seconds and state.engine.dialect.name == 'postgresql':
+                    lag = conn.exec_driver_sql(POSTGRES_LAG_SQL).scalar()
+                    if lag is not None and lag > self.max_lag_seconds:
+                        raise RuntimeError(f'replication lag {lag:.1f}s > {self.max_lag_seconds}s')
+                else:
+                    conn.exec_driver_sql('SELECT 1')
+        except Exception as e:
+            self.mark_down(state, e)
+            return False
+        state.checked_at = time.monotonic()
+        state.error = None
+        return True
+
+    def mark_down(self, state: ReplicaState, error) -> None:
+        now = time.monotonic()
+        if state.down_until > now:
+            return
+        state.down_until = now + self.retry_seconds
+        state.checked_at = float('-inf')
+        state.error = str(error).splitlines()[0]
+        if self.logger is not None:
+            self.logger.warning('Replica %s is down for %ss: %s', state.key, self.retry_seconds, state.error)
+
+    def status(self) -> List[Dict]:
+        now = time.monotonic()
+        return [state.to_dict(now) for state in self.replicas]
+
+    def _handle_error(self, context):
+        # Ошибка соединения/OperationalError на реплике - не назначать её до повторной проверки
+        state = self._by_engine.get(context.engine)
+        if state is not None and (context.is_disconnect
+                                  or isinstance(context.sqlalchemy_exception, exc.OperationalError)):
+            self.mark_down(state, context.original_exception)
+
+    def _samples(self):
+        now = time.monotonic()
+        return [
+            ('db_replica_up', 'gauge', 'Replica available for reads', {'bind': state.key},
+             1 if state.down_until <= now else 0)
+            for state in self.replicas
+        ]
+
+    def init_app(self, app) -> None:
+        """Хуки маршрутизации; без DATABASE_REPLICA_URLS ничего не регистрирует"""
+        from flask import current_app, g, request, session
+
+        with app.app_context():
+            engines = sorted(
+                (key, engine) for key, engine in db.engines.items()
+                if key and key.startswith(REPLICA_BIND_PREFIX)
+            )
+        if not engines:
+            return
+
+        self.pin_seconds = app.config['REPLICA_PIN_SECONDS']
+        self.check_seconds = app.config['REPLICA_CHECK_SECONDS']
+        self.retry_seconds = app.config['REPLICA_RETRY_SECONDS']
+        self.max_lag_seconds = app.config['REPLICA_MAX_LAG_SECONDS']
+        self.logger = app.logger
+        self.replicas = [ReplicaState(key, engine) for key, engine in engines]
+        self._by_engine = {state.engine: state for state in self.replicas}
+        self._next = 0
+        for state in self.replicas:
+            event.listen(state.engine, 'handle_error', self._handle_error)
+        registry.add_collector('replicas', self._samples)
+        route_header = app.config.get('QUERY_STATS', False)
+
+        @app.before_request
+        def route_reads():
+            view = current_app.view_functions.get(request.endpoint)
+            if request.method != 'GET' or not getattr(view, 'replica_read', False):
+                return
+            if session.get(PIN_SESSION_KEY, 0) > time.time():
+                g.db_route = 'primary (pinned)'
+            else:
+                state = self.choose()
+                if state is None:
+                    g.db_route = 'primary (no replica)'
+                else:
+                    db.session.info['replica'] = state.engine
+                    g.db_route = state.key
+            db_read_route_total.inc(target=g.db_route)
+
+        @app.after_request
+        def pin_after_write(response):
+            if db.session.info.get('wrote'):
+                session[PIN_SESSION_KEY] = time.time() + self.pin_seconds
+            if route_header:
+                response.headers['X-DB-Route'] = g.get('db_route', 'primary')
+            return response
+
+        @app.teardown_request
+        def clear_route(exc):
+            # Сессия живёт до конца app context, который может пережить запрос
+            db.session.info.pop('replica', None)
+            db.session.info.pop('wrote', None)
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,321 @@
+"""
+Scheduler - встроенный планировщик периодических задач
+
+Задачи регистрируются с cron-расписанием (минута час день месяц день_недели,
+поддерживаются *, */n, a-b, a-b/n, списки через запятую и @hourly/@daily/
+@weekly). Запускается отдельным процессом (python scheduler.py), чтобы
+периодическая работа не занимала воркеры с запросами.
+
+Несколько экземпляров планировщика безопасны: перед запуском задача берёт
+аренду в таблице job_leases условным UPDATE - выполняет только тот, кто
+захватил аренду для данного слота расписания. jitter разносит старт
+экземпляров во времени, чтобы они не штурмовали аренду одновременно.
+
+Для тестов и разработки: Scheduler(app, use_lease=False) работает без БД
+аренды, run_pending(now) выполняет задачи синхронно, start_background()
+запускает цикл в потоке внутри процесса приложения.
+"""
+
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models.job_lease import JobLease
+
+DEFAULT_LEASE_SECONDS = 300
+MAX_SLEEP_SECONDS = 30
+# Поиск следующего времени ограничен, чтобы невыполнимое расписание (31 февраля) не зациклилось
+MAX_SEARCH_YEARS = 5
+
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+}
+# (min, max) для минуты, часа, дня месяца, месяца, дня недели (0 и 7 - воскресенье)
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+def _parse_cron_field(spec: str, low: int, high: int) -> frozenset:
+    values = set()
+    for part in spec.split(','):
+        step = 1
+        if '/' in part:
+            part, step_spec = part.split('/', 1)
+            step = int(step_spec)
+            if step < 1:
+                raise ValueError(f'Invalid cron step: {spec}')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f'Cron value out of range: {spec}')
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+class CronSchedule:
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression, expression).split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression must have 5 fields: {expression}')
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_cron_field(spec, low, high) for spec, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        # Как в cron: если заданы оба поля, достаточно совпадения любого
+        return day_ok or weekday_ok
+
+    def next_after(self, dt: datetime) -> datetime:
+        """Ближайшее время срабатывания строго после dt"""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * MAX_SEARCH_YEARS)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            if t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+                continue
+            return t
+        raise ValueError(f'Cron expression never fires: {self.expression}')
+
+@dataclass
+class JobMetrics:
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0  # Аренда у другого экземпляра
+    last_duration: Optional[float] = None
+    max_duration: float = 0.0
+    total_duration: float = 0.0
+    last_started_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'lastDuration': self.last_duration,
+            'maxDuration': round(self.max_duration, 4),
+            'avgDuration': round(self.total_duration / self.runs, 4) if self.runs else None,
+            'lastStartedAt': self.last_started_at.isoformat() if self.last_started_at else None,
+            'lastError': self.last_error,
+        }
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], object]
+    schedule: CronSchedule
+    jitter: float = 0.0
+    lease_seconds: int = DEFAULT_LEASE_SECONDS
+    slot: Optional[datetime] = None  # Время по расписанию (без jitter)
+    next_run: Optional[datetime] = None
+    metrics: JobMetrics = field(default_factory=JobMetrics)
+
+def _default_owner() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+class Scheduler:
+    def __init__(self, app=None, use_lease: bool = True, owner: Optional[str] = None,
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        self.app = app
+        self.use_lease = use_lease
+        self.owner = owner or _default_owner()
+        self.clock = clock
+        self.jobs: Dict[str, Job] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_job(self, name: str, cron: str, func: Callable[[], object],
+                jitter: float = 0.0, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Job:
+        if name in self.jobs:
+            raise ValueError(f'Job already registered: {name}')
+        job = Job(name=name, func=func, schedule=CronSchedule(cron), jitter=jitter, lease_seconds=lease_seconds)
+        self._plan(job, self.clock())
+        self.jobs[name] = job
+        return job
+
+    def job(self, name: str, cron: str, **kwargs):
+        """Декоратор: @scheduler.job('mining_accrual', '* * * * *', jitter=5)"""
+        def decorator(func):
+            self.add_job(name, cron, func, **kwargs)
+            return func
+        return decorator
+
+    def _plan(self, job: Job, now: datetime) -> None:
+        job.slot = job.schedule.next_after(now)
+        job.next_run = job.slot + timedelta(seconds=random.uniform(0, job.jitter)) if job.jitter else job.slot
+
+    # Аренда
+
+    def _acquire(self, job: Job, now: datetime) -> bool:
+        """
+        Захватить аренду для слота job.slot. Удаётся, если аренда свободна
+        (истекла) и этот слот ещё никто не выполнял (last_started_at < slot).
+        """
+        expires_at = now + timedelta(seconds=job.lease_seconds)
+        table = JobLease.__table__
+        acquired = db.session.execute(
+            table.update().where(
+                table.c.name == job.name,
+                db.or_(table.c.expires_at <= now, table.c.owner == self.owner),
+                db.or_(table.c.last_started_at.is_(None), table.c.last_started_at < job.slot)
+            ).values(owner=self.owner, expires_at=expires_at, last_started_at=now)
+        ).rowcount == 1
+        if acquired:
+            db.session.commit()
+            return True
+
+        if db.session.get(JobLease, job.name) is not None:
+            db.session.rollback()
+            return False
+        try:
+            db.session.add(JobLease(name=job.name, owner=self.owner, expires_at=expires_at,
+                                    last_started_at=now, runs=0, failures=0))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+
+    def _release(self, job: Job, duration: float, error: Optional[str]) -> None:
+        table = JobLease.__table__
+        now = self.clock()
+        db.session.execute(
+            table.update().where(
+                table.c.name == job.name, table.c.owner == self.owner
+            ).values(
+                expires_at=now,
+                last_finished_at=now,
+                last_duration=duration,
+                last_status='failed' if error else 'ok',
+                last_error=error,
+                runs=table.c.runs + 1,
+                failures=table.c.failures + (1 if error else 0),
+            )
+        )
+        db.session.commit()
+
+    # Выполнение
+
+    def _execute(self, job: Job, now: datetime) -> bool:
+        if self.use_lease and not self._acquire(job, now):
+            job.metrics.skipped += 1
+            return False
+
+        error = None
+        started = time.perf_counter()
+        job.metrics.last_started_at = now
+        try:
+            job.func()
+        except Exception:
+            db.session.rollback()
+            error = traceback.format_exc(limit=5)
+            print(f"Scheduled job {job.name} failed:\n{error}")
+        duration = time.perf_counter() - started
+
+        metrics = job.metrics
+        metrics.runs += 1
+        metrics.failures += 1 if error else 0
+        metrics.last_duration = round(duration, 4)
+        metrics.max_duration = max(metrics.max_duration, duration)
+        metrics.total_duration += duration
+        metrics.last_error = error
+
+        if self.use_lease:
+            try:
+                self._release(job, round(duration, 4), error)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to release lease for {job.name}: {e}")
+        return True
+
+    def run_pending(self, now: Optional[datetime] = None) -> List[str]:
+        """Выполнить задачи, время которых наступило. Возвращает имена выполненных"""
+        now = now or self.clock()
+        ran = []
+        for job in list(self.jobs.values()):
+            if job.next_run > now:
+                continue
+            if self._in_context(self._execute, job, now):
+                ran.append(job.name)
+            self._plan(job, now)
+        return ran
+
+    def run_job(self, name: str) -> bool:
+        """Выполнить задачу немедленно (с арендой, если она включена)"""
+        job = self.jobs[name]
+        now = self.clock()
+        job.slot = now
+        ran = self._in_context(self._execute, job, now)
+        self._plan(job, now)
+        return ran
+
+    def _in_context(self, func, *args):
+        if self.app is None:
+            return func(*args)
+        with self.app.app_context():
+            return func(*args)
+
+    def seconds_until_next(self, now: Optional[datetime] = None) -> float:
+        if not self.jobs:
+            return MAX_SLEEP_SECONDS
+        now = now or self.clock()
+        next_run = min(job.next_run for job in self.jobs.values())
+        return min(max((next_run - now).total_seconds(), 0.0), MAX_SLEEP_SECONDS)
+
+    def run_forever(self) -> None:
+        self._stop.clear()
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self.seconds_until_next())
+
+    def start_background(self) -> threading.Thread:
+        """Запустить цикл в фоновом потоке текущего процесса"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._thread = threading.Thread(target=self.run_forever, name='scheduler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def metrics(self) -> Dict[str, Dict]:
+        return {
+            name: dict(cron=job.schedule.expression,
+                       nextRun=job.next_run.isoformat() if job.next_run else None,
+                       **job.metrics.to_dict())
+            for name, job in self.jobs.items()
+        }
@@ -0,0 +1,153 @@
+"""
+Session Store - серверное хранилище сессий (опционально)
+
+По умолчанию аутентификация держится только на подписанной cookie-сессии
+Flask (session['user_id']). Если задан SESSION_STORE, при логине создаётся
+серверная запись sid -> user_id, а в cookie кладётся только sid. Тогда
+сессию можно отозвать (logout везде, блокировка), и для проверки не нужен
+запрос к БД - только lookup в памяти или один GET в Redis.
+
+SESSION_STORE:
+- не задан      - серверные сессии выключены
+- local         - память процесса (один процесс / dev)
+- redis://...   - Redis, общий для всех воркеров
+"""
+
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+from flask import g, session
+
+SESSION_TTL_SECONDS = int(os.getenv('SESSION_TTL_SECONDS', 30 * 24 * 3600))
+
+class LocalSessionStore:
+    """sid -> (user_id, expires_at) в памяти процесса"""
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self._sessions = {}
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id: str) -> str:
+        sid = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[sid] = (user_id, time.time() + self.ttl)
+            self._by_user.setdefault(user_id, set()).add(sid)
+        return sid
+
+    def get(self, sid: str) -> Optional[str]:
+        entry = self._sessions.get(sid)
+        if entry is None:
+            return None
+        user_id, expires_at = entry
+        if expires_at < time.time():
+            self.revoke(sid)
+            return None
+        return user_id
+
+    def revoke(self, sid: str) -> None:
+        with self._lock:
+            entry = self._sessions.pop(sid, None)
+            if entry:
+                self._by_user.get(entry[0], set()).discard(sid)
+
+    def revoke_user(self, user_id: str) -> int:
+        with self._lock:
+            sids = self._by_user.pop(user_id, set())
+            for sid in sids:
+                self._sessions.pop(sid, None)
+        return len(sids)
+
+class RedisSessionStore:
+    """session:<sid> -> user_id с TTL и множество sid пользователя"""
+
+    def __init__(self, client, ttl: int = SESSION_TTL_SECONDS, prefix: str = 'session'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, sid: str) -> str:
+        return f'{self.prefix}:{sid}'
+
+    def _user_key(self, user_id: str) -> str:
+        return f'{self.prefix}:user:{user_id}'
+
+    def create(self, user_id: str) -> str:
+        sid = secrets.token_urlsafe(32)
+        pipe = self.client.pipeline()
+        pipe.set(self._key(sid), user_id, ex=self.ttl)
+        pipe.sadd(self._user_key(user_id), sid)
+        pipe.expire(self._user_key(user_id), self.ttl)
+        pipe.execute()
+        return sid
+
+    def get(self, sid: str) -> Optional[str]:
+        value = self.client.get(self._key(sid))
+        if value is None:
+            return None
+        return value.decode() if isinstance(value, bytes) else value
+
+    def revoke(self, sid: str) -> None:
+        user_id = self.get(sid)
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(sid))
+        if user_id:
+            pipe.srem(self._user_key(user_id), sid)
+        pipe.execute()
+
+    def revoke_user(self, user_id: str) -> int:
+        sids = self.client.smembers(self._user_key(user_id))
+        pipe = self.client.pipeline()
+        for sid in sids:
+            sid = sid.decode() if isinstance(sid, bytes) else sid
+            pipe.delete(self._key(sid))
+        pipe.delete(self._user_key(user_id))
+        pipe.execute()
+        return len(sids)
+
+def create_session_store():
+    store = os.getenv('SESSION_STORE')
+    if not store:
+        return None
+    if store == 'local':
+        return LocalSessionStore()
+    import redis
+    return RedisSessionStore(redis.Redis.from_url(store))
+
+session_store = create_session_store()
+
+def start_session(user) -> None:
+    """Записать пользователя в сессию после успешного логина"""
+    session.clear()
+    session['user_id'] = user.id
+    session['username'] = user.username
+    if session_store is not None:
+        session['sid'] = session_store.create(user.id)
+
+def end_session() -> None:
+    """Завершить текущую сессию (и отозвать её на сервере)"""
+    sid = session.get('sid')
+    if session_store is not None and sid:
+        session_store.revoke(sid)
+    session.clear()
+
+def current_user_id() -> Optional[str]:
+    """
+    ID пользователя текущего запроса (с проверкой серверной сессии, если
+    она включена). Результат запоминается в g на время запроса.
+    """
+    if 'current_user_id' in g:
+        return g.current_user_id
+
+    user_id = session.get('user_id')
+    if user_id and session_store is not None:
+        sid = session.get('sid')
+        if not sid or session_store.get(sid) != user_id:
+            user_id = None
+
+    g.current_user_id = user_id
+    return user_id
@@ -0,0 +1,201 @@
+"""
+SlowQueryLog - журнал медленных SQL-запросов с планом выполнения
+
+Запросы дольше SLOW_QUERY_MS агрегируются по форме (statement_shape из
+query_stats): число, суммарное/максимальное время, эндпоинты-источники,
+типы параметров. При первом появлении формы снимается план - EXPLAIN QUERY
+PLAN в SQLite, EXPLAIN в Postgres (без ANALYZE, запрос не выполняется
+повторно) - и пишется предупреждение в лог.
+
+Агрегаты живут в памяти процесса (GET /api/profiler/slow-queries). Для
+нескольких воркеров можно задать SLOW_QUERY_FILE: каждое медленное
+выполнение дописывается туда строкой JSON, а python -m jobs.slow_query_report
+собирает общий top-N.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from services.query_stats import short_shape, statement_shape
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+SLOW_QUERY_FILE = os.getenv('SLOW_QUERY_FILE')
+SLOW_QUERY_MAX_SHAPES = 500
+EXPLAIN_PREFIXES = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+def params_shape(parameters, executemany: bool = False) -> str:
+    """Типы параметров без значений: (str, int) / {id: str} / executemany x N"""
+    # insertmanyvalues приходит с executemany=True, но одной плоской строкой параметров
+    if executemany and isinstance(parameters, (list, tuple)) and parameters \
+            and isinstance(parameters[0], (list, tuple, dict)):
+        return f'executemany x {len(parameters)} of {params_shape(parameters[0])}'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in parameters.items()) + '}'
+    return '(' + ', '.join(type(v).__name__ for v in (parameters or ())) + ')'
+
+def explain(dbapi_connection, dialect: str, statement: str, parameters) -> Optional[List[str]]:
+    """
+    План запроса на том же DBAPI-соединении (в той же транзакции). Сырой
+    курсор не вызывает события SQLAlchemy; в Postgres EXPLAIN обёрнут в
+    SAVEPOINT, чтобы ошибка не сломала транзакцию запроса.
+    """
+    if not statement.lstrip().upper().startswith(EXPLAIN_PREFIXES):
+        return None
+    cursor = dbapi_connection.cursor()
+    try:
+        if dialect == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+            return [row[-1] for row in cursor.fetchall()]
+        if dialect == 'postgresql':
+            cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(f'EXPLAIN {statement}', parameters)
+                plan = [row[0] for row in cursor.fetchall()]
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+                return plan
+            except Exception:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                raise
+        cursor.execute(f'EXPLAIN {statement}', parameters)
+        return [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, log_file: Optional[str] = SLOW_QUERY_FILE,
+                 max_shapes: int = SLOW_QUERY_MAX_SHAPES):
+        self.threshold_ms = threshold_ms
+        self.log_file = log_file
+        self.max_shapes = max_shapes
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._installed = False
+        self.logger = None
+
+    def record(self, entry: Dict) -> bool:
+        """Учесть выполнение; True, если форма встретилась впервые"""
+        shape = entry['shape']
+        with self._lock:
+            stats = self._stats.get(shape)
+            first = stats is None
+            if first:
+                if len(self._stats) >= self.max_shapes:
+                    # Вытесняем форму с наименьшим суммарным временем
+                    del self._stats[min(self._stats, key=lambda s: self._stats[s]['totalMs'])]
+                stats = self._stats[shape] = {
+                    'shape': shape,
+                    'count': 0,
+                    'totalMs': 0.0,
+                    'maxMs': 0.0,
+                    'endpoints': {},
+                    'params': entry.get('params'),
+                    'example': entry.get('statement'),
+                    'plan': entry.get('plan'),
+                    'firstSeen': entry['at'],
+                }
+            stats['count'] += 1
+            stats['totalMs'] += entry['ms']
+            stats['maxMs'] = max(stats['maxMs'], entry['ms'])
+            stats['lastSeen'] = entry['at']
+            endpoint = entry.get('endpoint') or 'background'
+            stats['endpoints'][endpoint] = stats['endpoints'].get(endpoint, 0) + 1
+            if stats['plan'] is None and entry.get('plan'):
+                stats['plan'] = entry['plan']
+        return first
+
+    def top(self, n: int = 20, sort: str = 'totalMs') -> List[Dict]:
+        with self._lock:
+            rows = [dict(stats, endpoints=dict(stats['endpoints'])) for stats in self._stats.values()]
+        rows.sort(key=lambda row: row.get(sort, 0), reverse=True)
+        for row in rows:
+            row['totalMs'] = round(row['totalMs'], 3)
+            row['maxMs'] = round(row['maxMs'], 3)
+            row['avgMs'] = round(row['totalMs'] / row['count'], 3)
+        return rows[:n]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def _seen(self, shape: str) -> bool:
+        return shape in self._stats
+
+    def _append(self, entry: Dict) -> None:
+        if not self.log_file:
+            return
+        try:
+            with open(self.log_file, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            print(f"Failed to write slow query log: {e}")
+
+    # События SQLAlchemy
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('slow_query_started')
+        if not started:
+            return
+        elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        shape = statement_shape(statement)
+        entry = {
+            'shape': shape,
+            'ms': round(elapsed_ms, 3),
+            'endpoint': _current_endpoint(),
+            'params': params_shape(parameters, executemany),
+            'statement': statement,
+            'at': datetime.utcnow().isoformat(),
+        }
+        if not self._seen(shape) and not executemany:
+            entry['plan'] = explain(conn.connection.dbapi_connection, conn.dialect.name, statement, parameters)
+        first = self.record(entry)
+        self._append(entry)
+        if first and self.logger is not None:
+            plan = entry.get('plan')
+            if plan:
+                self.logger.warning('Slow query %.1f ms at %s: %s\nplan: %s', elapsed_ms, entry['endpoint'],
+                                    short_shape(shape), '; '.join(plan))
+            else:
+                # Без плана (INSERT/UPDATE, executemany, EXPLAIN не удался)
+                self.logger.warning('Slow query %.1f ms at %s: %s', elapsed_ms, entry['endpoint'],
+                                    short_shape(shape))
+
+    def _handle_error(self, context):
+        # after_cursor_execute не вызывается при ошибке - снимаем отметку времени
+        started = context.connection.info.get('slow_query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def install(self) -> None:
+        if self._installed or self.threshold_ms <= 0:
+            return
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Engine, 'handle_error', self._handle_error)
+        self._installed = True
+
+    def init_app(self, app) -> None:
+        self.logger = app.logger
+        self.install()
+
+def _current_endpoint() -> Optional[str]:
+    from flask import has_request_context, request
+    if has_request_context():
+        return request.endpoint or request.path
+    return None
+
+slow_query_log = SlowQueryLog()
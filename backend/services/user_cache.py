@@ -0,0 +1,109 @@
+"""
+User Cache - короткоживущий кэш пользователей в памяти процесса
+
+Хранит сериализованного пользователя (User.to_dict()) по id с TTL, чтобы
+/api/auth/me, /api/contracts/user и др. не делали запрос по первичному
+ключу на каждый запрос. Запись сбрасывается после commit любой сессии,
+в которой изменялся или удалялся User (баланс, профиль, уровень).
+Массовые UPDATE в обход ORM должны вызывать invalidate_on_commit() сами.
+
+Кэш локален для процесса, поэтому TTL держим коротким: другие воркеры
+увидят изменения не позже чем через USER_CACHE_TTL_SECONDS.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import db
+from services.session_store import current_user_id
+
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 5))
+USER_CACHE_MAX_SIZE = 10000
+
+class UserCache:
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS, maxsize: int = USER_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._data.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, user_id: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self._data) >= self.maxsize:
+                # Вытесняем самую старую запись (dict хранит порядок вставки)
+                self._data.pop(next(iter(self._data)), None)
+            self._data[user_id] = (time.monotonic() + self.ttl, data)
+
+    def invalidate(self, *user_ids: str) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._data.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+user_cache = UserCache()
+
+def load_current_user() -> Optional[Dict[str, Any]]:
+    """
+    Текущий пользователь как dict (User.to_dict()) или None.
+    Запоминается в g на время запроса, между запросами - в user_cache.
+    """
+    if 'current_user' in g:
+        return g.current_user
+
+    data = None
+    user_id = current_user_id()
+    if user_id:
+        data = user_cache.get(user_id)
+        if data is None:
+            from models.user import User
+            user = db.session.get(User, user_id)
+            if user:
+                data = user.to_dict()
+                user_cache.set(user_id, data)
+
+    g.current_user = data
+    return data
+
+# Сброс кэша после commit сессии, изменившей пользователей
+
+_PENDING_KEY = 'user_cache_invalidate'
+
+def invalidate_on_commit(*user_ids: str) -> None:
+    """Сбросить кэш пользователей после commit текущей сессии (для UPDATE в обход ORM)"""
+    db.session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_user_writes(session, flush_context):
+    from models.user import User
+    changed = [obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)]
+    if changed:
+        session.info.setdefault(_PENDING_KEY, set()).update(changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    changed = session.info.pop(_PENDING_KEY, None)
+    if changed:
+        user_cache.invalidate(*changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,157 @@
+"""
+Valuation - пересчёт fair_price, roi и daily_income контрактов
+
+Все контракты оцениваются векторно (NumPy) по чанкам:
+    daily_income = hashrate * btc_per_th_day                 (BTC/день)
+    fair_price   = daily_income * btc_price * annuity(n, r)  (USDT)
+    roi          = (daily_income * btc_price * n / current_price - 1) * 100
+где n - оставшиеся дни до expiration_date, r - дневная ставка
+дисконтирования из годовой, annuity(n, r) = (1 - (1 + r)^-n) / r.
+
+В БД пишутся только строки, у которых хотя бы одно значение сдвинулось
+больше чем на tolerance (относительно), одним bulk UPDATE на чанк.
+
+Использование:
+    from services.valuation import ValuationParams, revalue_contracts
+    revalue_contracts(ValuationParams(btc_price_usd=65000))
+или CLI: python -m jobs.revalue_contracts
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from database import db
+
+VALUATION_CHUNK_SIZE = 50000
+SECONDS_PER_DAY = 86400.0
+
+def btc_per_th_day_from_difficulty(difficulty: float, block_reward: float = 3.125) -> float:
+    """Ожидаемый доход 1 TH/s в день (BTC) при данной сложности сети"""
+    return SECONDS_PER_DAY * 1e12 * block_reward / (difficulty * 2 ** 32)
+
+@dataclass
+class ValuationParams:
+    btc_price_usd: float = field(default_factory=lambda: float(os.getenv('BTC_PRICE_USD', 60000)))
+    btc_per_th_day: float = field(default_factory=lambda: float(os.getenv('BTC_PER_TH_DAY', 0.00000042)))
+    annual_discount_rate: float = field(default_factory=lambda: float(os.getenv('ANNUAL_DISCOUNT_RATE', 0.10)))
+    tolerance: float = 0.001
+    now: Optional[datetime] = None
+
+    @property
+    def daily_discount_rate(self) -> float:
+        return (1.0 + self.annual_discount_rate) ** (1.0 / 365.0) - 1.0
+
+def compute_valuation(hashrate: np.ndarray, remaining_days: np.ndarray,
+                      current_price: np.ndarray, params: ValuationParams) -> Dict[str, np.ndarray]:
+    """Векторный расчёт для массивов одинаковой длины"""
+    n = np.maximum(remaining_days, 0.0)
+    daily_income = hashrate * params.btc_per_th_day
+    daily_usd = daily_income * params.btc_price_usd
+
+    r = params.daily_discount_rate
+    if r > 0:
+        annuity = (1.0 - np.power(1.0 + r, -n)) / r
+    else:
+        annuity = n
+
+    fair_price = np.round(daily_usd * annuity, 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roi = np.where(current_price > 0, (daily_usd * n / current_price - 1.0) * 100.0, np.nan)
+    roi = np.round(roi, 1)
+
+    return {
+        'daily_income': daily_income,
+        'fair_price': fair_price,
+        'roi': roi,
+    }
+
+def _moved(new: np.ndarray, old: np.ndarray, tolerance: float) -> np.ndarray:
+    """Маска значений, сдвинувшихся больше tolerance (или ранее пустых)"""
+    scale = np.maximum(np.abs(old), 1e-12)
+    with np.errstate(invalid='ignore'):
+        changed = np.abs(new - old) > tolerance * scale
+    return np.where(np.isnan(old), ~np.isnan(new), changed)
+
+def revalue_contracts(params: Optional[ValuationParams] = None,
+                      chunk_size: int = VALUATION_CHUNK_SIZE,
+                      dry_run: bool = False) -> Dict[str, float]:
+    """
+    Пересчитать оценки всех контрактов. Чанки читаются keyset-пагинацией
+    по id, каждый чанк коммитится отдельно.
+    """
+    from models.contract import SmartContract
+
+    params = params or ValuationParams()
+    now = params.now or datetime.utcnow()
+    now64 = np.datetime64(now, 'us')
+
+    stats = {'scanned': 0, 'updated': 0, 'computeSeconds': 0.0, 'totalSeconds': 0.0}
+    started = time.perf_counter()
+    last_id = None
+
+    while True:
+        query = db.session.query(
+            SmartContract.id,
+            SmartContract.hashrate,
+            SmartContract.expiration_date,
+            SmartContract.current_price,
+            SmartContract.fair_price,
+            SmartContract.roi,
+            SmartContract.daily_income,
+        )
+        if last_id is not None:
+            query = query.filter(SmartContract.id > last_id)
+        rows = query.order_by(SmartContract.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        compute_started = time.perf_counter()
+        ids, hashrate, expiration, current_price, fair_price, roi, daily_income = zip(*rows)
+        expiration = np.array(expiration, dtype='datetime64[us]')
+        remaining_days = (expiration - now64) / np.timedelta64(1, 'D')
+
+        values = compute_valuation(
+            np.array(hashrate, dtype=float),
+            remaining_days.astype(float),
+            np.array(current_price, dtype=float),
+            params
+        )
+        old = {
+            'fair_price': np.array(fair_price, dtype=float),
+            'roi': np.array(roi, dtype=float),
+            'daily_income': np.array(daily_income, dtype=float),
+        }
+        mask = np.zeros(len(rows), dtype=bool)
+        for column, new in values.items():
+            mask |= _moved(new, old[column], params.tolerance)
+        changed = np.flatnonzero(mask)
+        stats['computeSeconds'] += time.perf_counter() - compute_started
+
+        if len(changed) and not dry_run:
+            fair = values['fair_price'][changed].tolist()
+            roi_new = values['roi'][changed].tolist()
+            income = values['daily_income'][changed].tolist()
+            db.session.execute(
+                db.update(SmartContract),
+                [{
+                    'id': ids[i],
+                    'fair_price': fair[k],
+                    'roi': None if np.isnan(roi_new[k]) else roi_new[k],
+                    'daily_income': income[k],
+                    'updated_at': now,
+                } for k, i in enumerate(changed.tolist())]
+            )
+            db.session.commit()
+
+        stats['scanned'] += len(rows)
+        stats['updated'] += len(changed)
+
+    stats['totalSeconds'] = round(time.perf_counter() - started, 3)
+    stats['computeSeconds'] = round(stats['computeSeconds'], 3)
+    return stats